@@ -14,9 +14,12 @@ import util.es_future as esUtils
 import util.options as optionUtils
 import util.config as config
 import util.ib as ibUtils
+import util.metrics as metrics
 
 assert dt.datetime.today().weekday() == 4, "Today is not Friday!!"
 
+metrics.configure(config.get_config("metrics"))
+
 # Read config
 config: Dict[str, Any] = config.get_config("doble_cal_VM_es")
 print(config)
@@ -24,10 +27,11 @@ print(config)
 ibUtils.wait_until('18:00')
     
 # TWs 7497, IBGW 4001
-ib: IB = IB().connect('winhost',  7496, clientId=123, timeout=15)
+run = metrics.start_run('doble_cal_VM_es')
+with metrics.span('connect'):
+    ib: IB = IB().connect('winhost',  7496, clientId=123, timeout=15)
 
-es = Future('ES', '202303', 'CME')
-ib.qualifyContracts(es)
+es = esUtils.get_ES_contract(ib)
 
 ib.reqMarketDataType(1)
 
@@ -39,11 +43,12 @@ print('close expiration:', close_expiration, 'trading_class:', close_trading_cls
 print('long expiration:', long_expiration, 'trading_class:', long_trading_cls)
 
 ## Define the strikes
-call_ticker = esUtils.get_call_ticker(ib, es, close_expiration, config['call_delta'])
-print('call strike selected:', call_ticker.contract.strike, 'delta:', esUtils.get_ticker_delta(call_ticker))
+chain_snapshot = esUtils.ChainSnapshot(ib, es, close_expiration)
+call_ticker = chain_snapshot.get_call_ticker(config['call_delta'])
+print('call strike selected:', call_ticker.contract.strike, 'delta:', chain_snapshot.get_delta(call_ticker))
 
-put_ticker = esUtils.get_put_ticker(ib, es, close_expiration, config['put_delta'])
-print('put strike selected:', put_ticker.contract.strike, 'delta:', esUtils.get_ticker_delta(put_ticker))
+put_ticker = chain_snapshot.get_put_ticker(config['put_delta'])
+print('put strike selected:', put_ticker.contract.strike, 'delta:', chain_snapshot.get_delta(put_ticker))
 
 buy_call_strike = call_ticker.contract.strike 
 sell_call_strike = buy_call_strike
@@ -62,9 +67,10 @@ bag_ticker = bagUtils.get_ticker(ib, bag_contract)
 
 # Define prices for orders
 print('Double calendar market price:', bag_ticker.marketPrice())
-price = esUtils.round_2tick(bag_ticker.marketPrice()) - 0.25
-limit = esUtils.round_2tick(price * (1-config['target']))
-stop = esUtils.round_2tick(price * (1+config['stop']))
+with metrics.span('prices'):
+    price = esUtils.round_2tick(bag_ticker.marketPrice()) - 0.25
+    limit = esUtils.round_2tick(price * (1-config['target']))
+    stop = esUtils.round_2tick(price * (1+config['stop']))
 
 print('price:', price)
 print('limit:', limit)
@@ -72,10 +78,12 @@ print('stop:', stop)
 
 # Enter the orders
 params = {'tif': 'GTC'}
-bracket_order = ib.bracketOrder('BUY', 2, price, limit, stop, **params)
-mainOrder: Trade = ib.placeOrder(bag_contract, bracket_order[0])
-takeProfitOrder = ib.placeOrder(bag_contract, bracket_order[1])
-stopLossOrder = ib.placeOrder(bag_contract, bracket_order[2])
+with metrics.span('place_order'):
+    bracket_order = ib.bracketOrder('BUY', 2, price, limit, stop, **params)
+    mainOrder: Trade = ib.placeOrder(bag_contract, bracket_order[0])
+    takeProfitOrder = ib.placeOrder(bag_contract, bracket_order[1])
+    stopLossOrder = ib.placeOrder(bag_contract, bracket_order[2])
+ibUtils.watch_order_ack(mainOrder, run)
 print(f'mainOrder id: {mainOrder.order.orderId}')
 print(f'takeProfitOrder id: {takeProfitOrder.order.orderId}')
 print(f'stopLossOrder id: {stopLossOrder.order.orderId}')
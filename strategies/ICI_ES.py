@@ -14,16 +14,20 @@ import util.es_future as esUtils
 import util.options as optionUtils
 import util.config as config
 import util.ib as ibUtils
+import util.metrics as metrics
+
+metrics.configure(config.get_config("metrics"))
 
 # Read config
 config: Dict[str, Any] = config.get_config("ici_es")
 print(config)
     
 # TWs 7497, IBGW 4001
-ib: IB = IB().connect('winhost',  7497, clientId=123, timeout=15)
+run = metrics.start_run('ici_es')
+with metrics.span('connect'):
+    ib: IB = IB().connect('winhost',  7497, clientId=123, timeout=15)
 
-es = Future('ES', '202303', 'CME')
-ib.qualifyContracts(es)
+es = esUtils.get_ES_contract(ib)
 
 ib.reqMarketDataType(1)
 
@@ -33,11 +37,12 @@ print('expiration:', expiration)
 print('trading_class:', trading_cls)
 
 ## Define the strikes
-call_ticker = esUtils.get_call_ticker(ib, es, expiration, config['call_delta'])
-print('call strike selected:', call_ticker.contract.strike, 'delta:', call_ticker.lastGreeks.delta)
+chain_snapshot = esUtils.ChainSnapshot(ib, es, expiration)
+call_ticker = chain_snapshot.get_call_ticker(config['call_delta'])
+print('call strike selected:', call_ticker.contract.strike, 'delta:', chain_snapshot.get_delta(call_ticker))
 
-put_ticker = esUtils.get_put_ticker(ib, es, expiration, config['put_delta'])
-print('put strike selected:', put_ticker.contract.strike, 'delta:', put_ticker.lastGreeks.delta)
+put_ticker = chain_snapshot.get_put_ticker(config['put_delta'])
+print('put strike selected:', put_ticker.contract.strike, 'delta:', chain_snapshot.get_delta(put_ticker))
 
 buy_call_strike = call_ticker.contract.strike 
 sell_call_strike = buy_call_strike + config['call_wing_width']
@@ -56,19 +61,22 @@ ici_ticker = bagUtils.get_ticker(ib, ici_contract)
 
 # Define prices for orders
 print('ICI market price:', ici_ticker.marketPrice())
-price = esUtils.round_2tick(ici_ticker.marketPrice()) - 0.25
-limit = esUtils.round_2tick(price + config['target'])
-stop = esUtils.round_2tick(price - config['stop'])
+with metrics.span('prices'):
+    price = esUtils.round_2tick(ici_ticker.marketPrice()) - 0.25
+    limit = esUtils.round_2tick(price + config['target'])
+    stop = esUtils.round_2tick(price - config['stop'])
 
 print('price:', price)
 print('limit:', limit)
 print('stop:', stop)
 
 # Enter the orders
-bracket_order = ib.bracketOrder('BUY', 1, price, limit, stop)
-mainOrder: Trade = ib.placeOrder(ici_contract, bracket_order[0])
-takeProfitOrder = ib.placeOrder(ici_contract, bracket_order[1])
-stopLossOrder = ib.placeOrder(ici_contract, bracket_order[2])
+with metrics.span('place_order'):
+    bracket_order = ib.bracketOrder('BUY', 1, price, limit, stop)
+    mainOrder: Trade = ib.placeOrder(ici_contract, bracket_order[0])
+    takeProfitOrder = ib.placeOrder(ici_contract, bracket_order[1])
+    stopLossOrder = ib.placeOrder(ici_contract, bracket_order[2])
+ibUtils.watch_order_ack(mainOrder, run)
 print(f'mainOrder id: {mainOrder.order.orderId}')
 print(f'takeProfitOrder id: {takeProfitOrder.order.orderId}')
 print(f'stopLossOrder id: {stopLossOrder.order.orderId}')
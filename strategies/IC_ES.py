@@ -12,6 +12,9 @@ import util.es_future as esUtils
 import util.options as optionUtils
 import util.config as config
 import util.ib as ibUtils
+import util.metrics as metrics
+
+metrics.configure(config.get_config("metrics"))
 
 # Read config
 config: Dict[str, Any] = config.get_config("ic_es")
@@ -19,10 +22,11 @@ print(config)
 
 # TWs 7497, IBGW 4001
 util.patchAsyncio() # not needed, but it does not do any harm
-ib: IB = IB().connect('winhost',  7496, clientId=123, timeout=15)
+run = metrics.start_run('ic_es')
+with metrics.span('connect'):
+    ib: IB = IB().connect('winhost',  7496, clientId=123, timeout=15)
 
-es = Future('ES', '202303', 'CME')
-ib.qualifyContracts(es)
+es = esUtils.get_ES_contract(ib)
 
 ib.reqMarketDataType(1)
 
@@ -32,11 +36,12 @@ print('expiration:', expiration)
 print('trading_class:', trading_cls)
 
 ## Define the strikes
-call_ticker = esUtils.get_call_ticker(ib, es, expiration, config['call_delta'])
-print('call strike selected:', call_ticker.contract.strike, 'delta:', call_ticker.lastGreeks.delta)
+chain_snapshot = esUtils.ChainSnapshot(ib, es, expiration)
+call_ticker = chain_snapshot.get_call_ticker(config['call_delta'])
+print('call strike selected:', call_ticker.contract.strike, 'delta:', chain_snapshot.get_delta(call_ticker))
 
-put_ticker = esUtils.get_put_ticker(ib, es, expiration, config['put_delta'])
-print('put strike selected:', put_ticker.contract.strike, 'delta:', put_ticker.lastGreeks.delta)
+put_ticker = chain_snapshot.get_put_ticker(config['put_delta'])
+print('put strike selected:', put_ticker.contract.strike, 'delta:', chain_snapshot.get_delta(put_ticker))
 
 sell_call_strike = call_ticker.contract.strike 
 buy_call_strike = sell_call_strike + config['call_wing_width']
@@ -56,9 +61,11 @@ ic_ticker = bagUtils.get_ticker(ib, ic_contract)
 # print('ic_ticker', ticker)
 
 print('IC market price:', ic_ticker.marketPrice())
-price = esUtils.round_2tick(ic_ticker.marketPrice()) - 0.25
-limit = esUtils.round_2tick(price * (1-config['target']))
-stop = esUtils.round_2tick(price * (1+config['stop']))
+with metrics.span('prices'):
+    price = esUtils.round_2tick(ic_ticker.marketPrice()) - 0.25
+    limit = esUtils.round_2tick(price * (1-config['target']))
+    stop = esUtils.round_2tick(price * (1+config['stop']))
+metrics.end_run(run)
 
 print('price:', price)
 print('limit:', limit)
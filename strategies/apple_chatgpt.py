@@ -2,6 +2,8 @@ from ib_insync import *
 import pandas as pd
 import datetime as dt
 
+from util.market_data import MarketDataManager
+
 # Connect to TWS or IB Gateway
 ib = IB()
 ib.connect('winhost', 7496, clientId=1, timeout=15)
@@ -58,9 +60,11 @@ def handle_order_status(trade, status, filled, remaining, avgFillPrice, permId,
 ib.pendingOrdersEvent += handle_order_status
 
 # Monitor the price of Apple throughout the day and check if the position is profitable
+# (a single streaming subscription, instead of a new one every minute)
+market_data = MarketDataManager(ib)
+ticker = market_data.subscribe(contract, hot=True)
 while True:
     ib.sleep(60) # Wait for 60 seconds
-    ticker = ib.reqMktData(contract)
     price = ticker.last
     
     # Check if the market is about to close and close the position if there is one
@@ -82,6 +86,7 @@ while True:
         break
 
 # Disconnect from TWS or IB Gateway
+market_data.close()
 ib.disconnect()
 
 """
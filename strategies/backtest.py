@@ -0,0 +1,28 @@
+import os
+import sys
+from typing import Any, Dict
+
+import util.config as config
+from util.backtest import Backtest, recorded_days, summary
+
+# Backtests the strategies of config.yaml on the chains recorded by recorder.py (see util.backtest)
+#
+#     python backtest.py [strategy ...]
+#
+# The strategies default to the ones of the backtest section. Each trade is printed, then a summary.
+
+# Read config
+backtest_config: Dict[str, Any] = config.get_config("backtest")
+print(backtest_config)
+
+root = os.path.join(os.path.dirname(os.path.realpath(__file__)), backtest_config.get('path', 'data'))
+days = recorded_days(root, backtest_config.get('start'), backtest_config.get('end'))
+print(f'{len(days)} recorded days')
+
+for name in sys.argv[1:] or backtest_config['strategies']:
+    backtest = Backtest(name, config.get_config(name), root, backtest_config.get('bar_seconds', 60), backtest_config.get('entry'))
+    trades = backtest.run(days)
+    print(f'\n{name}')
+    if not trades.empty:
+        print(trades.to_string(index=False))
+    print(summary(trades))
@@ -0,0 +1,66 @@
+import os
+import sys
+import tempfile
+import time
+from ib_insync import *
+from typing import Any, Dict, List
+
+import util.config as config
+import util.es_future as esUtils
+from util.brackets import BracketMonitor
+from util.chain_cache import ChainCache, set_chain_cache
+from util.contract_cache import ContractCache, set_contract_cache
+from util.market_data import MarketDataManager
+from util.pacing import PacedIB
+from util.replay import ReplayIB
+from util.strategy import Context, Strategy, load_strategy
+
+# Runs the strategies of the orchestrator end to end against a recorded session (see util.replay,
+# record one with: python orchestrator.py --record session.json) and reports the time to order
+# of each step. The first run of each strategy starts with empty caches, the next ones are warm.
+#
+#     python benchmark.py session.json [runs] [latency_scale]
+
+recording = sys.argv[1]
+runs = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+latency_scale = float(sys.argv[3]) if len(sys.argv) > 3 else 1.0
+
+STEPS = ['es_contract', 'select_contracts', 'create_bag', 'bag_ticker', 'prices', 'place_order', 'order_ack']
+
+
+def wait_ack(ib: ReplayIB, strategy: Strategy, timeout: float = 10) -> None:
+    ''' waits until the strategy has measured the acknowledgement of its parent order '''
+    deadline = time.perf_counter() + timeout
+    while 'order_ack' not in strategy.timings and time.perf_counter() < deadline:
+        ib.sleep(0.001)
+
+
+def run_once(name: str, strategy_config: Dict[str, Any]) -> Dict[str, float]:
+    ib = ReplayIB(recording, latency_scale=latency_scale)
+    esUtils.now = ib.now
+
+    start = time.perf_counter()
+    es = esUtils.get_ES_contract(ib)
+    timings = {'es_contract': time.perf_counter() - start}
+
+    context = Context(PacedIB(ib), es, MarketDataManager(ib), BracketMonitor(ib))
+    strategy = load_strategy(name, {**strategy_config, 'place_orders': True}, context)
+    ib.run(strategy.run())
+    wait_ack(ib, strategy)
+    timings.update(strategy.timings)
+    timings['total'] = time.perf_counter() - start
+    return timings
+
+
+results: List[tuple] = []
+for name in config.get_config('orchestrator')['strategies']:
+    with tempfile.TemporaryDirectory() as cache_dir:
+        set_contract_cache(ContractCache(os.path.join(cache_dir, 'contracts.sqlite')))
+        set_chain_cache(ChainCache(os.path.join(cache_dir, 'chains.json')))
+        for i in range(runs):
+            results.append((name, 'cold' if i == 0 else 'warm', run_once(name, config.get_config(name))))
+
+print('')
+print(f"{'strategy':<16}{'cache':<6}" + ''.join(f'{s:>17}' for s in STEPS + ['total']) + '  (ms)')
+for name, cache, timings in results:
+    print(f'{name:<16}{cache:<6}' + ''.join(f'{timings.get(s, 0) * 1000:>17.1f}' for s in STEPS + ['total']))
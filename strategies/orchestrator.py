@@ -0,0 +1,118 @@
+import asyncio
+import os
+import sys
+import tempfile
+from ib_insync import *
+from typing import Any, Dict, List
+
+import util.config as config
+import util.es_future as esUtils
+import util.metrics as metrics
+from util.brackets import BracketMonitor
+from util.chain_cache import ChainCache, get_chain_cache, set_chain_cache
+from util.contract_cache import ContractCache, set_contract_cache
+from util.market_data import MarketDataManager
+from util.pacing import PacedIB
+from util.replay import RecordingIB
+from util.scheduler import Scheduler
+from util.strategy import Context, Strategy, load_strategy
+
+# Runs the strategies listed in the orchestrator section of config.yaml concurrently,
+# on one event loop and one IB connection. Strategies with a 'schedule' (see util.scheduler)
+# run the next time it fires, the rest run right away.
+# Changes to config.yaml are picked up while it runs, by the strategies that have not started yet
+# (the scheduled ones waiting for their time): they run with the new parameters. A reload does not
+# change open positions: the strategies that already ran keep the target and stop of their brackets,
+# and the schedules are not updated.
+#
+#     python orchestrator.py [--record session.json]
+#
+# --record saves the IB requests and answers of the session, to replay them with benchmark.py
+# (the contract and chain caches are empty while recording, so every lookup goes to IB and is recorded).
+# The recording is saved after each entry and every record_interval seconds (orchestrator section,
+# 60 by default), so a killed session keeps what it recorded.
+
+# Read config
+orchestrator_config: Dict[str, Any] = config.get_config("orchestrator")
+print(orchestrator_config)
+
+metrics.configure(config.get_config("metrics"))
+
+# TWs 7497, IBGW 4001
+util.patchAsyncio() # the strategies can call blocking helpers from the event loop
+with metrics.span('connect'):
+    ib: IB = IB().connect(orchestrator_config['host'], orchestrator_config['port'], clientId=orchestrator_config['client_id'], timeout=15)
+ib.reqMarketDataType(1)
+
+record_path = sys.argv[sys.argv.index('--record') + 1] if '--record' in sys.argv else None
+if record_path:
+    ib = RecordingIB(ib)
+    record_cache_dir = tempfile.TemporaryDirectory()
+    set_contract_cache(ContractCache(os.path.join(record_cache_dir.name, 'contracts.sqlite')))
+    set_chain_cache(ChainCache(os.path.join(record_cache_dir.name, 'chains.json')))
+
+es = esUtils.get_ES_contract(ib)
+# the chains saved by the previous sessions may lack the strikes listed since
+get_chain_cache().start_background_refresh(ib, es)
+market_data = MarketDataManager(ib, orchestrator_config.get('max_market_data_lines', 100))
+market_data.subscribe(es, hot=True)
+# the strategies go through the pacing layer, so their orders are never queued behind data requests
+context = Context(PacedIB(ib), es, market_data, BracketMonitor(ib, market_data))
+
+strategies: List[Strategy] = [load_strategy(name, config.get_config(name), context) for name in orchestrator_config['strategies']]
+
+
+async def run_strategy(strategy: Strategy):
+    try:
+        await strategy.run()
+    except Exception as e:
+        # a failing strategy must not stop the others
+        print(f'{strategy.name} failed: {e!r}')
+    if record_path:
+        ib.save(record_path)
+
+
+async def save_recording():
+    while True:
+        await asyncio.sleep(orchestrator_config.get('record_interval', 60))
+        ib.save(record_path)
+
+
+def on_config_change(new_config: config.Config):
+    updated = []
+    for s in strategies:
+        if s.name not in new_config.strategies:
+            continue
+        try:
+            if s.update_config(new_config.section(s.name)):
+                updated.append(s.name)
+        except config.ConfigError as e:
+            print(f'{s.name}: new parameters not applied ({e})')
+    print(f'config.yaml reloaded, new parameters for: {updated or "none (already started)"}')
+
+
+async def main():
+    watcher = asyncio.ensure_future(config.watch(on_config_change))
+    saver = asyncio.ensure_future(save_recording()) if record_path else None
+    scheduler = Scheduler()
+    immediate = []
+    for strategy in strategies:
+        if 'schedule' in strategy.config:
+            scheduler.add(strategy.name, lambda s=strategy: run_strategy(s), strategy.config['schedule'], once=True, trading_days_only=True)
+        else:
+            immediate.append(run_strategy(strategy))
+
+    await asyncio.gather(scheduler.run(), *immediate)
+    # wait for the open brackets to finish
+    await asyncio.gather(*[b.wait() for b in context.brackets.active()])
+    watcher.cancel()
+    if saver:
+        saver.cancel()
+
+
+ib.run(main())
+if record_path:
+    ib.save(record_path)
+    record_cache_dir.cleanup()
+market_data.close()
+ib.disconnect()
@@ -0,0 +1,45 @@
+import asyncio
+import os
+from ib_insync import *
+from typing import Any, Dict
+
+import util.config as config
+import util.es_future as esUtils
+from util.ib import wait_until
+from util.market_data import MarketDataManager
+from util.recorder import Recorder, active_expirations
+from util.tick_store import TickStore
+
+# Records the ES future and the option chains that expire in the next max_dte days
+# (see util.recorder) until the stop time of the recorder section of config.yaml.
+# The data is read back with util.tick_store.read_table.
+
+# Read config
+recorder_config: Dict[str, Any] = config.get_config("recorder")
+print(recorder_config)
+
+# TWs 7497, IBGW 4001
+ib: IB = IB().connect(recorder_config['host'], recorder_config['port'], clientId=recorder_config['client_id'], timeout=15)
+ib.reqMarketDataType(1)
+
+es = esUtils.get_ES_contract(ib)
+market_data = MarketDataManager(ib, recorder_config.get('max_market_data_lines', 100))
+root = os.path.join(os.path.dirname(os.path.realpath(__file__)), recorder_config.get('path', 'data'))
+store = TickStore(root, recorder_config.get('buffer_rows', 4096))
+recorder = Recorder(ib, store, market_data)
+
+
+async def main():
+    recorder.record_future(es)
+    for expiration in active_expirations(recorder_config.get('max_dte', 7)):
+        contracts = await recorder.record_chain(es, expiration, recorder_config.get('strike_range', 100))
+        print(f'recording {len(contracts)} options expiring on {expiration}')
+    await recorder.run(recorder_config.get('flush_interval', 1.0))
+
+
+task = asyncio.ensure_future(main())
+wait_until(recorder_config['stop'], ib, recorder_config.get('timezone'))
+task.cancel()
+recorder.close()
+market_data.close()
+ib.disconnect()
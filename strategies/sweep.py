@@ -0,0 +1,38 @@
+import os
+import sys
+from typing import Any, Dict
+
+import util.config as config
+from util.backtest import recorded_days
+from util.sweep import Sweep
+
+# Grid search of the strategy parameters with the backtests (see util.sweep)
+#
+#     python sweep.py [strategy ...]
+#
+# The values of each parameter are in the sweep section of config.yaml, the strategies default to
+# the ones listed there. The results are written to <results>/<strategy>.csv as they finish; run it
+# again after a crash to resume.
+
+# Read config
+sweep_config: Dict[str, Any] = config.get_config("sweep")
+backtest_config: Dict[str, Any] = config.get_config("backtest")
+print(sweep_config)
+
+dir_path = os.path.dirname(os.path.realpath(__file__))
+root = os.path.join(dir_path, backtest_config.get('path', 'data'))
+bar_seconds = backtest_config.get('bar_seconds', 60)
+days = recorded_days(root, backtest_config.get('start'), backtest_config.get('end'))
+
+for name in sys.argv[1:] or list(sweep_config['strategies']):
+    strategy_config = config.get_config(name)
+    entry = strategy_config.get('schedule') or backtest_config.get('entry') or ''
+    # the prepared days depend on the bar size and the entry time
+    cache_name = f"{name}_{bar_seconds}s_{entry.replace(' ', '_').replace(':', '').replace('/', '-')}"
+    sweep = Sweep(name, strategy_config, root,
+                  cache_dir=os.path.join(dir_path, 'cache', 'sweep', cache_name),
+                  results=os.path.join(dir_path, sweep_config.get('results', 'sweeps'), f'{name}.csv'),
+                  bar_seconds=bar_seconds, entry=backtest_config.get('entry'),
+                  processes=sweep_config.get('processes'))
+    results = sweep.run(sweep_config['strategies'][name], days)
+    print(results.sort_values('pnl', ascending=False).head(10).to_string(index=False))
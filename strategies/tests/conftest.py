@@ -0,0 +1,5 @@
+import os
+import sys
+
+# the strategies import their helpers as util.<module>, from the strategies directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
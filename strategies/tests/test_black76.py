@@ -0,0 +1,73 @@
+''' Black-76 prices, greeks and implied volatility against closed-form values and finite differences '''
+import math
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from util import black76
+
+F, T, SIGMA, R = 4500.0, 30 / 365, 0.18, 0.05
+STRIKES = np.array([4000.0, 4300.0, 4500.0, 4700.0, 5000.0])
+
+
+def reference_price(F, K, T, sigma, is_call, r):
+    ''' scalar Black-76 with math.erf '''
+    cdf = lambda x: 0.5 * (1 + math.erf(x / math.sqrt(2)))
+    d1 = (math.log(F / K) + 0.5 * sigma**2 * T) / (sigma * math.sqrt(T))
+    d2 = d1 - sigma * math.sqrt(T)
+    if is_call:
+        return math.exp(-r * T) * (F * cdf(d1) - K * cdf(d2))
+    return math.exp(-r * T) * (K * cdf(-d2) - F * cdf(-d1))
+
+
+@pytest.mark.parametrize('is_call', [True, False])
+def test_price_matches_closed_form(is_call):
+    expected = [reference_price(F, K, T, SIGMA, is_call, R) for K in STRIKES]
+    np.testing.assert_allclose(black76.price(F, STRIKES, T, SIGMA, is_call, R), expected, rtol=1e-12)
+
+
+def test_put_call_parity():
+    call = black76.price(F, STRIKES, T, SIGMA, True, R)
+    put = black76.price(F, STRIKES, T, SIGMA, False, R)
+    np.testing.assert_allclose(call - put, math.exp(-R * T) * (F - STRIKES), rtol=1e-10, atol=1e-9)
+
+
+def test_price_broadcasts_a_mixed_ladder():
+    is_call = np.array([True, False, True, False, True])
+    expected = [reference_price(F, K, T, SIGMA, c, R) for K, c in zip(STRIKES, is_call)]
+    np.testing.assert_allclose(black76.price(F, STRIKES, T, SIGMA, is_call, R), expected, rtol=1e-12)
+
+
+@pytest.mark.parametrize('is_call', [True, False])
+def test_greeks_match_finite_differences(is_call):
+    g = black76.greeks(F, STRIKES, T, SIGMA, is_call, R)
+    p = lambda **kw: black76.price(**{'F': F, 'K': STRIKES, 'T': T, 'sigma': SIGMA, 'is_call': is_call, 'r': R, **kw})
+    h = 0.01
+    np.testing.assert_allclose(g['delta'], (p(F=F + h) - p(F=F - h)) / (2 * h), rtol=1e-6, atol=1e-9)
+    np.testing.assert_allclose(g['gamma'], (p(F=F + h) - 2 * p() + p(F=F - h)) / h**2, rtol=1e-3, atol=1e-8)
+    # vega per 1% of volatility, theta per calendar day (the price decreases as T decreases)
+    np.testing.assert_allclose(g['vega'], (p(sigma=SIGMA + 1e-6) - p(sigma=SIGMA - 1e-6)) / 2e-6 / 100, rtol=1e-6)
+    dt = 1e-6
+    np.testing.assert_allclose(g['theta'], -(p(T=T + dt) - p(T=T - dt)) / (2 * dt) / 365, rtol=1e-5, atol=1e-9)
+
+
+@pytest.mark.parametrize('is_call', [True, False])
+def test_implied_vol_round_trip(is_call):
+    sigma = np.array([0.1, 0.15, 0.2, 0.3, 0.6])
+    option_price = black76.price(F, STRIKES, T, sigma, is_call, R)
+    np.testing.assert_allclose(black76.implied_vol(option_price, F, STRIKES, T, is_call, R), sigma, rtol=1e-8)
+
+
+def test_implied_vol_is_nan_outside_the_bounds():
+    intrinsic = math.exp(-R * T) * (F - 4000.0)
+    below = intrinsic - 1.0  # under the price at the lowest volatility
+    above = F  # over the price at the highest volatility
+    iv = black76.implied_vol([below, above, 520.0], F, 4000.0, T, True, R)
+    assert np.isnan(iv[0]) and np.isnan(iv[1]) and not np.isnan(iv[2])
+
+
+def test_years_to_expiration():
+    now = datetime(2024, 3, 14, 16, 0, tzinfo=black76.EXPIRATION_TZ)
+    assert black76.years_to_expiration('20240315', now) == pytest.approx(1 / 365)
+    assert black76.years_to_expiration('20240314', now) == black76.MIN_YEARS
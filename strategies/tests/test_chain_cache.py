@@ -0,0 +1,76 @@
+''' ChainCache refreshes, with a fake IB '''
+import asyncio
+
+import pytest
+from ib_insync import Future, OptionChain
+
+from util.chain_cache import ChainCache
+
+ES = Future('ES', '202412', 'CME', conId=495512563)
+
+
+def chain(trading_class, strikes):
+    return OptionChain('CME', ES.conId, trading_class, '50', ['29991231'], strikes)
+
+
+class FakeIB:
+
+    def __init__(self, chains):
+        self.chains = chains
+        self.requests = 0
+
+    def reqSecDefOptParams(self, *args):
+        self.requests += 1
+        return self.chains
+
+    async def reqSecDefOptParamsAsync(self, *args):
+        return self.reqSecDefOptParams(*args)
+
+
+def test_saved_chains_are_refreshed_once_per_session(tmp_path):
+    path = str(tmp_path / 'chains.json')
+    ChainCache(path).get(FakeIB([chain('E1A', [5000.0, 5005.0])]), ES, 'E1A')
+
+    # next session: new strikes were listed
+    ib = FakeIB([chain('E1A', [5000.0, 5005.0, 5010.0])])
+    cache = ChainCache(path)
+    assert cache.get(ib, ES, 'E1A').strikes == [5000.0, 5005.0, 5010.0]
+    assert cache.get(ib, ES, 'E1A').strikes == [5000.0, 5005.0, 5010.0]
+    assert ib.requests == 1
+    assert ChainCache(path).chains[(ES.conId, 'CME', 'E1A')].strikes == [5000.0, 5005.0, 5010.0]
+
+
+def test_saved_chains_are_used_when_ib_sends_none(tmp_path):
+    path = str(tmp_path / 'chains.json')
+    ChainCache(path).get(FakeIB([chain('E1A', [5000.0])]), ES, 'E1A')
+    assert ChainCache(path).get(FakeIB([]), ES, 'E1A').strikes == [5000.0]
+
+
+def test_unknown_trading_class(tmp_path):
+    ib = FakeIB([chain('E1A', [5000.0])])
+    cache = ChainCache(str(tmp_path / 'chains.json'))
+    with pytest.raises(ValueError, match='E2B'):
+        cache.get(ib, ES, 'E2B')
+    with pytest.raises(ValueError, match='E2B'):
+        cache.get(ib, ES, 'E2B')
+    assert ib.requests == 1
+
+
+def test_get_async_waits_for_the_background_refresh(tmp_path):
+    ib = FakeIB([chain('E1A', [5000.0])])
+    cache = ChainCache(str(tmp_path / 'chains.json'))
+
+    async def main():
+        task = cache.start_background_refresh(ib, ES)
+        assert cache.start_background_refresh(ib, ES) is task
+        result = await cache.get_async(ib, ES, 'E1A')
+        assert cache.start_background_refresh(ib, ES) is None
+        return result
+
+    # on a loop of its own: asyncio.run would unset the current loop of the other tests
+    loop = asyncio.new_event_loop()
+    try:
+        assert loop.run_until_complete(main()).strikes == [5000.0]
+    finally:
+        loop.close()
+    assert ib.requests == 1 and not cache.pending
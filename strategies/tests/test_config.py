@@ -0,0 +1,58 @@
+''' validation of config.yaml '''
+import os
+import subprocess
+import sys
+
+import pytest
+
+from util import config
+
+STRATEGIES = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IC = {'class': 'util.strategy.IronCondor', 'call_delta': 0.25, 'put_delta': -0.25, 'target': 0.25, 'stop': 0.6,
+      'call_wing_width': 50, 'put_wing_width': 50}
+
+
+def test_the_repo_config_is_valid_without_loading_the_strategies():
+    # backtests and sweeps read the config without ib_insync and cvxpy
+    code = ('import sys, util.config as c; c.load(); '
+            'assert not {"util.strategy", "ib_insync", "cvxpy"} & set(sys.modules), sorted(sys.modules)')
+    subprocess.run([sys.executable, '-c', code], cwd=STRATEGIES, check=True)
+
+
+@pytest.mark.parametrize('changes, error', [
+    ({'call_delta': 1.2}, 'call_delta'),
+    ({'put_delta': 0.25}, 'put_delta'),
+    ({'stop': 'high'}, 'stop'),
+    ({'call_wing_width': 52}, 'multiple of 5'),
+    ({'quantity': 0}, 'quantity'),
+    ({'schedule': 'Fri 25:00'}, 'schedule'),
+    ({'targte': 0.5}, 'unknown parameters'),
+    ({'class': 'IronCondor'}, 'module.Class'),
+])
+def test_invalid_sections(changes, error):
+    with pytest.raises(config.ConfigError, match=error):
+        config.Config({'ic_es': {**IC, **changes}})
+
+
+def test_sweep_values_are_validated():
+    with pytest.raises(config.ConfigError, match='stop'):
+        config.Config({'ic_es': IC, 'sweep': {'strategies': {'ic_es': {'stop': [0.5, -1]}}}})
+
+
+def test_class_checks():
+    pytest.importorskip('cvxpy')  # util.strategy
+    from util.strategy import strategy_class
+
+    ic = strategy_class('ic_es', IC)
+    ic.validate_config('ic_es', IC)
+    # the take profit limit of an iron condor is price * (1 - target)
+    with pytest.raises(config.ConfigError, match='target'):
+        ic.validate_config('ic_es', {**IC, 'target': 1})
+    with pytest.raises(config.ConfigError, match='call_wing_width'):
+        ic.validate_config('ic_es', {**IC, 'call_wing_width': None})
+    # the inverted iron condor target is in points
+    ici = strategy_class('ici_es', {**IC, 'class': 'util.strategy.InvertedIronCondor'})
+    ici.validate_config('ici_es', {**IC, 'target': 4})
+    with pytest.raises(config.ConfigError, match='cannot be loaded'):
+        strategy_class('ic_es', {**IC, 'class': 'util.strategy.IronCondr'})
@@ -0,0 +1,28 @@
+''' wait_until without a connection, before the scripts connect '''
+import asyncio
+import datetime as dt
+
+import pytest
+from ib_insync import util as ibUtil
+
+from util import ib as ibUtils
+from util import scheduler
+
+
+def test_wait_until_keeps_the_event_loop(monkeypatch):
+    real_now = scheduler.now
+    start = dt.datetime.now()
+    target = (start + dt.timedelta(minutes=2)).replace(second=0, microsecond=0)
+    if target.date() != start.date():
+        pytest.skip('the target would be tomorrow')
+    # the clock runs 50 ms before the target
+    offset = target.astimezone() - real_now() - dt.timedelta(milliseconds=50)
+    monkeypatch.setattr(scheduler, 'now', lambda: real_now() + offset)
+
+    ibUtils.wait_until(target.strftime('%H:%M'))
+
+    assert scheduler.now() >= target.astimezone()
+    # what IB().connect needs afterwards
+    loop = asyncio.get_event_loop()
+    assert not loop.is_closed() and ibUtil.getLoop() is loop
+    assert loop.run_until_complete(asyncio.sleep(0, 'ok')) == 'ok'
@@ -0,0 +1,33 @@
+''' the strategy plug-ins, without a connection '''
+import pytest
+
+pytest.importorskip('cvxpy')  # util.options
+from util import strategy as strategyUtil
+from util.strategy import Context, DoubleCalendar, IronCondor, Strategy
+
+CONTEXT = Context(None, None, None, None)
+DC = {'class': 'util.strategy.DoubleCalendar', 'call_delta': 0.2, 'put_delta': -0.2, 'target': 0.2, 'stop': 0.5}
+
+
+def test_a_strategy_missing_a_method_cannot_be_instantiated():
+    class NoLegs(Strategy):
+        async def select_contracts(self):
+            return []
+
+        def create_bag(self, contracts):
+            return None
+
+        def get_prices(self, market_price):
+            return market_price, market_price, market_price
+
+    with pytest.raises(TypeError, match='legs'):
+        NoLegs('no_legs', {}, CONTEXT)
+
+
+def test_double_calendar_bag(monkeypatch):
+    calls = []
+    monkeypatch.setattr(strategyUtil.optionUtils, 'create_double_cal', lambda ib, contracts: calls.append('double_cal'))
+    monkeypatch.setattr(strategyUtil.optionUtils, 'create_ic', lambda ib, contracts: calls.append('ic'))
+    DoubleCalendar('doble_cal_VM_es', DC, CONTEXT).create_bag([])
+    IronCondor('ic_es', DC, CONTEXT).create_bag([])
+    assert calls == ['double_cal', 'ic']
@@ -0,0 +1,50 @@
+''' resume of the sweeps, without running the backtests '''
+from datetime import date
+
+import pytest
+
+pytest.importorskip('cvxpy')  # util.backtest loads the strategies
+from util import sweep as sweepUtil
+
+IC = {'class': 'util.strategy.IronCondor', 'call_delta': 0.25, 'put_delta': -0.25, 'target': 0.25, 'stop': 0.6,
+      'call_wing_width': 50, 'put_wing_width': 50}
+
+
+def fake_run(combinations, days):
+    return [{**params, 'trades': len(days), 'pnl': 1.0, 'win_rate': 1.0, 'max_drawdown': 0.0} for params in combinations]
+
+
+@pytest.fixture
+def sweep(tmp_path, monkeypatch):
+    # the pool forks after the patches, the workers see them
+    monkeypatch.setattr(sweepUtil, '_init_worker', lambda *args: None)
+    monkeypatch.setattr(sweepUtil, '_run_combinations', fake_run)
+    monkeypatch.setattr(sweepUtil.Sweep, 'prepare', lambda self, days: sorted(days))
+    return sweepUtil.Sweep('ic_es', IC, str(tmp_path), str(tmp_path / 'cache'), str(tmp_path / 'IC.csv'), processes=1)
+
+
+def test_new_days_run_the_combinations_again(sweep, capsys):
+    parameters = {'target': [0.25, 0.5], 'stop': [1, 2]}
+    days = [date(2024, 3, 1), date(2024, 3, 8)]
+    first = sweep.run(parameters, days)
+    assert len(first) == 4 and set(first['trades']) == {2}
+    assert (set(first['start']), set(first['end'])) == ({'2024-03-01'}, {'2024-03-08'})
+
+    assert len(sweep.run(parameters, days)) == 4
+    assert '0 combinations to run (4 already done on these days)' in capsys.readouterr().out
+
+    more = sweep.run(parameters, days + [date(2024, 3, 15)])
+    assert len(more) == 4 and set(more['trades']) == {3} and set(more['end']) == {'2024-03-15'}
+    assert '4 combinations to run (0 already done on these days)' in capsys.readouterr().out
+
+
+def test_combinations_are_validated_before_running(sweep):
+    with pytest.raises(ValueError, match='target'):
+        sweep.run({'target': [0.5, 1.5]}, [date(2024, 3, 1)])
+
+
+def test_results_with_other_columns(sweep):
+    with open(sweep.results, 'w') as file:
+        file.write('target,trades,pnl,win_rate,max_drawdown\n0.25,1,1.0,1.0,0.0\n')
+    with pytest.raises(ValueError, match='move it away'):
+        sweep.run({'target': [0.25]}, [date(2024, 3, 1)])
@@ -0,0 +1,49 @@
+''' the columnar tick files, in a temporary directory '''
+import os
+
+import numpy as np
+
+from util import tick_store
+from util.tick_store import TRADE_COLUMNS, TickStore, read_table, write_rows
+
+
+def trades(start, n):
+    return {name: (np.arange(start, start + n) * (k + 1)).astype(dtype) for k, (name, dtype) in enumerate(TRADE_COLUMNS.items())}
+
+
+def assert_rows(table, start, n):
+    for name, column in trades(start, n).items():
+        np.testing.assert_array_equal(table[name], column)
+
+
+def test_round_trip(tmp_path):
+    store = TickStore(str(tmp_path), buffer_rows=3)
+    for row in range(10):
+        store.append('20240315', 'ES_FUT_202406', 'trades', {n: c[0] for n, c in trades(row, 1).items()})
+    store.close()
+    assert_rows(read_table(str(tmp_path), '20240315', 'ES_FUT_202406', 'trades'), 0, 10)
+
+
+def test_an_interrupted_write_is_ignored_then_cut(tmp_path):
+    table_dir = os.path.join(str(tmp_path), '20240315', 'ES_FUT_202406', 'trades')
+    write_rows(table_dir, trades(0, 5))
+    # a crash in the middle of the next write: only some columns have the new rows
+    for name, column in list(trades(5, 3).items())[:2]:
+        with open(os.path.join(table_dir, name + '.bin'), 'ab') as file:
+            file.write(column.tobytes())
+    assert_rows(read_table(str(tmp_path), '20240315', 'ES_FUT_202406', 'trades'), 0, 5)
+
+    write_rows(table_dir, trades(5, 4))
+    assert_rows(read_table(str(tmp_path), '20240315', 'ES_FUT_202406', 'trades'), 0, 9)
+    assert {os.path.getsize(os.path.join(table_dir, n + '.bin')) // np.dtype(d).itemsize for n, d in TRADE_COLUMNS.items()} == {9}
+
+
+def test_tables_written_without_the_row_count(tmp_path):
+    table_dir = os.path.join(str(tmp_path), '20240315', 'ES_FUT_202406', 'trades')
+    write_rows(table_dir, trades(0, 5))
+    os.remove(os.path.join(table_dir, tick_store.ROWS_FILE))
+    with open(os.path.join(table_dir, 'price.bin'), 'ab') as file:
+        file.write(np.zeros(2).tobytes())
+    assert_rows(read_table(str(tmp_path), '20240315', 'ES_FUT_202406', 'trades'), 0, 5)
+    write_rows(table_dir, trades(5, 2))
+    assert_rows(read_table(str(tmp_path), '20240315', 'ES_FUT_202406', 'trades'), 0, 7)
@@ -0,0 +1,325 @@
+''' Backtests of the orchestrator strategies (util.strategy) on the chains recorded by util.recorder.
+
+    The recorded quotes of a day are sampled on a time grid of bar_seconds (the last quote of each
+    contract at each bar), so a day is a few [bars x contracts] arrays and everything after that is
+    array operations: the strikes are selected by delta like ChainSnapshot, the entry price, take
+    profit and stop come from the strategy get_prices, and the bracket is filled on the combo
+    quotes built from the legs like bag.get_leg_quote (the live orders are priced on their mid too):
+      - the parent (BUY limit at price) fills at its price on the first bar where the combo mid is at or below it
+      - the take profit (SELL limit) fills at its limit on the first bar where the combo mid reaches it
+      - the stop loss (SELL stop) triggers on the first bar where the combo mid is at or below the stop
+        and fills at the combo bid (on the same bar as the take profit, the stop wins)
+      - otherwise the position is closed at the last bar, the legs that expire at their intrinsic value
+'''
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from . import black76
+from . import es_calendar
+from . import tick_store
+from .es_future import round_2tick
+from .scheduler import ScheduleRule
+from .strategy import Context, Strategy, load_strategy
+
+MULTIPLIER = 50
+NS = 1_000_000_000
+DEFAULT_ENTRY = '09:45 America/Chicago'
+# strikes around the underlying price considered by ChainSnapshot, per right
+WING_WINDOW = {'C': (-5, 90), 'P': (-90, 5)}
+
+
+class Session:
+    ''' time grid of the recorded days and the ES price on it '''
+
+    def __init__(self, days: List[str], times: np.ndarray, underlying: np.ndarray):
+        self.days = days
+        self.times = times
+        self.underlying = underlying
+
+
+class Chain:
+    ''' quotes of the options of one expiration sampled on the session grid, [bars x contracts] '''
+
+    def __init__(self, expiration: str, strikes: np.ndarray, rights: np.ndarray,
+                 bid: np.ndarray, ask: np.ndarray, delta: np.ndarray):
+        self.expiration = expiration
+        self.strikes = strikes
+        self.rights = rights
+        self.bid = bid
+        self.ask = ask
+        self.delta = delta
+        self.columns = {(float(k), int(r)): i for i, (k, r) in enumerate(zip(strikes, rights))}
+
+    def column(self, strike: float, right: str) -> int:
+        ''' -1 when the option was not recorded '''
+        return self.columns.get((float(strike), tick_store.RIGHTS[right]), -1)
+
+
+def sample(times: np.ndarray, row_times: np.ndarray, row_columns: np.ndarray, values: List[np.ndarray],
+           columns: int) -> List[np.ndarray]:
+    ''' last value of each column at each time, [times x columns], nan before the first one.
+        The rows are sorted by (column, time) and looked up all at once with a single searchsorted '''
+    t0 = min(times[0], row_times.min())
+    span = max(times[-1], row_times.max()) - t0 + 1
+    order = np.lexsort((row_times, row_columns))
+    keys = row_columns[order].astype(np.int64) * span + (row_times[order] - t0)
+    query_columns = np.broadcast_to(np.arange(columns), (len(times), columns))
+    query = query_columns * span + (times[:, None] - t0)
+    index = np.searchsorted(keys, query, side='right') - 1
+    found = (index >= 0) & (row_columns[order][index.clip(0)] == query_columns)
+    return [np.where(found, v[order][index.clip(0)], np.nan) for v in values]
+
+
+def _read_days(root: str, days: List[str], partition: str, table: str) -> Optional[Dict[str, np.ndarray]]:
+    tables = [tick_store.read_table(root, d, partition, table) for d in days
+              if partition in tick_store.partitions(root, d)]
+    tables = [t for t in tables if len(t['time'])]
+    if not tables:
+        return None
+    return {name: np.concatenate([t[name] for t in tables]) for name in tables[0]}
+
+
+def load_session(root: str, days: List[str], bar_seconds: int) -> Optional[Session]:
+    ''' grid from the first to the last quote of the ES future of each day '''
+    times, rows = [], []
+    for d in days:
+        futures = [p for p in tick_store.partitions(root, d) if p.startswith('ES_FUT_')]
+        if not futures:
+            continue
+        # the front month is the most quoted one
+        quotes = max((tick_store.read_table(root, d, p, 'quotes') for p in futures), key=lambda q: len(q['time']))
+        if not len(quotes['time']):
+            continue
+        step = bar_seconds * NS
+        first, last = quotes['time'].min() // step * step, quotes['time'].max()
+        times.append(np.arange(first + step, last + step, step, dtype=np.int64))
+        rows.append(quotes)
+    if not times:
+        return None
+    times = np.concatenate(times)
+    row_times = np.concatenate([q['time'] for q in rows])
+    mid = np.concatenate([(q['bid'] + q['ask']) / 2 for q in rows])
+    [underlying] = sample(times, row_times, np.zeros(len(row_times), dtype=np.int64), [mid], 1)
+    return Session(days, times, underlying[:, 0])
+
+
+def load_chain(root: str, session: Session, expiration: str) -> Optional[Chain]:
+    quotes = _read_days(root, session.days, f'ES_FOP_{expiration}', 'quotes')
+    if quotes is None:
+        return None
+    con_ids, index, columns = np.unique(quotes['conId'], return_index=True, return_inverse=True)
+    bid, ask, delta = sample(session.times, quotes['time'], columns,
+                             [quotes['bid'], quotes['ask'], quotes['delta'].astype(float)], len(con_ids))
+    return Chain(expiration, quotes['strike'][index], quotes['right'][index], bid, ask, delta)
+
+
+def entry_deltas(chain: Chain, bar: int, underlying: float, now: datetime) -> np.ndarray:
+    ''' deltas of the chain at a bar: the TWS model delta, or the Black-76 one from the mid when missing '''
+    mid = (chain.bid[bar] + chain.ask[bar]) / 2
+    T = black76.years_to_expiration(chain.expiration, now)
+    is_call = chain.rights == tick_store.RIGHTS['C']
+    iv = black76.implied_vol(mid, underlying, chain.strikes, T, is_call)
+    local = black76.greeks(underlying, chain.strikes, T, iv, is_call)['delta']
+    return np.where(np.isnan(chain.delta[bar]), local, chain.delta[bar])
+
+
+def delta_index(sorted_deltas: np.ndarray, references: np.ndarray) -> np.ndarray:
+    ''' vectorized es_future._get_delta_index: index of the closest delta to each reference
+        (ties go to the higher delta) '''
+    above = np.searchsorted(sorted_deltas, references, side='left')
+    high = above.clip(0, len(sorted_deltas) - 1)
+    low = (above - 1).clip(0, len(sorted_deltas) - 1)
+    take_high = np.abs(sorted_deltas[high] - references) <= np.abs(sorted_deltas[low] - references)
+    return np.where(take_high, high, low)
+
+
+def select_strikes(chain: Chain, deltas: np.ndarray, price: float, right: str, references) -> np.ndarray:
+    ''' strikes with the closest delta to each reference, among the ones ChainSnapshot considers.
+        nan when there is no candidate '''
+    low, high = WING_WINDOW[right]
+    candidates = (chain.rights == tick_store.RIGHTS[right]) & (chain.strikes % 5 == 0) & \
+        (price + low < chain.strikes) & (chain.strikes < price + high) & \
+        ~np.isnan(deltas) & (np.abs(deltas) >= 0.01)
+    references = np.atleast_1d(np.asarray(references, dtype=float))
+    if not candidates.any():
+        return np.full(len(references), np.nan)
+    order = np.argsort(deltas[candidates], kind='stable')
+    strikes, sorted_deltas = chain.strikes[candidates][order], deltas[candidates][order]
+    return strikes[delta_index(sorted_deltas, references)]
+
+
+def combo_quotes(bids: np.ndarray, asks: np.ndarray, weights: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    ''' bid and ask of a combo from the [bars x legs] quotes of its legs (BUY legs weigh 1, SELL -1) '''
+    bid = np.where(weights > 0, bids, asks) @ weights
+    ask = np.where(weights > 0, asks, bids) @ weights
+    return bid, ask
+
+
+def _first(mask: np.ndarray) -> int:
+    ''' index of the first True, -1 if there is none '''
+    return int(mask.argmax()) if mask.any() else -1
+
+
+def simulate_bracket(bid: np.ndarray, ask: np.ndarray, start: int, price: float, limit: float,
+                     stop: float) -> Optional[Tuple[int, int, str]]:
+    ''' returns the entry bar, the exit bar and the exit reason (take_profit, stop_loss or close),
+        None when the parent order is not filled '''
+    mid = (bid + ask) / 2
+    entry = _first(mid[start:] <= price)
+    if entry < 0:
+        return None
+    entry += start
+    after = slice(entry + 1, None)
+    take_profit = _first(mid[after] >= limit)
+    stop_loss = _first(mid[after] <= stop)
+    if stop_loss >= 0 and (take_profit < 0 or stop_loss <= take_profit):
+        return entry, entry + 1 + stop_loss, 'stop_loss'
+    if take_profit >= 0:
+        return entry, entry + 1 + take_profit, 'take_profit'
+    return entry, len(bid) - 1, 'close'
+
+
+def _intrinsic(strike: float, right: str, underlying: float) -> float:
+    return max(underlying - strike, 0.0) if right == 'C' else max(strike - underlying, 0.0)
+
+
+class Backtest:
+    ''' Runs one strategy of config.yaml on the recorded days.
+        entry: "hh:mm [timezone]" when the strategy has no schedule (the schedule is used otherwise)
+    '''
+
+    def __init__(self, name: str, config: Dict[str, Any], root: str, bar_seconds: int = 60, entry: str = None):
+        self.name = name
+        self.root = root
+        self.bar_seconds = bar_seconds
+        # only get_prices, legs, dtes and leg_actions are used, no connection is needed
+        self.strategy: Strategy = load_strategy(name, config, Context(None, None, None, None))
+        self.rule = ScheduleRule.parse(config.get('schedule') or entry or DEFAULT_ENTRY, trading_days_only=True)
+        self.weights = np.array([1.0 if a == 'BUY' else -1.0 for a in self.strategy.leg_actions])
+
+    def entry_time(self, day: date) -> Optional[datetime]:
+        ''' None when the strategy does not trade that day '''
+        fire = self.rule.next_fire(datetime.combine(day, datetime.min.time(), self.rule.tz) - timedelta(microseconds=1))
+        return fire if fire.date() == day else None
+
+    def expirations(self, day: date) -> List[str]:
+        return [(day + timedelta(days=dte)).strftime('%Y%m%d') for dte in self.strategy.dtes]
+
+    def load(self, day: date) -> Optional[Tuple[datetime, Session, List[Chain]]]:
+        ''' the session from the entry to the first expiration, and the chains of the legs '''
+        entry = self.entry_time(day)
+        expirations = self.expirations(day)
+        if entry is None or not all(es_calendar.get_calendar(int(e[:4])).is_expiration(datetime.strptime(e, '%Y%m%d').date())
+                                    for e in expirations):
+            return None
+        first, last = entry.astimezone(timezone.utc).strftime('%Y%m%d'), expirations[0]
+        days = [d for d in tick_store.days(self.root) if first <= d <= last]
+        session = load_session(self.root, days, self.bar_seconds) if days else None
+        if session is None:
+            return None
+        # the position is closed at the settlement of the first expiration at the latest
+        settlement = datetime.combine(datetime.strptime(last, '%Y%m%d').date(), black76.EXPIRATION_TIME, black76.EXPIRATION_TZ)
+        keep = session.times <= int(settlement.timestamp() * NS)
+        session = Session(days, session.times[keep], session.underlying[keep])
+        if not len(session.times):
+            return None
+        chains = [load_chain(self.root, session, e) for e in expirations]
+        if any(c is None for c in chains):
+            return None
+        return entry, session, chains
+
+    def start_bar(self, loaded) -> int:
+        ''' the first bar at or after the entry time, -1 when there is none (or no ES price) '''
+        entry, session, _ = loaded
+        start = int(np.searchsorted(session.times, int(entry.timestamp() * NS)))
+        if start >= len(session.times) or np.isnan(session.underlying[start]):
+            return -1
+        return start
+
+    def entry_deltas(self, loaded, start: int) -> np.ndarray:
+        ''' deltas of the chain the strikes are selected on, at the entry '''
+        entry, session, chains = loaded
+        return entry_deltas(chains[0], start, session.underlying[start], entry)
+
+    def select(self, loaded, start: int, deltas: np.ndarray) -> Tuple[float, float]:
+        ''' the call and put strikes with the configured deltas '''
+        _, session, chains = loaded
+        price = session.underlying[start]
+        call = select_strikes(chains[0], deltas, price, 'C', self.strategy.config['call_delta'])[0]
+        put = select_strikes(chains[0], deltas, price, 'P', self.strategy.config['put_delta'])[0]
+        return call, put
+
+    def run_day(self, day: date, loaded=None, strikes: Tuple[float, float] = None) -> Optional[Dict[str, Any]]:
+        ''' loaded: the result of load(day), strikes: the (call, put) strikes when already selected '''
+        loaded = loaded or self.load(day)
+        if loaded is None:
+            return None
+        _, session, chains = loaded
+        start = self.start_bar(loaded)
+        if start < 0:
+            return None
+
+        strikes = strikes or self.select(loaded, start, self.entry_deltas(loaded, start))
+        if np.isnan(strikes).any():
+            return None
+        legs = self.strategy.legs(*strikes)
+        columns = [chains[i].column(strike, right) for i, strike, right in legs]
+        if min(columns) < 0:
+            return None
+        bids = np.stack([chains[i].bid[:, c] for (i, _, _), c in zip(legs, columns)], axis=1)
+        asks = np.stack([chains[i].ask[:, c] for (i, _, _), c in zip(legs, columns)], axis=1)
+        bid, ask = combo_quotes(bids, asks, self.weights)
+
+        market_price = (bid[start] + ask[start]) / 2
+        if np.isnan(market_price):
+            return None
+        price, limit, stop = self.strategy.get_prices(market_price)
+        filled = simulate_bracket(bid, ask, start, price, limit, stop)
+        if filled is None:
+            return None
+        entry_bar, exit_bar, reason = filled
+        if reason == 'take_profit':
+            exit_price = limit
+        elif reason == 'stop_loss':
+            exit_price = bid[exit_bar]
+        else:
+            exit_price = self.__close_price(legs, chains, bids[exit_bar], asks[exit_bar], session.underlying[exit_bar])
+        quantity = self.strategy.get_quantity()
+        return {
+            'day': day, 'entry_time': pd.Timestamp(session.times[entry_bar], tz='UTC'),
+            'exit_time': pd.Timestamp(session.times[exit_bar], tz='UTC'),
+            'call_strike': strikes[0], 'put_strike': strikes[1],
+            'price': price, 'limit': limit, 'stop': stop, 'exit_price': round_2tick(exit_price), 'reason': reason,
+            'pnl': (round_2tick(exit_price) - price) * MULTIPLIER * quantity,
+        }
+
+    def __close_price(self, legs, chains: List[Chain], bids: np.ndarray, asks: np.ndarray, underlying: float) -> float:
+        ''' the legs of the first expiration settle at their intrinsic value, the others at their mid '''
+        values = [_intrinsic(strike, right, underlying) if i == 0 else (b + a) / 2
+                  for (i, strike, right), b, a in zip(legs, bids, asks)]
+        return float(np.dot(values, self.weights))
+
+    def run(self, days: List[date]) -> pd.DataFrame:
+        trades = [t for t in (self.run_day(d) for d in days) if t]
+        return pd.DataFrame(trades)
+
+
+def summary(trades: pd.DataFrame) -> Dict[str, float]:
+    if trades.empty:
+        return {'trades': 0, 'pnl': 0.0, 'win_rate': 0.0, 'max_drawdown': 0.0}
+    equity = trades['pnl'].cumsum()
+    return {
+        'trades': len(trades),
+        'pnl': float(equity.iloc[-1]),
+        'win_rate': float((trades['pnl'] > 0).mean()),
+        'max_drawdown': float((equity.cummax().clip(lower=0) - equity).max()),
+    }
+
+
+def recorded_days(root: str, start: str = None, end: str = None) -> List[date]:
+    ''' start, end: YYYYMMDD, inclusive '''
+    return [datetime.strptime(d, '%Y%m%d').date() for d in tick_store.days(root)
+            if (not start or d >= start) and (not end or d <= end)]
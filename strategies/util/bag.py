@@ -1,12 +1,18 @@
-from typing import List
+import asyncio
+from typing import List, Optional, Tuple
 from ib_insync import IB, Contract, Ticker
 import math
 
+from . import metrics
+from .market_data import MarketDataManager
+
 def get_price_leg_by_leg(ib: IB, bag: Contract) -> float:
     ''' Gets the list of a BAG contract by calculating the price leg by leg'''
-    tickers: List[Ticker] = ib.reqTickers(*[Contract(conId=l.conId, exchange=l.exchange) for l in bag.comboLegs])
+    tickers: List[Ticker] = ib.reqTickers(*get_leg_contracts(bag))
     # return sum(list(map(lambda t, l: t.marketPrice()*l.ratio if l.action=='BUY' else -1*t.marketPrice()*l.ratio, tickers, bag.comboLegs)))
-    
+    return __price_leg_by_leg(bag, tickers)
+
+def __price_leg_by_leg(bag: Contract, tickers: List[Ticker]) -> float:
     # Calculate the market price for the BAG contract using the bid/ask prices from the market depth
     price = 0
     for i, leg in enumerate(bag.comboLegs):
@@ -17,24 +23,82 @@ def get_price_leg_by_leg(ib: IB, bag: Contract) -> float:
 
     return price
 
-def get_ticker(ib: IB, bag: Contract) -> Ticker:
-    ### IMPORTANT: use reqMktData insted of reqTickers and sleep so it has time to fill up, and then CANCEL 
+def get_leg_contracts(bag: Contract) -> List[Contract]:
+    return [Contract(conId=l.conId, exchange=l.exchange) for l in bag.comboLegs]
+
+def get_leg_quote(bag: Contract, tickers: List[Ticker]) -> Optional[Tuple[float, float]]:
+    ''' bid and ask of the BAG contract built from the bid/ask of its legs, None if a leg has no quote '''
+    bid = ask = 0
+    for leg, t in zip(bag.comboLegs, tickers):
+        if math.isnan(t.bid) or math.isnan(t.ask) or t.bid < 0 or t.ask <= 0:
+            return None
+        if leg.action == 'BUY':
+            bid += t.bid * leg.ratio
+            ask += t.ask * leg.ratio
+        else:
+            bid -= t.ask * leg.ratio
+            ask -= t.bid * leg.ratio
+    return bid, ask
+
+def get_ticker(ib: IB, bag: Contract, timeout: float = 4, market_data: MarketDataManager = None) -> Ticker:
+    ''' Gets the ticker of a BAG contract, see get_ticker_async '''
+    return ib.run(get_ticker_async(ib, bag, timeout, market_data))
+
+async def get_ticker_async(ib: IB, bag: Contract, timeout: float = 4, market_data: MarketDataManager = None) -> Ticker:
+    ''' Subscribes to the BAG contract and to its legs at the same time, and returns as soon as
+        either the combo ticker has a market price or all the legs have a quote (in that case the
+        mid of the legs is set as the last price of the combo ticker).
+        timeout: deadline in seconds, after it the price is calculated with the market prices of
+        fresh snapshots of the legs
+        market_data: when given, the subscriptions are shared through it instead of cancelled
+    '''
+    with metrics.span('bag.get_ticker') as span:
+        return await __get_ticker_async(ib, bag, timeout, market_data, span)
+
+async def __get_ticker_async(ib: IB, bag: Contract, timeout: float, market_data: MarketDataManager, span: metrics.Span) -> Ticker:
+    ### IMPORTANT: the combo ticker alone is not reliable (sometimes it never gets data)
     ### https://groups.io/g/insync/topic/7793700
-    ### BUT!! STILL DOES NOT WORK SOMETIMES. IT IS NOT RELIABLE, that's why we foll back to the 
-    count = 0
-    max_retries = 2
-    while (count < max_retries):
+    legs = get_leg_contracts(bag)
+    if market_data:
+        ic_ticker = market_data.subscribe(bag)
+        leg_tickers = market_data.subscribe_all(legs)
+    else:
         ic_ticker = ib.reqMktData(bag)
-        ib.sleep(2)
-        ib.cancelMktData(bag)
-        if not math.isnan(ic_ticker.marketPrice()):
-            print('combo ticker retrieved correctly')
-            return ic_ticker
-        else :
-            print('combo ticker has no data. attempt {0}. retrying...', count)
-            count = count+1
-            if count == max_retries:
-                print('calculating price leg by leg')
-                ic_ticker.last = get_price_leg_by_leg(ib, bag)
-                # print('price leg by leg:', ic_ticker.last)
-                return ic_ticker
+        leg_tickers = [ib.reqMktData(c) for c in legs]
+    done = asyncio.Event()
+
+    def onPendingTickers(tickers):
+        if not math.isnan(ic_ticker.marketPrice()) or get_leg_quote(bag, leg_tickers):
+            done.set()
+
+    ib.pendingTickersEvent += onPendingTickers
+    try:
+        onPendingTickers([])
+        await asyncio.wait_for(done.wait(), timeout)
+    except asyncio.TimeoutError:
+        print(f'combo ticker has no data after {timeout}s')
+        span.tag(timeout=True)
+    finally:
+        ib.pendingTickersEvent -= onPendingTickers
+        for c in [bag] + legs:
+            if market_data:
+                market_data.release(c)
+            else:
+                ib.cancelMktData(c)
+
+    if not math.isnan(ic_ticker.marketPrice()):
+        print('combo ticker retrieved correctly')
+        span.tag(path='combo')
+        return ic_ticker
+
+    quote = get_leg_quote(bag, leg_tickers)
+    if quote:
+        print('calculating price with the bid/ask of the legs')
+        span.tag(path='leg_quotes')
+        ic_ticker.last = (quote[0] + quote[1]) / 2
+    else:
+        print('calculating price leg by leg')
+        span.tag(path='leg_by_leg')
+        # the streamed leg tickers have no usable quote here: request fresh snapshots, as get_price_leg_by_leg
+        ic_ticker.last = __price_leg_by_leg(bag, await ib.reqTickersAsync(*legs))
+    return ic_ticker
@@ -0,0 +1,90 @@
+''' Vectorized Black-76 model for options on futures.
+    All the functions accept scalars or arrays (one element per strike) and broadcast them.
+    vega is per 1% of volatility and theta per calendar day, like the greeks sent by TWS.
+'''
+from datetime import datetime, time
+from typing import Dict, List
+from zoneinfo import ZoneInfo
+
+import numpy as np
+from scipy.stats import norm
+
+from ib_insync import Ticker
+
+# ES options settle at the close of the cash session
+EXPIRATION_TIME = time(16, 0)
+EXPIRATION_TZ = ZoneInfo('America/New_York')
+MIN_YEARS = 60 / (365 * 24 * 60 * 60)
+
+
+def years_to_expiration(expiration: str, now: datetime = None) -> float:
+    ''' expiration: in format YYYYMMDD '''
+    now = now or datetime.now(EXPIRATION_TZ)
+    exp_dt = datetime.combine(datetime.strptime(expiration, '%Y%m%d').date(), EXPIRATION_TIME, EXPIRATION_TZ)
+    return max((exp_dt - now).total_seconds() / (365 * 24 * 60 * 60), MIN_YEARS)
+
+
+def _d1_d2(F, K, T, sigma):
+    sigma_sqrt_t = sigma * np.sqrt(T)
+    d1 = (np.log(F / K) + 0.5 * sigma_sqrt_t**2) / sigma_sqrt_t
+    return d1, d1 - sigma_sqrt_t
+
+
+def price(F, K, T, sigma, is_call, r: float = 0.0) -> np.ndarray:
+    F, K, T, sigma, is_call = np.broadcast_arrays(*map(np.asarray, (F, K, T, sigma, is_call)))
+    d1, d2 = _d1_d2(F, K, T, sigma)
+    df = np.exp(-r * T)
+    call = df * (F * norm.cdf(d1) - K * norm.cdf(d2))
+    put = df * (K * norm.cdf(-d2) - F * norm.cdf(-d1))
+    return np.where(is_call, call, put)
+
+
+def greeks(F, K, T, sigma, is_call, r: float = 0.0) -> Dict[str, np.ndarray]:
+    ''' returns the delta, gamma, vega and theta '''
+    F, K, T, sigma, is_call = np.broadcast_arrays(*map(np.asarray, (F, K, T, sigma, is_call)))
+    d1, _ = _d1_d2(F, K, T, sigma)
+    df = np.exp(-r * T)
+    pdf_d1 = norm.pdf(d1)
+    sqrt_t = np.sqrt(T)
+    return {
+        'delta': np.where(is_call, df * norm.cdf(d1), -df * norm.cdf(-d1)),
+        'gamma': df * pdf_d1 / (F * sigma * sqrt_t),
+        'vega': F * df * pdf_d1 * sqrt_t / 100,
+        'theta': (r * price(F, K, T, sigma, is_call, r) - F * df * pdf_d1 * sigma / (2 * sqrt_t)) / 365,
+    }
+
+
+def implied_vol(option_price, F, K, T, is_call, r: float = 0.0,
+                low: float = 1e-4, high: float = 5.0, iterations: int = 60) -> np.ndarray:
+    ''' implied volatility by bisection, run on the whole strike ladder at once.
+        NaN where the price is not within the model bounds '''
+    option_price, F, K, T, is_call = np.broadcast_arrays(*map(np.asarray, (option_price, F, K, T, is_call)))
+    lo = np.full(option_price.shape, low)
+    hi = np.full(option_price.shape, high)
+    for _ in range(iterations):
+        mid = (lo + hi) / 2
+        above = price(F, K, T, mid, is_call, r) > option_price
+        hi = np.where(above, mid, hi)
+        lo = np.where(above, lo, mid)
+    iv = (lo + hi) / 2
+    valid = (price(F, K, T, low, is_call, r) <= option_price) & (option_price <= price(F, K, T, high, is_call, r))
+    return np.where(valid, iv, np.nan)
+
+
+def ticker_greeks(tickers: List[Ticker], underlying_price: float, r: float = 0.0, now: datetime = None) -> Dict[str, np.ndarray]:
+    ''' computes the implied volatility and greeks of a list of option tickers from their bid/ask mid
+        (or market price when there is no quote on both sides) and the underlying price '''
+    bid = np.array([t.bid if t.bid and t.bid > 0 else np.nan for t in tickers], dtype=float)
+    ask = np.array([t.ask if t.ask and t.ask > 0 else np.nan for t in tickers], dtype=float)
+    mid = (bid + ask) / 2
+    market = np.array([t.marketPrice() for t in tickers], dtype=float)
+    option_price = np.where(np.isnan(mid), market, mid)
+
+    K = np.array([t.contract.strike for t in tickers], dtype=float)
+    T = np.array([years_to_expiration(t.contract.lastTradeDateOrContractMonth[:8], now) for t in tickers])
+    is_call = np.array([t.contract.right.startswith('C') for t in tickers])
+
+    iv = implied_vol(option_price, underlying_price, K, T, is_call, r)
+    res = greeks(underlying_price, K, T, iv, is_call, r)
+    res['impliedVol'] = iv
+    return res
@@ -0,0 +1,89 @@
+import asyncio
+from typing import Callable, Dict, List, Optional
+
+from ib_insync import IB, Contract, Trade
+
+from .market_data import MarketDataManager
+
+DONE_STATES = ('Cancelled', 'ApiCancelled', 'Inactive')
+
+
+class Bracket:
+    ''' parent + take profit + stop loss orders of one trade.
+        result: 'take_profit', 'stop_loss' or 'cancelled' once it is done
+    '''
+
+    def __init__(self, name: str, parent: Optional[Trade], take_profit: Trade, stop_loss: Trade,
+                 contracts: List[Contract], on_done: Optional[Callable[['Bracket'], None]]):
+        self.name = name
+        self.parent = parent
+        self.take_profit = take_profit
+        self.stop_loss = stop_loss
+        self.contracts = contracts
+        self.on_done = on_done
+        self.result: Optional[str] = None
+        self.done = asyncio.Event()
+
+    def trades(self) -> List[Trade]:
+        return [t for t in (self.parent, self.take_profit, self.stop_loss) if t]
+
+    async def wait(self) -> str:
+        await self.done.wait()
+        return self.result
+
+
+class BracketMonitor:
+    ''' Tracks any number of brackets on one IB connection with a single orderStatusEvent handler.
+        Brackets are indexed by orderId, so each order status is handled in O(1). When a bracket is
+        done (take profit or stop loss filled, or its orders cancelled) its market data subscriptions
+        are released and its on_done callback is called; the other brackets are not affected.
+    '''
+
+    def __init__(self, ib: IB, market_data: MarketDataManager = None):
+        self.ib = ib
+        self.market_data = market_data
+        self.brackets: Dict[int, Bracket] = {}
+        ib.orderStatusEvent += self.__on_order_status
+
+    def add(self, parent: Optional[Trade], take_profit: Trade, stop_loss: Trade, name: str = '',
+            contracts: List[Contract] = None, on_done: Callable[[Bracket], None] = None) -> Bracket:
+        ''' contracts: market data subscriptions (of market_data) to release when the bracket is done '''
+        bracket = Bracket(name, parent, take_profit, stop_loss, contracts or [], on_done)
+        for trade in bracket.trades():
+            self.brackets[trade.order.orderId] = bracket
+        # the orders may have been filled before being added
+        for trade in bracket.trades():
+            self.__on_order_status(trade)
+        return bracket
+
+    def active(self) -> List[Bracket]:
+        return list({id(b): b for b in self.brackets.values()}.values())
+
+    def close(self) -> None:
+        self.ib.orderStatusEvent -= self.__on_order_status
+
+    def __on_order_status(self, trade: Trade) -> None:
+        bracket = self.brackets.get(trade.order.orderId)
+        if bracket is None or bracket.result:
+            return
+        status = trade.orderStatus.status
+        if status == 'Filled' and trade.order.orderId == bracket.take_profit.order.orderId:
+            self.__finish(bracket, 'take_profit')
+        elif status == 'Filled' and trade.order.orderId == bracket.stop_loss.order.orderId:
+            self.__finish(bracket, 'stop_loss')
+        elif bracket.take_profit.orderStatus.status in DONE_STATES and \
+                bracket.stop_loss.orderStatus.status in DONE_STATES:
+            self.__finish(bracket, 'cancelled')
+
+    def __finish(self, bracket: Bracket, result: str) -> None:
+        bracket.result = result
+        for trade in bracket.trades():
+            self.brackets.pop(trade.order.orderId, None)
+        if self.market_data:
+            for contract in bracket.contracts:
+                self.market_data.set_hot(contract, False)
+                self.market_data.release(contract)
+        print(f"bracket {bracket.name} done: {result}")
+        bracket.done.set()
+        if bracket.on_done:
+            bracket.on_done(bracket)
@@ -0,0 +1,110 @@
+import asyncio
+import json
+import os
+from datetime import datetime
+from typing import Dict, List, Optional, Set, Tuple
+
+from ib_insync import IB, Contract, OptionChain
+
+from .contract_cache import CACHE_DIR
+
+Key = Tuple[int, str, str]
+
+
+class ChainCache:
+    ''' Cache of the reqSecDefOptParams option chains, kept in memory and persisted in a json file.
+        Chains are indexed by (underlying conId, exchange, trading class) and dropped once their
+        last expiration has passed. CME adds strikes as the underlying moves, so the chains of an
+        underlying are requested once per session; the saved ones are only used when IB sends none.
+    '''
+
+    def __init__(self, path: str = os.path.join(CACHE_DIR, 'chains.json')):
+        self.path = path
+        self.chains: Dict[Key, OptionChain] = {}
+        # underlyings refreshed from IB in this session
+        self.refreshed: Set[int] = set()
+        # underlyings being refreshed by start_background_refresh
+        self.pending: Dict[int, asyncio.Task] = {}
+        if os.path.exists(path):
+            with open(path, 'r') as file:
+                self.__index([OptionChain(**c) for c in json.load(file)])
+        self.evict_expired()
+
+    def __index(self, chains: List[OptionChain]) -> None:
+        for c in chains:
+            self.chains[(c.underlyingConId, c.exchange, c.tradingClass)] = c
+
+    def __save(self) -> None:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump([c._asdict() for c in self.chains.values()], file)
+        os.replace(tmp_path, self.path)
+
+    def evict_expired(self, today: Optional[str] = None) -> None:
+        ''' today: in format YYYYMMDD, defaults to the current date '''
+        today = today or datetime.today().strftime('%Y%m%d')
+        self.chains = {k: c for k, c in self.chains.items()
+                       if c.expirations and max(c.expirations) >= today}
+
+    def get(self, ib: IB, contract: Contract, trading_class: str) -> OptionChain:
+        ''' gets the option chain for a given qualified contract and trading class,
+            only requesting the chains to IB the first time the contract is used in the session '''
+        self.evict_expired()
+        if contract.conId not in self.refreshed:
+            self.refresh(ib, contract)
+        return self.__lookup(contract, trading_class)
+
+    async def get_async(self, ib: IB, contract: Contract, trading_class: str) -> OptionChain:
+        ''' async version of get, waits for a background refresh of the contract if there is one '''
+        self.evict_expired()
+        if contract.conId in self.pending:
+            await self.pending[contract.conId]
+        elif contract.conId not in self.refreshed:
+            await self.refresh_async(ib, contract)
+        return self.__lookup(contract, trading_class)
+
+    def __lookup(self, contract: Contract, trading_class: str) -> OptionChain:
+        key = (contract.conId, contract.exchange, trading_class)
+        if key not in self.chains:
+            raise ValueError(f'no option chain of trading class {trading_class} for {contract.localSymbol or contract.conId} on {contract.exchange}')
+        return self.chains[key]
+
+    def refresh(self, ib: IB, contract: Contract) -> None:
+        self.__update(contract, ib.reqSecDefOptParams(contract.symbol, contract.exchange, contract.secType, contract.conId))
+
+    async def refresh_async(self, ib: IB, contract: Contract) -> None:
+        self.__update(contract, await ib.reqSecDefOptParamsAsync(contract.symbol, contract.exchange, contract.secType, contract.conId))
+
+    def start_background_refresh(self, ib: IB, contract: Contract) -> Optional[asyncio.Task]:
+        ''' refreshes the chains of the contract in the background, once per session
+            (e.g. right after connecting, so the strategies do not wait for it) '''
+        if contract.conId in self.refreshed:
+            return None
+        if contract.conId not in self.pending:
+            task = asyncio.ensure_future(self.refresh_async(ib, contract))
+            task.add_done_callback(lambda _: self.pending.pop(contract.conId, None))
+            self.pending[contract.conId] = task
+        return self.pending[contract.conId]
+
+    def __update(self, contract: Contract, chains: List[OptionChain]) -> None:
+        self.refreshed.add(contract.conId)
+        if not chains:
+            return
+        self.__index(chains)
+        self.evict_expired()
+        self.__save()
+
+
+_cache: Optional[ChainCache] = None
+
+def get_chain_cache() -> ChainCache:
+    global _cache
+    if _cache is None:
+        _cache = ChainCache()
+    return _cache
+
+def set_chain_cache(cache: ChainCache) -> None:
+    ''' replaces the default cache, e.g. with one in a temporary directory '''
+    global _cache
+    _cache = cache
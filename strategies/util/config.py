@@ -1,9 +1,161 @@
+''' config.yaml, parsed and validated once and cached; watch() reloads it when it changes.
+    A reload only reaches the strategies that have not started: open positions keep their target and stop.
+'''
+import asyncio
 import os
-from typing import Any, Dict
+from dataclasses import MISSING, dataclass, fields
+from typing import Any, Callable, Dict, Optional
+
 import yaml
 
+CONFIG_PATH = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'config.yaml')
+
+
+class ConfigError(ValueError):
+    pass
+
+
+def _number(section: str, name: str, value: Any, low: float = None, high: float = None) -> float:
+    if isinstance(value, bool) or not isinstance(value, (int, float)):
+        raise ConfigError(f'{section}.{name}: must be a number, got {value!r}')
+    if (low is not None and value <= low) or (high is not None and value >= high):
+        raise ConfigError(f'{section}.{name}: must be between {low} and {high} (excluded), got {value}')
+    return value
+
+
+@dataclass(frozen=True)
+class StrategyConfig:
+    ''' parameters of a strategy section. The checks that depend on the class (e.g. its required
+        parameters) are done when it is loaded, see util.strategy.Strategy.validate_config '''
+    name: str
+    cls: str
+    call_delta: float
+    put_delta: float
+    target: float
+    stop: float
+    call_wing_width: Optional[float] = None
+    put_wing_width: Optional[float] = None
+    quantity: Optional[int] = None
+    place_orders: bool = True
+    schedule: Optional[str] = None
+
+    def __post_init__(self):
+        if not isinstance(self.cls, str) or '.' not in self.cls:
+            raise ConfigError(f'{self.name}.class: must be module.Class, got {self.cls!r}')
+        _number(self.name, 'call_delta', self.call_delta, 0, 1)
+        _number(self.name, 'put_delta', self.put_delta, -1, 0)
+        _number(self.name, 'target', self.target, 0)
+        _number(self.name, 'stop', self.stop, 0)
+        for name in ('call_wing_width', 'put_wing_width'):
+            value = getattr(self, name)
+            if value is not None and _number(self.name, name, value, 0) % 5 != 0:
+                raise ConfigError(f'{self.name}.{name}: must be a multiple of 5 (the strikes are), got {value}')
+        if self.quantity is not None and (isinstance(self.quantity, bool) or not isinstance(self.quantity, int) or self.quantity <= 0):
+            raise ConfigError(f'{self.name}.quantity: must be a positive integer, got {self.quantity!r}')
+        if not isinstance(self.place_orders, bool):
+            raise ConfigError(f'{self.name}.place_orders: must be true or false, got {self.place_orders!r}')
+        if self.schedule is not None:
+            from .scheduler import ScheduleRule
+            try:
+                ScheduleRule.parse(self.schedule)
+            except Exception as e:
+                raise ConfigError(f'{self.name}.schedule: {self.schedule!r} is not valid ({e})')
+
+    @classmethod
+    def parse(cls, name: str, section: Dict[str, Any]) -> 'StrategyConfig':
+        allowed = {f.name for f in fields(cls)} - {'name', 'cls'}
+        unknown = set(section) - allowed - {'class'}
+        if unknown:
+            raise ConfigError(f'{name}: unknown parameters {sorted(unknown)}')
+        missing = {f.name for f in fields(cls) if f.default is MISSING} - {'name', 'cls'} - set(section)
+        if 'class' not in section:
+            missing.add('class')
+        if missing:
+            raise ConfigError(f'{name}: missing parameters {sorted(missing)}')
+        values = {k: v for k, v in section.items() if k != 'class'}
+        return cls(name=name, cls=section['class'], **values)
+
+
+class Config:
+    ''' a parsed and validated config.yaml '''
+
+    def __init__(self, sections: Dict[str, Any], mtime: float = 0):
+        self.sections = sections
+        self.mtime = mtime
+        self.strategies: Dict[str, StrategyConfig] = {
+            name: StrategyConfig.parse(name, section) for name, section in sections.items()
+            if isinstance(section, dict) and 'class' in section}
+        self.__validate()
+
+    def __validate(self) -> None:
+        for section in ('orchestrator', 'backtest'):
+            for name in self.sections.get(section, {}).get('strategies', []):
+                if name not in self.strategies:
+                    raise ConfigError(f'{section}.strategies: {name} is not a strategy section')
+        sweep = self.sections.get('sweep', {}).get('strategies', {})
+        for name, parameters in sweep.items():
+            if name not in self.strategies:
+                raise ConfigError(f'sweep.strategies: {name} is not a strategy section')
+            for parameter, values in parameters.items():
+                if not isinstance(values, list) or not values:
+                    raise ConfigError(f'sweep.strategies.{name}.{parameter}: must be a list of values')
+                for value in values:
+                    StrategyConfig.parse(name, {**self.sections[name], parameter: value})
+
+    def section(self, name: str) -> Dict[str, Any]:
+        if name not in self.sections:
+            raise ConfigError(f'there is no {name} section in config.yaml')
+        # a copy, so the cached config cannot be changed by the callers
+        return dict(self.sections[name] or {})
+
+
+def load(path: str = CONFIG_PATH) -> Config:
+    mtime = os.stat(path).st_mtime
+    with open(path, 'r') as file:
+        return Config(yaml.safe_load(file) or {}, mtime)
+
+
+_config: Optional[Config] = None
+
+
+def get() -> Config:
+    ''' the cached config, loaded on the first call '''
+    global _config
+    if _config is None:
+        _config = load()
+    return _config
+
+
 def get_config(strategy: str) -> Dict[str, Any]:
-    dir_path = os.path.dirname(os.path.realpath(__file__))
-    file_path = os.path.join(dir_path, '..', 'config.yaml')
-    with open(file_path, 'r') as file:
-        return yaml.safe_load(file)[strategy]
\ No newline at end of file
+    return get().section(strategy)
+
+
+def reload(path: str = CONFIG_PATH) -> Optional[Config]:
+    ''' loads the file again; the new config replaces the cached one only if it is valid.
+        Returns it, or None if it is not valid '''
+    global _config
+    try:
+        config = load(path)
+    except (ConfigError, yaml.YAMLError) as e:
+        print(f'config.yaml not reloaded: {e}')
+        return None
+    _config = config
+    return config
+
+
+async def watch(on_change: Callable[[Config], None] = None, interval: float = 1.0, path: str = CONFIG_PATH) -> None:
+    ''' reloads the file every time its modification time changes, and calls on_change with the new
+        config when it is valid '''
+    mtime = get().mtime
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            current = os.stat(path).st_mtime
+        except OSError:
+            continue
+        if current == mtime:
+            continue
+        mtime = current
+        config = reload(path)
+        if config and on_change:
+            on_change(config)
@@ -0,0 +1,123 @@
+import json
+import os
+import sqlite3
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from ib_insync import IB, Contract
+from ib_insync import util as ibUtil
+
+from . import metrics
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', 'cache')
+
+Key = Tuple[str, str, str, float, str, str, str]
+
+
+def contract_key(contract: Contract) -> Key:
+    ''' the fields that identify a contract before it is qualified '''
+    return (contract.secType, contract.symbol, contract.lastTradeDateOrContractMonth, float(contract.strike or 0.0),
+            contract.right, contract.tradingClass, contract.exchange)
+
+
+class ContractCache:
+    ''' conId cache of qualified contracts, kept in memory and persisted in SQLite.
+        Entries are evicted once the contract expiration has passed.
+    '''
+
+    def __init__(self, path: str = os.path.join(CACHE_DIR, 'contracts.sqlite')):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.con = sqlite3.connect(path)
+        self.con.execute('''
+            CREATE TABLE IF NOT EXISTS contracts (
+                sec_type TEXT NOT NULL,
+                symbol TEXT NOT NULL,
+                expiry TEXT NOT NULL,
+                strike REAL NOT NULL,
+                opt_right TEXT NOT NULL,
+                trading_class TEXT NOT NULL,
+                exchange TEXT NOT NULL,
+                last_trade_date TEXT NOT NULL,
+                fields TEXT NOT NULL,
+                PRIMARY KEY (sec_type, symbol, expiry, strike, opt_right, trading_class, exchange)
+            )''')
+        self.entries: Dict[Key, dict] = {}
+        self.evict_expired()
+        self.entries = {
+            tuple(row[:7]): json.loads(row[7])
+            for row in self.con.execute('''SELECT sec_type, symbol, expiry, strike, opt_right, trading_class, exchange, fields
+                                           FROM contracts''')}
+
+    def evict_expired(self, today: Optional[str] = None) -> None:
+        ''' today: in format YYYYMMDD, defaults to the current date '''
+        today = today or datetime.today().strftime('%Y%m%d')
+        with self.con:
+            self.con.execute('DELETE FROM contracts WHERE last_trade_date < ?', (today,))
+        self.entries = {k: v for k, v in self.entries.items()
+                        if v.get('lastTradeDateOrContractMonth', '')[:8] >= today}
+
+    def get(self, contract: Contract) -> Optional[dict]:
+        return self.entries.get(contract_key(contract))
+
+    def put(self, key: Key, qualified: Contract) -> None:
+        fields = ibUtil.dataclassNonDefaults(qualified)
+        self.entries[key] = fields
+        with self.con:
+            self.con.execute('INSERT OR REPLACE INTO contracts VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                             (*key, qualified.lastTradeDateOrContractMonth[:8], json.dumps(fields)))
+
+
+_cache: Optional[ContractCache] = None
+
+def get_contract_cache() -> ContractCache:
+    global _cache
+    if _cache is None:
+        _cache = ContractCache()
+    return _cache
+
+def set_contract_cache(cache: ContractCache) -> None:
+    ''' replaces the default cache, e.g. with one in a temporary directory '''
+    global _cache
+    _cache = cache
+
+
+def qualify_contracts(ib: IB, *contracts: Contract, cache: ContractCache = None) -> List[Contract]:
+    ''' Same as ib.qualifyContracts, but only the contracts that are not in the cache are sent to IB.
+        The contracts are updated in place; returns the ones that could be qualified.
+    '''
+    cache = cache or get_contract_cache()
+    with metrics.span('qualifyContracts', contracts=len(contracts)) as span:
+        keys, unresolved = resolve_cached(cache, contracts)
+        span.tag(requested=len(unresolved))
+        if unresolved:
+            for contract in ib.qualifyContracts(*unresolved):
+                cache.put(keys[id(contract)], contract)
+
+    return [c for c in contracts if c.conId]
+
+
+async def qualify_contracts_async(ib: IB, *contracts: Contract, cache: ContractCache = None) -> List[Contract]:
+    ''' async version of qualify_contracts '''
+    cache = cache or get_contract_cache()
+    with metrics.span('qualifyContracts', contracts=len(contracts)) as span:
+        keys, unresolved = resolve_cached(cache, contracts)
+        span.tag(requested=len(unresolved))
+        if unresolved:
+            for contract in await ib.qualifyContractsAsync(*unresolved):
+                cache.put(keys[id(contract)], contract)
+
+    return [c for c in contracts if c.conId]
+
+
+def resolve_cached(cache: ContractCache, contracts: Tuple[Contract, ...]) -> Tuple[Dict[int, Key], List[Contract]]:
+    ''' fills the cached contracts in place. Returns the keys of the contracts and the unresolved ones '''
+    keys = {id(c): contract_key(c) for c in contracts}
+    unresolved = []
+    for contract in contracts:
+        fields = cache.get(contract)
+        if fields:
+            for name, value in fields.items():
+                setattr(contract, name, value)
+        else:
+            unresolved.append(contract)
+    return keys, unresolved
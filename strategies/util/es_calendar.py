@@ -0,0 +1,164 @@
+import json
+import os
+from datetime import date, timedelta
+from typing import Dict, List, Optional
+
+
+QUARTERLY_MONTHS = (3, 6, 9, 12)
+
+
+def _nth_weekday(year: int, month: int, weekday: int, n: int) -> date:
+    ''' nth ocurrence (1 based) of the weekday (0 is monday) in the month. n=-1 is the last one '''
+    if n > 0:
+        first = date(year, month, 1)
+        return first + timedelta(days=(weekday - first.weekday()) % 7 + 7 * (n - 1))
+    last = (date(year, month + 1, 1) if month < 12 else date(year + 1, 1, 1)) - timedelta(days=1)
+    return last - timedelta(days=(last.weekday() - weekday) % 7)
+
+
+def _easter(year: int) -> date:
+    ''' anonymous gregorian algorithm '''
+    a, b, c = year % 19, year // 100, year % 100
+    d, e = b // 4, b % 4
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = c // 4, c % 4
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    month = (h + l - 7 * m + 114) // 31
+    day = (h + l - 7 * m + 114) % 31 + 1
+    return date(year, month, day)
+
+
+def _observed(d: date) -> date:
+    if d.weekday() == 5:
+        return d - timedelta(days=1)
+    if d.weekday() == 6:
+        return d + timedelta(days=1)
+    return d
+
+
+def holidays(year: int) -> List[date]:
+    ''' US equity market holidays, when no ES options expire '''
+    days = [
+        _observed(date(year, 1, 1)),
+        _nth_weekday(year, 1, 0, 3),    # Martin Luther King Jr. Day
+        _nth_weekday(year, 2, 0, 3),    # Presidents' Day
+        _easter(year) - timedelta(days=2),   # Good Friday
+        _nth_weekday(year, 5, 0, -1),   # Memorial Day
+        _observed(date(year, 7, 4)),
+        _nth_weekday(year, 9, 0, 1),    # Labor Day
+        _nth_weekday(year, 11, 3, 4),   # Thanksgiving
+        _observed(date(year, 12, 25)),
+    ]
+    if year >= 2022:
+        days.append(_observed(date(year, 6, 19)))
+    return sorted(d for d in days if d.year == year)
+
+
+def week_of_month(day_of_month: int) -> int:
+    ''' gets the nth ocurrence of the given day of the month on that month'''
+    return (day_of_month - 1) // 7 + 1
+
+
+def trading_class(d: date) -> str:
+    week = week_of_month(d.day)
+    day = d.weekday()
+    if day == 4:
+        return 'EW' + str(week)
+    else:
+        return 'E' + str(week) + chr(65+day).upper()
+
+
+def future_expiration(year: int, month: int) -> date:
+    ''' the quarterly ES future expires the third friday of the month '''
+    return _nth_weekday(year, month, 4, 3)
+
+
+def roll_date(year: int, month: int) -> date:
+    ''' volume rolls to the next quarterly future 8 days before expiration (the thursday of the previous week) '''
+    return future_expiration(year, month) - timedelta(days=8)
+
+
+def _front_future(d: date) -> date:
+    ''' the expiration month (day 1) of the front quarterly future on the given date '''
+    year, month = d.year, next(m for m in QUARTERLY_MONTHS if m >= d.month)
+    if d >= roll_date(year, month):
+        year, month = (year, month + 3) if month < 12 else (year + 1, 3)
+    return date(year, month, 1)
+
+
+class EsCalendar:
+    ''' ES options calendar of one year: for each date (YYYYMMDD) whether it is a trading day,
+        the trading class of the options that expire on it, the front quarterly future and its roll date.
+        It is built once per year and stored as json, lookups are dict accesses.
+    '''
+
+    def __init__(self, year: int, days: Dict[str, dict]):
+        self.year = year
+        self.days = days
+
+    @classmethod
+    def build(cls, year: int) -> 'EsCalendar':
+        closed = set(holidays(year))
+        days = {}
+        d = date(year, 1, 1)
+        while d.year == year:
+            trading = d.weekday() < 5 and d not in closed
+            front = _front_future(d)
+            days[d.strftime('%Y%m%d')] = {
+                'trading': trading,
+                'trading_class': trading_class(d) if trading else None,
+                'future': front.strftime('%Y%m'),
+                'roll_date': roll_date(front.year, front.month).strftime('%Y%m%d'),
+            }
+            d += timedelta(days=1)
+        return cls(year, days)
+
+    @classmethod
+    def load(cls, year: int, path: str = None) -> 'EsCalendar':
+        ''' loads the calendar of the year, building and saving it the first time '''
+        # imported here: contract_cache loads ib_insync, which the schedule rules do not need
+        from .contract_cache import CACHE_DIR
+        path = path or os.path.join(CACHE_DIR, f'es_calendar_{year}.json')
+        if os.path.exists(path):
+            with open(path, 'r') as file:
+                return cls(year, json.load(file))
+        calendar = cls.build(year)
+        calendar.save(path)
+        return calendar
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as file:
+            json.dump(self.days, file)
+
+    def day(self, d: date) -> dict:
+        return self.days[d.strftime('%Y%m%d')]
+
+    def is_expiration(self, d: date) -> bool:
+        return self.day(d)['trading']
+
+    def trading_class(self, d: date) -> Optional[str]:
+        ''' trading class of the options expiring on the date, None when nothing expires '''
+        return self.day(d)['trading_class']
+
+    def front_future(self, d: date) -> str:
+        ''' contract month (YYYYMM) of the front ES future, already rolled '''
+        return self.day(d)['future']
+
+    def roll_date(self, d: date) -> str:
+        return self.day(d)['roll_date']
+
+
+_calendars: Dict[int, EsCalendar] = {}
+
+def get_calendar(year: int) -> EsCalendar:
+    if year not in _calendars:
+        _calendars[year] = EsCalendar.load(year)
+    return _calendars[year]
+
+
+def get_day(d: date) -> dict:
+    return get_calendar(d.year).day(d)
@@ -1,17 +1,32 @@
-from asyncio import Future
+import asyncio
 import math
-from datetime import datetime, timedelta, time
-from typing import List
+from bisect import bisect_left
+from datetime import date, datetime, timedelta, time
+from typing import Dict, List
 from cvxpy import Chain
 
-from ib_insync import IB, FuturesOption, Ticker
-from .options import get_option_chain
+from ib_insync import IB, Future, FuturesOption, Ticker
+from . import black76
+from . import es_calendar
+from . import metrics
+from .contract_cache import qualify_contracts, qualify_contracts_async
+from .options import get_option_chain, get_option_chain_async
 
-def get_ES_contract(ib: IB, year_mont: str) -> Future:
-    es = Future('ES', '202303', 'CME')
-    ib.qualifyContracts(es)
+def now() -> datetime:
+    ''' local time used to resolve expirations. It is replaced when replaying a recorded session '''
+    return datetime.now()
+
+def get_ES_contract(ib: IB, year_mont: str = None) -> Future:
+    ''' year_mont: contract month (YYYYMM), defaults to the front month (already rolled) '''
+    year_mont = year_mont or get_front_month()
+    es = Future('ES', year_mont, 'CME')
+    qualify_contracts(ib, es)
     return es
 
+def get_front_month() -> str:
+    today = now().date()
+    return es_calendar.get_calendar(today.year).front_future(today)
+
 def round_2tick(x):
     return round(x*4)/4
 
@@ -22,21 +37,25 @@ def get_0DTE_expiration() -> str:
     return get_expiration(0)
 
 def get_expiration(daysdelta: int) -> str:
-    dt: datetime = datetime.today() + timedelta(days=daysdelta)
+    dt = __expiration_date(daysdelta)
     # format the date in the format 'YYYYMMDD'
     return dt.strftime('%Y%m%d')
 
 
 def get_DTE_trading_class(dte: int):
-    dt: datetime = datetime.today() + timedelta(days=dte)
-    
-    week = __f2(dt.day)
-    day = dt.weekday()
-    res = 'E' + str(week)
-    if day == 4:
-        return 'EW' + str(week)
-    else:
-        return 'E' + str(week) + chr(65+day).upper()
+    return get_trading_class(__expiration_date(dte))
+
+
+def get_trading_class(dt: date) -> str:
+    trading_cls = es_calendar.get_calendar(dt.year).trading_class(dt)
+    assert trading_cls, f"there are no ES options expiring on {dt}"
+    return trading_cls
+
+
+def __expiration_date(dte: int) -> date:
+    dt: date = now().date() + timedelta(days=dte)
+    assert es_calendar.get_calendar(dt.year).is_expiration(dt), f"there are no ES options expiring on {dt}"
+    return dt
     
     
 def get_call_ticker(ib: IB, contract: Future, expiration: str, delta: float) -> Ticker:
@@ -52,83 +71,144 @@ def get_ticker(ib: IB, contract: Future, expiration: str, delta: float, write: s
        contract: must be qualified
        write: C or P
        '''
-    # get the contract market price first
-    [ticker] = ib.reqTickers(contract)
-    price = ticker.marketPrice()
-    
-    # parse the string to a datetime object
-    exp_dt = datetime.strptime(expiration, '%Y%m%d')
-    today = datetime.combine(datetime.now().date(), time.min)
-    assert exp_dt >= today, "today's date must be greater or equal than  the expiration date"
-    trading_cls = get_DTE_trading_class((exp_dt - today).days)
-    
-    chain = get_option_chain(ib, contract, trading_cls)
-    
-    if (write == 'C'):
-        strikes = [strike for strike in chain.strikes
-            if strike % 5 == 0
-            and price - 5 < strike < price + 90]
-    else:
-        strikes = [strike for strike in chain.strikes
-            if strike % 5 == 0
-            and price - 90 < strike < price + 5]
+    return ChainSnapshot(ib, contract, expiration, rights=write).get_ticker(delta, write)
     
-    ## Select call strike
-    contracts = [FuturesOption(contract.symbol, expiration, strike, write, 'CME', '50', 'USD', tradingClass=trading_cls) for strike in strikes]
-    contracts = ib.qualifyContracts(*contracts)
-    tickers = ib.reqTickers(*contracts)
-    tickers = list(filter(lambda t: abs(get_ticker_delta(t)) >= 0.01, tickers))
-
-    deltas = [get_ticker_delta(t) for t in tickers]
-    # print(deltas)
-    return tickers[__get_delta_index(deltas, delta)]
     
-    
-def get_ticker_delta(t: Ticker) -> float:
+def get_ticker_delta(t: Ticker, fallback: float = None) -> float:
+    ''' fallback: delta to use when IB has not sent the greeks yet (e.g. computed with black76) '''
     if (t.lastGreeks and t.lastGreeks.delta):
         return t.lastGreeks.delta
     elif t.askGreeks and t.bidGreeks:
         return (t.askGreeks.delta + t.bidGreeks.delta)/2.0    
     elif t.modelGreeks:
         return t.modelGreeks.delta
+    elif fallback is not None and not math.isnan(fallback):
+        return fallback
     else:
         print('this ticker has no greek?')
         print(t)
         return None
-    
-def __get_delta_index(deltas: List[float], reference: float) -> int:
-    ''' reference: the reference delta
-        returns the index of the closest element to the reference delta
+
+
+class ChainSnapshot:
+    ''' Snapshot of the underlying price and the call/put wings of an option chain for one expiration.
+        Everything is fetched in a single round trip (one qualifyContracts and one reqTickers for
+        both wings, or both wings concurrently with create_async), and the tickers of each right are kept sorted by delta so the strike nearest
+        to a given delta is found by binary search.
+        contract: must be qualified
+        rights: the wings to fetch, 'CP' for both
     '''
-    _deltas = sorted(deltas)
-    # print(_deltas)
-    above_delta = next(d for d in _deltas if d > reference)
-    below_delta = next(d for d in reversed(_deltas) if d < reference)
-    
-    # print('up_delta', above_delta)
-    # print('down_delta', below_delta)
-    if abs(above_delta - reference) <= abs(below_delta - reference):
-        return deltas.index(above_delta)
-    else: 
-        return deltas.index(below_delta)
-    
-    
-    
-def __f2(day_of_month):
-    ''' gets the nth ocurrence of the given day of the month on that month'''
-    actual_day = day_of_month
-    counter = 0
-    while actual_day > 0:
-        actual_day = actual_day - 7
-        counter = counter + 1
-    return counter
-    
-# def __week_of_month(dt):
-#     """ Returns the week of the month for the specified date.
-#     """
 
-#     first_day = dt.replace(day=1)
+    def __init__(self, ib: IB, contract: Future, expiration: str, rights: str = 'CP'):
+        self.__setup(contract, expiration)
+
+        # get the contract market price first
+        [ticker] = _req_tickers(ib, contract)
+        self.price = ticker.marketPrice()
+
+        chain = get_option_chain(ib, contract, self.trading_class)
 
-#     dom = dt.day
-#     adjusted_dom = dom + first_day.weekday()
-#     return int(math.ceil(adjusted_dom/7.0))
\ No newline at end of file
+        contracts = qualify_contracts(ib, *self.__wing_contracts(chain, rights))
+        self.__index(_req_tickers(ib, *contracts), rights)
+
+    @classmethod
+    async def create_async(cls, ib: IB, contract: Future, expiration: str, rights: str = 'CP') -> 'ChainSnapshot':
+        ''' async version of the constructor: the underlying price and the chain are requested
+            concurrently, and so are the call and put wings '''
+        self = cls.__new__(cls)
+        self.__setup(contract, expiration)
+
+        [ticker], chain = await asyncio.gather(
+            _req_tickers_async(ib, contract),
+            get_option_chain_async(ib, contract, self.trading_class))
+        self.price = ticker.marketPrice()
+
+        async def get_wing(right: str) -> List[Ticker]:
+            contracts = await qualify_contracts_async(ib, *self.__wing_contracts(chain, right))
+            return await _req_tickers_async(ib, *contracts)
+
+        wings = await asyncio.gather(*[get_wing(right) for right in rights])
+        self.__index([t for wing in wings for t in wing], rights)
+        return self
+
+    def __setup(self, contract: Future, expiration: str) -> None:
+        self.contract = contract
+        self.expiration = expiration
+
+        # parse the string to a datetime object
+        exp_dt = datetime.strptime(expiration, '%Y%m%d')
+        today = datetime.combine(now().date(), time.min)
+        assert exp_dt >= today, "today's date must be greater or equal than  the expiration date"
+        self.trading_class = get_trading_class(exp_dt.date())
+
+    def __wing_contracts(self, chain: Chain, rights: str) -> List[FuturesOption]:
+        return [FuturesOption(self.contract.symbol, self.expiration, strike, right, 'CME', '50', 'USD', tradingClass=self.trading_class)
+                for right in rights
+                for strike in self.__wing_strikes(chain.strikes, right)]
+
+    def __index(self, tickers: List[Ticker], rights: str) -> None:
+        # local greeks for the tickers that have no greeks from TWS yet
+        local_deltas = black76.ticker_greeks(tickers, self.price, now=now().astimezone())['delta'] if tickers else []
+
+        # per right: tickers and deltas sorted by delta (ascending)
+        self.tickers: Dict[str, List[Ticker]] = {}
+        self.deltas: Dict[str, List[float]] = {}
+        for right in rights:
+            pairs = [(get_ticker_delta(t, float(d)), t) for t, d in zip(tickers, local_deltas) if t.contract.right == right]
+            pairs = sorted(((d, t) for d, t in pairs if d is not None and abs(d) >= 0.01), key=lambda p: p[0])
+            self.deltas[right] = [d for d, _ in pairs]
+            self.tickers[right] = [t for _, t in pairs]
+
+    def __wing_strikes(self, strikes: List[float], right: str) -> List[float]:
+        if (right == 'C'):
+            return [strike for strike in strikes
+                if strike % 5 == 0
+                and self.price - 5 < strike < self.price + 90]
+        else:
+            return [strike for strike in strikes
+                if strike % 5 == 0
+                and self.price - 90 < strike < self.price + 5]
+
+    def get_call_ticker(self, delta: float) -> Ticker:
+        assert delta > 0, "the delta of a call option must be positive"
+        return self.get_ticker(delta, 'C')
+
+    def get_put_ticker(self, delta: float) -> Ticker:
+        assert delta < 0, "the delta of a put option must be negative"
+        return self.get_ticker(delta, 'P')
+
+    def get_ticker(self, delta: float, right: str) -> Ticker:
+        ''' returns the ticker with the closest delta to the reference delta (ties go to the higher delta) '''
+        return self.tickers[right][_get_delta_index(self.deltas[right], delta)]
+
+    def get_delta(self, ticker: Ticker) -> float:
+        ''' delta the ticker was selected with (from IB, or black76 when IB had not sent the greeks) '''
+        right = ticker.contract.right
+        return self.deltas[right][self.tickers[right].index(ticker)]
+
+
+def _req_tickers(ib: IB, *contracts) -> List[Ticker]:
+    with metrics.span('reqTickers', contracts=len(contracts)):
+        return ib.reqTickers(*contracts)
+
+
+async def _req_tickers_async(ib: IB, *contracts) -> List[Ticker]:
+    with metrics.span('reqTickers', contracts=len(contracts)):
+        return await ib.reqTickersAsync(*contracts)
+
+
+def _get_delta_index(deltas: List[float], reference: float) -> int:
+    ''' deltas: sorted in ascending order
+        reference: the reference delta
+        returns the index of the closest element to the reference delta
+    '''
+    assert deltas, "there are no deltas to choose from"
+    above = bisect_left(deltas, reference)
+    if above == len(deltas):
+        return above - 1
+    if above == 0:
+        return above
+    if abs(deltas[above] - reference) <= abs(deltas[above - 1] - reference):
+        return above
+    else:
+        return above - 1
@@ -1,48 +1,62 @@
 from ib_insync import IB, Trade
 from ib_insync import util as ibUtil
-import sys
+import time
 import datetime as dt
-import time as t
+from typing import Callable
+from zoneinfo import ZoneInfo
 
+from . import metrics
+from . import scheduler
+from .brackets import Bracket, BracketMonitor
 
-def disconnect_after_tp_or_sl(ib: IB, tp: Trade, sl: Trade) -> None:
-    
-    # def onExecDetails(trade: Trade,fill): 
-    #     # print(f'The trade {trade.order.orderId} has been filled with executio: {fill.execution}')
-    #     print('trade:', trade)
-    #     print('fill:', fill)
-    
-    def onOrderStatus(trade):
-        # check if the take profit or stop loss order has been filled
-        if trade.orderStatus.status == 'Filled' and \
-            (trade.order.orderId == tp.order.orderId or trade.order.orderId == sl.order.orderId):
-                
-            print(f"The {trade.order.action} order has been filled. order id: {trade.order.orderId}")
-            # disconnect from TWS/IB Gateway
-            ib.disconnect()
-            ibUtil.getLoop().stop()
-            
 
+def disconnect_after_tp_or_sl(ib: IB, tp: Trade, sl: Trade) -> None:
+    ''' Disconnects and stops the event loop once the take profit or the stop loss is filled.
+        To keep running other trades on the same connection use a BracketMonitor instead. '''
     
-
-    # ib.execDetailsEvent += onExecDetails 
+    def onDone(bracket: Bracket):
+        if bracket.result == 'cancelled':
+            return
+        trade = bracket.take_profit if bracket.result == 'take_profit' else bracket.stop_loss
+        print(f"The {trade.order.action} order has been filled. order id: {trade.order.orderId}")
+        # disconnect from TWS/IB Gateway
+        ib.disconnect()
+        ibUtil.getLoop().stop()
     
-    # register the order status event handler
-    ib.orderStatusEvent += onOrderStatus
+    BracketMonitor(ib).add(None, tp, sl, on_done=onDone)
     
     
-def wait_until(time_str: str, ib:IB = None): 
-    ''' target_time_str: in format hh:mm'''
-    target_time = dt.datetime.strptime(time_str, '%H:%M').time()
-    while True:
-        now = dt.datetime.now().time()
-        if now >= target_time:
+def watch_order_ack(trade: Trade, run: metrics.Run = None, on_ack: Callable[[float], None] = None) -> None:
+    ''' measures the time from now to the acknowledgement of the order (its first status after PendingSubmit),
+        records it in the metrics and ends the metrics run. on_ack: called with the seconds it took '''
+    start = time.perf_counter()
+
+    def onStatus(t: Trade):
+        if t.orderStatus.status in ('PendingSubmit', ''):
             return
-        else:
-            remaining_time = dt.datetime.combine(dt.datetime.today(), target_time) - dt.datetime.combine(dt.datetime.today(), now)
-            remaining_seconds = remaining_time.total_seconds()
-            print(f"Waiting {dt.timedelta(seconds=remaining_seconds)} until {target_time.strftime('%H:%M')}...")
-            if (ib):
-                ib.sleep(30)
-            else:
-                t.sleep(30)
\ No newline at end of file
+        trade.statusEvent -= onStatus
+        seconds = time.perf_counter() - start
+        metrics.record('order_ack', start, seconds, run, status=t.orderStatus.status)
+        metrics.end_run(run)
+        if on_ack:
+            on_ack(seconds)
+
+    trade.statusEvent += onStatus
+
+
+def wait_until(time_str: str, ib:IB = None, tz: str = None): 
+    ''' target_time_str: in format hh:mm, local time unless a timezone is given (e.g. America/New_York)
+        Sleeps until the target time in one go instead of polling, so it does not overshoot '''
+    target_time = dt.datetime.strptime(time_str, '%H:%M').time()
+    zone = ZoneInfo(tz) if tz else None
+    target = dt.datetime.combine(dt.datetime.now(zone).date(), target_time, zone).astimezone()
+    remaining_time = target - scheduler.now()
+    if remaining_time.total_seconds() <= 0:
+        return
+    print(f"Waiting {remaining_time} until {target_time.strftime('%H:%M')}...")
+    if (ib):
+        late_ms = ib.run(scheduler.sleep_until(target))
+    else:
+        # on the current loop (asyncio.run would close it and unset it, so IB().connect would fail after)
+        late_ms = ibUtil.run(scheduler.sleep_until(target))
+    print(f"{target_time.strftime('%H:%M')} reached ({late_ms:.1f} ms late)")
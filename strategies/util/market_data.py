@@ -0,0 +1,97 @@
+from collections import OrderedDict
+from typing import Dict, Hashable, List
+
+from ib_insync import IB, Contract, Ticker
+
+# default number of simultaneous market data lines of an IB account
+DEFAULT_MAX_LINES = 100
+
+
+def subscription_key(contract: Contract) -> Hashable:
+    ''' conId for regular contracts, the legs for BAG contracts (they have no conId) '''
+    if contract.conId:
+        return contract.conId
+    return (contract.secType, contract.symbol, contract.exchange,
+            tuple((l.conId, l.ratio, l.action) for l in contract.comboLegs or []))
+
+
+class Subscription:
+
+    def __init__(self, contract: Contract, ticker: Ticker):
+        self.contract = contract
+        self.ticker = ticker
+        self.refs = 0
+        self.hot = False
+
+
+class MarketDataManager:
+    ''' Shares the market data subscriptions of one IB connection.
+        Subscriptions are deduplicated by conId and reference counted. A released subscription keeps
+        streaming (so the next consumer gets a warm ticker) until its line is needed: when the number
+        of lines reaches max_lines, the least recently used released subscriptions are cancelled.
+        Hot subscriptions (e.g. the ES future, the legs of an open trade) are never evicted.
+    '''
+
+    def __init__(self, ib: IB, max_lines: int = DEFAULT_MAX_LINES):
+        self.ib = ib
+        self.max_lines = max_lines
+        # least recently used first
+        self.subscriptions: Dict[Hashable, Subscription] = OrderedDict()
+
+    def subscribe(self, contract: Contract, hot: bool = False, genericTickList: str = '') -> Ticker:
+        key = subscription_key(contract)
+        sub = self.subscriptions.get(key)
+        if sub is None:
+            self.__make_room(1)
+            sub = Subscription(contract, self.ib.reqMktData(contract, genericTickList))
+            self.subscriptions[key] = sub
+        self.subscriptions.move_to_end(key)
+        sub.refs += 1
+        sub.hot = sub.hot or hot
+        return sub.ticker
+
+    def subscribe_all(self, contracts: List[Contract], hot: bool = False) -> List[Ticker]:
+        self.__make_room(len([c for c in contracts if subscription_key(c) not in self.subscriptions]))
+        return [self.subscribe(c, hot) for c in contracts]
+
+    def release(self, contract: Contract) -> None:
+        ''' the consumer does not need the ticker anymore. It keeps streaming until its line is needed '''
+        sub = self.subscriptions.get(subscription_key(contract))
+        if sub and sub.refs > 0:
+            sub.refs -= 1
+
+    def set_hot(self, contract: Contract, hot: bool = True) -> None:
+        sub = self.subscriptions.get(subscription_key(contract))
+        if sub:
+            sub.hot = hot
+
+    def cancel(self, contract: Contract) -> None:
+        sub = self.subscriptions.pop(subscription_key(contract), None)
+        if sub:
+            self.ib.cancelMktData(sub.contract)
+
+    def cancel_idle(self) -> None:
+        ''' cancels every released subscription that is not hot '''
+        for key, sub in list(self.subscriptions.items()):
+            if sub.refs == 0 and not sub.hot:
+                self.cancel(sub.contract)
+
+    def close(self) -> None:
+        for sub in list(self.subscriptions.values()):
+            self.cancel(sub.contract)
+
+    def lines(self) -> int:
+        return len(self.subscriptions)
+
+    def __make_room(self, needed: int) -> None:
+        excess = self.lines() + needed - self.max_lines
+        if excess <= 0:
+            return
+        for key, sub in list(self.subscriptions.items()):
+            if excess <= 0:
+                break
+            if sub.refs == 0 and not sub.hot:
+                self.cancel(sub.contract)
+                excess -= 1
+        if excess > 0:
+            raise RuntimeError(f'market data line limit reached ({self.max_lines} lines in use)')
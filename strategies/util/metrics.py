@@ -0,0 +1,206 @@
+''' Timing of the entry path: spans, histograms and one record per strategy run.
+
+    with metrics.span('reqTickers', contracts=10) as s:
+        ...
+        s.tag(path='legs')
+
+    Disabled by default: span() then returns a shared object that does nothing, so the instrumented
+    code only pays for a function call and a flag check. configure() enables it from the metrics
+    section of config.yaml:
+      - every span is added to a histogram per name
+      - the spans of a run (start_run/end_run, one per strategy entry) are appended as one json line
+        to <path>/runs-YYYYMMDD.jsonl
+      - with a port, the histograms are served on http://127.0.0.1:<port>/metrics (Prometheus text format)
+'''
+import contextvars
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+# upper bounds of the histogram buckets, in seconds
+BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, float('inf')]
+
+_enabled = False
+_path: Optional[str] = None
+_lock = threading.Lock()
+_current_run: contextvars.ContextVar[Optional['Run']] = contextvars.ContextVar('metrics_run', default=None)
+
+
+class Histogram:
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, seconds: float) -> None:
+        with _lock:
+            self.counts[next(i for i, bound in enumerate(BUCKETS) if seconds <= bound)] += 1
+            self.sum += seconds
+            self.count += 1
+
+
+histograms: Dict[str, Histogram] = {}
+
+
+def observe(name: str, seconds: float) -> None:
+    histogram = histograms.get(name)
+    if histogram is None:
+        histogram = histograms.setdefault(name, Histogram())
+    histogram.observe(seconds)
+
+
+class Run:
+    ''' the spans of one strategy entry, from launch to the order acknowledgement '''
+
+    def __init__(self, name: str):
+        self.name = name
+        self.started = datetime.now()
+        self.start = time.perf_counter()
+        self.spans: List[Dict[str, Any]] = []
+        self.tags: Dict[str, Any] = {}
+        self.ended = False
+
+    def add(self, name: str, start: float, seconds: float, tags: Dict[str, Any]) -> None:
+        self.spans.append({'name': name, 'start_ms': round((start - self.start) * 1000, 3),
+                           'ms': round(seconds * 1000, 3), **tags})
+
+    def record(self) -> Dict[str, Any]:
+        return {'run': self.name, 'start': self.started.isoformat(), **self.tags,
+                'total_ms': round((time.perf_counter() - self.start) * 1000, 3), 'spans': self.spans}
+
+
+class Span:
+
+    def __init__(self, name: str, tags: Dict[str, Any]):
+        self.name = name
+        self.tags = tags
+        self.run = _current_run.get()
+
+    def tag(self, **tags) -> None:
+        self.tags.update(tags)
+
+    def __enter__(self) -> 'Span':
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type:
+            self.tags['error'] = exc_type.__name__
+        record(self.name, self.start, time.perf_counter() - self.start, self.run, **self.tags)
+
+
+class _NullSpan:
+
+    def tag(self, **tags) -> None:
+        pass
+
+    def __enter__(self) -> '_NullSpan':
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name: str, **tags) -> Span:
+    if not _enabled:
+        return _NULL_SPAN
+    return Span(name, tags)
+
+
+def record(name: str, start: float, seconds: float, run: Optional[Run] = None, **tags) -> None:
+    ''' adds a measure taken outside of a span (e.g. in a callback), start: perf_counter() at its start '''
+    if not _enabled:
+        return
+    observe(name, seconds)
+    if run and not run.ended:
+        run.add(name, start, seconds, tags)
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def start_run(name: str, **tags) -> Optional[Run]:
+    ''' the spans of the current task (and the tasks it creates afterwards) go to the new run '''
+    if not _enabled:
+        return None
+    run = Run(name)
+    run.tags.update(tags)
+    _current_run.set(run)
+    return run
+
+
+def end_run(run: Optional[Run]) -> None:
+    ''' writes the run record, once '''
+    if run is None or run.ended:
+        return
+    run.ended = True
+    observe('run', time.perf_counter() - run.start)
+    if _path:
+        os.makedirs(_path, exist_ok=True)
+        with open(os.path.join(_path, f"runs-{run.started.strftime('%Y%m%d')}.jsonl"), 'a') as file:
+            file.write(json.dumps(run.record(), default=str) + '\n')
+
+
+def current_run() -> Optional[Run]:
+    return _current_run.get()
+
+
+def exposition() -> str:
+    ''' the histograms in the Prometheus text format '''
+    lines = ['# TYPE strategy_span_seconds histogram']
+    with _lock:
+        for name, h in sorted(histograms.items()):
+            cumulative = 0
+            for bound, count in zip(BUCKETS, h.counts):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f'strategy_span_seconds_bucket{{span="{name}",le="{le}"}} {cumulative}')
+            lines.append(f'strategy_span_seconds_sum{{span="{name}"}} {h.sum}')
+            lines.append(f'strategy_span_seconds_count{{span="{name}"}} {h.count}')
+    return '\n'.join(lines) + '\n'
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if self.path != '/metrics':
+            self.send_error(404)
+            return
+        body = exposition().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(port: int) -> ThreadingHTTPServer:
+    ''' serves the histograms on localhost from a daemon thread '''
+    server = ThreadingHTTPServer(('127.0.0.1', port), _Handler)
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    return server
+
+
+def configure(config: Optional[Dict[str, Any]]) -> None:
+    ''' config: the metrics section of config.yaml (enabled, path, port), relative paths are relative to it '''
+    global _enabled, _path
+    config = config or {}
+    _enabled = bool(config.get('enabled', False))
+    if not _enabled:
+        return
+    path = config.get('path', 'metrics')
+    _path = path if os.path.isabs(path) else os.path.join(os.path.dirname(os.path.realpath(__file__)), '..', path)
+    if config.get('port'):
+        serve(config['port'])
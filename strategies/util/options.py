@@ -3,15 +3,22 @@ from cvxpy import Chain
 from ib_insync import util
 
 from ib_insync import IB, ComboLeg, Contract
+from . import metrics
+from .chain_cache import get_chain_cache
+from .contract_cache import qualify_contracts
 
 
 def get_option_chain(ib: IB, contract: Contract, trading_class: str) -> Chain:
-    ''' gets the option chain for a given qualified contract and trading class '''
-    chains = ib.reqSecDefOptParams(contract.symbol, contract.exchange, contract.secType, contract.conId)
-    # chainsDf = util.df(chains)
-    # print(chainsDf.to_string(max_colwidth=20))
-    # chainsDf = chainsDf[(chainsDf.exchange == 'CME') & (chainsDf.tradingClass == 'E3C')]
-    return next(c for c in chains if c.tradingClass == trading_class and c.exchange == contract.exchange)
+    ''' gets the option chain for a given qualified contract and trading class.
+        The chains are cached until they expire, reqSecDefOptParams is called once per contract and session '''
+    with metrics.span('get_option_chain', trading_class=trading_class):
+        return get_chain_cache().get(ib, contract, trading_class)
+
+
+async def get_option_chain_async(ib: IB, contract: Contract, trading_class: str) -> Chain:
+    ''' async version of get_option_chain '''
+    with metrics.span('get_option_chain', trading_class=trading_class):
+        return await get_chain_cache().get_async(ib, contract, trading_class)
 
 
 def create_ic(ib: IB, contracts: List[Contract]) -> Contract:
@@ -21,7 +28,7 @@ def create_ic(ib: IB, contracts: List[Contract]) -> Contract:
     # contract.secType = 'BAG'
     # contract.conId=28812380
     # contract =Future('BAG', '202303', 'CME', localSymbol='ESH3', multiplier='50', currency='USD')
-    ib.qualifyContracts(*contracts)
+    qualify_contracts(ib, *contracts)
     contract = Contract(symbol=contracts[0].symbol, secType='BAG', exchange='SMART', currency='USD')
     # print('bag contract:', contract)
     
@@ -36,7 +43,7 @@ def create_ic(ib: IB, contracts: List[Contract]) -> Contract:
 
 def create_double_cal(ib: IB, contracts: List[Contract]) -> Contract:
     
-    ib.qualifyContracts(*contracts)
+    qualify_contracts(ib, *contracts)
     contract = Contract(symbol=contracts[0].symbol, secType='BAG', exchange='SMART', currency='USD')
     
     leg1 = ComboLeg(conId=contracts[0].conId, ratio=1, action='SELL', exchange=contracts[0].exchange)
@@ -51,7 +58,7 @@ def create_double_cal(ib: IB, contracts: List[Contract]) -> Contract:
 
 def create_ici(ib: IB, contracts: List[Contract]) -> Contract:
     
-    ib.qualifyContracts(*contracts)
+    qualify_contracts(ib, *contracts)
     contract = Contract(symbol=contracts[0].symbol, secType='BAG', exchange='SMART', currency='USD')
     
     leg1 = ComboLeg(conId=contracts[0].conId, ratio=1, action='BUY', exchange=contracts[0].exchange)
@@ -0,0 +1,181 @@
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, List
+
+from ib_insync import IB, Contract, Order, Ticker, Trade
+from ib_insync import util as ibUtil
+
+from .contract_cache import ContractCache, contract_key, get_contract_cache, qualify_contracts_async, resolve_cached
+
+# the lower the sooner
+PRIORITY_ORDER = 0
+PRIORITY_QUALIFY = 1
+PRIORITY_DATA = 2
+PRIORITY_BULK = 3
+
+# TWS accepts up to 50 messages per second from a client
+MESSAGES_PER_SECOND = 50
+# historical data: no more than 60 requests in 10 minutes
+HISTORICAL_REQUESTS = 60
+HISTORICAL_PERIOD = 600
+
+
+class TokenBucket:
+    ''' Token bucket where the waiting requests are served by priority (then in arrival order).
+        consume() takes tokens without waiting, going into debt if needed, so the urgent
+        messages (orders) go out at once and the rest wait for the debt to be paid back.
+    '''
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.waiters: List[tuple] = []
+        self.counter = itertools.count()
+        self.drainer: asyncio.Task = None
+
+    def __refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def consume(self, tokens: float = 1) -> None:
+        self.__refill()
+        self.tokens -= tokens
+
+    async def acquire(self, tokens: float = 1, priority: int = PRIORITY_DATA) -> None:
+        tokens = min(tokens, self.capacity)
+        self.__refill()
+        if not self.waiters and self.tokens >= tokens:
+            self.tokens -= tokens
+            return
+        future = asyncio.get_event_loop().create_future()
+        heapq.heappush(self.waiters, (priority, next(self.counter), tokens, future))
+        if self.drainer is None or self.drainer.done():
+            self.drainer = asyncio.ensure_future(self.__drain())
+        await future
+
+    async def __drain(self) -> None:
+        while self.waiters:
+            self.__refill()
+            _, _, tokens, future = self.waiters[0]
+            if future.cancelled():
+                heapq.heappop(self.waiters)
+            elif self.tokens >= tokens:
+                heapq.heappop(self.waiters)
+                self.tokens -= tokens
+                future.set_result(None)
+            else:
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+
+
+class PacedIB:
+    ''' Wraps an IB client to stay within the TWS pacing limits:
+        - one token bucket per request class (every message, historical data requests)
+        - concurrent identical requests are merged into one
+        - the contracts qualified within batch_window seconds are qualified together (and only
+          the ones that are not in the contract cache)
+        - orders go out at once, the data requests wait for them
+        Everything else is delegated to the wrapped IB object, so it can be used in its place.
+    '''
+
+    def __init__(self, ib: IB, messages_per_second: float = MESSAGES_PER_SECOND,
+                 batch_window: float = 0.005, cache: ContractCache = None):
+        self.ib = ib
+        self.messages = TokenBucket(messages_per_second, messages_per_second)
+        self.historical = TokenBucket(HISTORICAL_REQUESTS / HISTORICAL_PERIOD, HISTORICAL_REQUESTS)
+        self.batch_window = batch_window
+        self.cache = cache or get_contract_cache()
+        self.inflight: Dict[Hashable, asyncio.Future] = {}
+        self.qualify_batch: Dict[Hashable, Contract] = {}
+        self.qualify_future: asyncio.Future = None
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.ib, name)
+
+    async def __merged(self, key: Hashable, request: Callable[[], Awaitable]) -> Any:
+        ''' runs the request, or waits for the identical one that is already in flight '''
+        if key not in self.inflight:
+            self.inflight[key] = asyncio.ensure_future(request())
+            self.inflight[key].add_done_callback(lambda _: self.inflight.pop(key, None))
+        return await asyncio.shield(self.inflight[key])
+
+    async def __chunks(self, items: List, priority: int, request: Callable[[List], Awaitable[List]]) -> List:
+        ''' sends the items in chunks of at most one second of messages (one message per item) '''
+        size = int(self.messages.capacity)
+        results = []
+        for i in range(0, len(items), size):
+            chunk = items[i:i+size]
+            await self.messages.acquire(len(chunk), priority)
+            results.append(asyncio.ensure_future(request(chunk)))
+        return [r for chunk in await asyncio.gather(*results) for r in chunk]
+
+    # orders
+
+    def placeOrder(self, contract: Contract, order: Order) -> Trade:
+        self.messages.consume(1)
+        return self.ib.placeOrder(contract, order)
+
+    def cancelOrder(self, order: Order, *args) -> Trade:
+        self.messages.consume(1)
+        return self.ib.cancelOrder(order, *args)
+
+    # contracts
+
+    async def qualifyContractsAsync(self, *contracts: Contract) -> List[Contract]:
+        _, unresolved = resolve_cached(self.cache, contracts)
+        if unresolved:
+            for c in unresolved:
+                self.qualify_batch.setdefault(contract_key(c), c)
+            if self.qualify_future is None:
+                self.qualify_future = asyncio.get_event_loop().create_future()
+                asyncio.get_event_loop().call_later(self.batch_window, lambda: asyncio.ensure_future(self.__flush_qualify()))
+            await asyncio.shield(self.qualify_future)
+            resolve_cached(self.cache, unresolved)
+        return [c for c in contracts if c.conId]
+
+    async def __flush_qualify(self) -> None:
+        batch, future = list(self.qualify_batch.values()), self.qualify_future
+        self.qualify_batch, self.qualify_future = {}, None
+        try:
+            await self.__chunks(batch, PRIORITY_QUALIFY, lambda chunk: qualify_contracts_async(self.ib, *chunk, cache=self.cache))
+            future.set_result(None)
+        except Exception as e:
+            future.set_exception(e)
+
+    def qualifyContracts(self, *contracts: Contract) -> List[Contract]:
+        return ibUtil.run(self.qualifyContractsAsync(*contracts))
+
+    # market data
+
+    async def reqTickersAsync(self, *contracts: Contract, regulatorySnapshot: bool = False) -> List[Ticker]:
+        return await self.__chunks(list(contracts), PRIORITY_DATA,
+                                   lambda chunk: self.ib.reqTickersAsync(*chunk, regulatorySnapshot=regulatorySnapshot))
+
+    def reqTickers(self, *contracts: Contract, regulatorySnapshot: bool = False) -> List[Ticker]:
+        return ibUtil.run(self.reqTickersAsync(*contracts, regulatorySnapshot=regulatorySnapshot))
+
+    async def reqSecDefOptParamsAsync(self, underlyingSymbol: str, futFopExchange: str, underlyingSecType: str, underlyingConId: int) -> List:
+        async def request():
+            await self.messages.acquire(1, PRIORITY_BULK)
+            return await self.ib.reqSecDefOptParamsAsync(underlyingSymbol, futFopExchange, underlyingSecType, underlyingConId)
+        return await self.__merged(('secdef', underlyingSymbol, futFopExchange, underlyingSecType, underlyingConId), request)
+
+    def reqSecDefOptParams(self, *args) -> List:
+        return ibUtil.run(self.reqSecDefOptParamsAsync(*args))
+
+    async def reqHistoricalDataAsync(self, contract: Contract, endDateTime, durationStr: str, barSizeSetting: str,
+                                     whatToShow: str, useRTH: bool, formatDate: int = 1, **kwargs) -> List:
+        async def request():
+            await self.historical.acquire(1, PRIORITY_BULK)
+            await self.messages.acquire(1, PRIORITY_BULK)
+            return await self.ib.reqHistoricalDataAsync(contract, endDateTime, durationStr, barSizeSetting,
+                                                        whatToShow, useRTH, formatDate, **kwargs)
+        key = ('historical', contract_key(contract), contract.conId, str(endDateTime), durationStr, barSizeSetting, whatToShow, useRTH)
+        return await self.__merged(key, request)
+
+    def reqHistoricalData(self, *args, **kwargs) -> List:
+        return ibUtil.run(self.reqHistoricalDataAsync(*args, **kwargs))
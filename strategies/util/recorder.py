@@ -0,0 +1,108 @@
+import asyncio
+import math
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Set
+
+from ib_insync import IB, Contract, Future, FuturesOption, Ticker
+
+from . import es_calendar
+from . import es_future as esUtils
+from .contract_cache import qualify_contracts_async
+from .market_data import MarketDataManager
+from .options import get_option_chain_async
+from .tick_store import RIGHTS, TickStore
+
+
+def partition_name(contract: Contract) -> str:
+    ''' ES_FUT_202612 for a future, ES_FOP_20261016 for the options of one expiration '''
+    expiration = contract.lastTradeDateOrContractMonth
+    if contract.secType == 'FUT':
+        expiration = expiration[:6]
+    return f'{contract.symbol}_{contract.secType}_{expiration}'
+
+
+def _ns(t: Optional[datetime]) -> int:
+    t = t or datetime.now(timezone.utc)
+    return int(t.timestamp() * 1e9)
+
+
+def _value(x: float) -> float:
+    ''' IB sends -1 for the missing prices and sizes '''
+    return math.nan if x is None or x == -1 else x
+
+
+class Recorder:
+    ''' Records the quotes (with the TWS model greeks) of the subscribed contracts, and the
+        tick-by-tick trades of the futures, into a TickStore. The rows are taken from
+        pendingTickersEvent: one quote row per ticker update.
+        Partitions are per day (UTC, of the tick) and instrument, see partition_name.
+    '''
+
+    def __init__(self, ib: IB, store: TickStore, market_data: MarketDataManager):
+        self.ib = ib
+        self.store = store
+        self.market_data = market_data
+        self.partitions: Dict[int, str] = {}
+        ib.pendingTickersEvent += self.__on_pending_tickers
+
+    def record_future(self, future: Future) -> None:
+        ''' future: must be qualified '''
+        self.partitions[future.conId] = partition_name(future)
+        self.market_data.subscribe(future, hot=True)
+        self.ib.reqTickByTickData(future, 'AllLast')
+
+    async def record_chain(self, future: Future, expiration: str, strike_range: float) -> List[FuturesOption]:
+        ''' subscribes to the calls and puts of an expiration with strikes within strike_range
+            points of the future price (multiples of 5 only, as ChainSnapshot) '''
+        trading_class = es_calendar.trading_class(datetime.strptime(expiration, '%Y%m%d').date())
+        [ticker], chain = await asyncio.gather(
+            self.ib.reqTickersAsync(future),
+            get_option_chain_async(self.ib, future, trading_class))
+        price = ticker.marketPrice()
+        contracts = [FuturesOption(future.symbol, expiration, strike, right, 'CME', '50', 'USD', tradingClass=trading_class)
+                     for right in 'CP'
+                     for strike in chain.strikes
+                     if strike % 5 == 0 and abs(strike - price) <= strike_range]
+        contracts = await qualify_contracts_async(self.ib, *contracts)
+        for c in contracts:
+            self.partitions[c.conId] = partition_name(c)
+        self.market_data.subscribe_all(contracts, hot=True)
+        return contracts
+
+    async def run(self, flush_interval: float = 1.0) -> None:
+        ''' hands the buffered rows to the writer every flush_interval seconds '''
+        while True:
+            await asyncio.sleep(flush_interval)
+            self.store.flush()
+
+    def close(self) -> None:
+        self.ib.pendingTickersEvent -= self.__on_pending_tickers
+        self.store.close()
+
+    def __on_pending_tickers(self, tickers: Set[Ticker]) -> None:
+        for t in tickers:
+            partition = self.partitions.get(t.contract.conId)
+            if partition:
+                self.__record(partition, t)
+
+    def __record(self, partition: str, t: Ticker) -> None:
+        time = _ns(t.time)
+        day = datetime.fromtimestamp(time / 1e9, timezone.utc).strftime('%Y%m%d')
+        greeks = t.modelGreeks
+        self.store.append(day, partition, 'quotes', {
+            'time': time, 'conId': t.contract.conId, 'strike': t.contract.strike, 'right': RIGHTS.get(t.contract.right, 0),
+            'bid': _value(t.bid), 'bidSize': _value(t.bidSize), 'ask': _value(t.ask), 'askSize': _value(t.askSize),
+            'last': _value(t.last), 'lastSize': _value(t.lastSize), 'volume': _value(t.volume),
+            'iv': greeks and greeks.impliedVol, 'delta': greeks and greeks.delta, 'gamma': greeks and greeks.gamma,
+            'vega': greeks and greeks.vega, 'theta': greeks and greeks.theta, 'undPrice': greeks and greeks.undPrice})
+        # the tick by tick trades received since the last update
+        for tick in t.tickByTicks:
+            self.store.append(day, partition, 'trades', {
+                'time': _ns(tick.time), 'conId': t.contract.conId, 'price': tick.price, 'size': tick.size})
+
+
+def active_expirations(max_dte: int) -> List[str]:
+    ''' ES option expirations (YYYYMMDD) from today to max_dte days ahead '''
+    today = esUtils.now().date()
+    days = [today + timedelta(days=dte) for dte in range(max_dte + 1)]
+    return [d.strftime('%Y%m%d') for d in days if es_calendar.get_calendar(d.year).is_expiration(d)]
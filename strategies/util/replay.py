@@ -0,0 +1,307 @@
+''' Record and replay of the IB requests of the entry path, to run the strategies without TWS.
+
+    RecordingIB wraps a connected IB client and records the contract qualifications, option chains,
+    ticker snapshots, combo/leg quotes and order status streams, with the latency of each request.
+    ReplayIB reads a recording and answers the same requests locally with the recorded (or given)
+    latencies. The recorded expirations are moved to the next date with the same weekday as the
+    recorded session, so a recording keeps working on later days.
+'''
+import asyncio
+import json
+import os
+import statistics
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Hashable, List, Tuple
+
+from eventkit import Event
+from ib_insync import IB, Contract, OptionChain, OptionComputation, Order, OrderStatus, Ticker, Trade
+from ib_insync import util as ibUtil
+
+from . import es_calendar
+from .contract_cache import contract_key
+from .market_data import subscription_key
+
+TICKER_FIELDS = ['bid', 'bidSize', 'ask', 'askSize', 'last', 'lastSize', 'close', 'volume']
+GREEK_FIELDS = ['bidGreeks', 'askGreeks', 'lastGreeks', 'modelGreeks']
+SESSION_FORMAT = '%Y%m%d %H:%M:%S'
+
+
+def ticker_to_dict(t: Ticker) -> Dict[str, Any]:
+    d = {f: getattr(t, f) for f in TICKER_FIELDS}
+    d.update({f: getattr(t, f)._asdict() for f in GREEK_FIELDS if getattr(t, f)})
+    return d
+
+
+def dict_to_ticker(contract: Contract, d: Dict[str, Any]) -> Ticker:
+    t = Ticker(contract=contract)
+    for f in TICKER_FIELDS:
+        setattr(t, f, d.get(f, getattr(t, f)))
+    for f in GREEK_FIELDS:
+        if d.get(f):
+            setattr(t, f, OptionComputation(**d[f]))
+    return t
+
+
+def ticker_key(contract: Contract) -> str:
+    return json.dumps(subscription_key(contract))
+
+
+def replay_key(contract: Contract) -> Hashable:
+    ''' the front future month depends on the replay date, so futures only match by symbol '''
+    if contract.secType == 'FUT':
+        return ('FUT', contract.symbol, contract.exchange)
+    return contract_key(contract)
+
+
+class RecordingIB:
+    ''' Wraps an IB client and records what the entry path requests. save() writes the recording.
+        Everything else is delegated to the wrapped IB object, so it can be used in its place.
+    '''
+
+    def __init__(self, ib: IB):
+        self.ib = ib
+        self.recording = {
+            'session': datetime.now().strftime(SESSION_FORMAT),
+            'contracts': [],
+            'chains': {},
+            'tickers': {},
+            'latencies': {},
+            'orders': [],
+        }
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.ib, name)
+
+    def __latency(self, method: str, start: float) -> None:
+        self.recording['latencies'].setdefault(method, []).append(time.monotonic() - start)
+
+    def save(self, path: str) -> None:
+        ''' can be called while recording: the file is replaced in one step, with what is recorded so far '''
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as file:
+            json.dump(self.recording, file)
+        os.replace(tmp_path, path)
+
+    async def qualifyContractsAsync(self, *contracts: Contract) -> List[Contract]:
+        requested = [(c, ibUtil.dataclassNonDefaults(c)) for c in contracts]
+        start = time.monotonic()
+        qualified = await self.ib.qualifyContractsAsync(*contracts)
+        self.__latency('qualifyContracts', start)
+        self.recording['contracts'] += [[r, ibUtil.dataclassNonDefaults(c)] for c, r in requested if c.conId]
+        return qualified
+
+    def qualifyContracts(self, *contracts: Contract) -> List[Contract]:
+        return ibUtil.run(self.qualifyContractsAsync(*contracts))
+
+    async def reqSecDefOptParamsAsync(self, underlyingSymbol: str, futFopExchange: str, underlyingSecType: str, underlyingConId: int) -> List[OptionChain]:
+        start = time.monotonic()
+        chains = await self.ib.reqSecDefOptParamsAsync(underlyingSymbol, futFopExchange, underlyingSecType, underlyingConId)
+        self.__latency('reqSecDefOptParams', start)
+        self.recording['chains'][str(underlyingConId)] = [c._asdict() for c in chains]
+        return chains
+
+    def reqSecDefOptParams(self, *args) -> List[OptionChain]:
+        return ibUtil.run(self.reqSecDefOptParamsAsync(*args))
+
+    async def reqTickersAsync(self, *contracts: Contract, regulatorySnapshot: bool = False) -> List[Ticker]:
+        start = time.monotonic()
+        tickers = await self.ib.reqTickersAsync(*contracts, regulatorySnapshot=regulatorySnapshot)
+        self.__latency('reqTickers', start)
+        for t in tickers:
+            self.recording['tickers'][ticker_key(t.contract)] = ticker_to_dict(t)
+        return tickers
+
+    def reqTickers(self, *contracts: Contract, regulatorySnapshot: bool = False) -> List[Ticker]:
+        return ibUtil.run(self.reqTickersAsync(*contracts, regulatorySnapshot=regulatorySnapshot))
+
+    def reqMktData(self, contract: Contract, *args, **kwargs) -> Ticker:
+        ''' records the latest quote of the ticker, and the time to its first update '''
+        start = time.monotonic()
+        ticker = self.ib.reqMktData(contract, *args, **kwargs)
+        first = True
+
+        def onUpdate(t: Ticker):
+            nonlocal first
+            if first:
+                self.__latency('reqMktData', start)
+                first = False
+            self.recording['tickers'][ticker_key(contract)] = ticker_to_dict(t)
+
+        ticker.updateEvent += onUpdate
+        return ticker
+
+    def placeOrder(self, contract: Contract, order: Order) -> Trade:
+        start = time.monotonic()
+        trade = self.ib.placeOrder(contract, order)
+        statuses = [[0.0, trade.orderStatus.status]]
+        self.recording['orders'].append(statuses)
+
+        def onStatus(t: Trade):
+            statuses.append([time.monotonic() - start, t.orderStatus.status])
+
+        trade.statusEvent += onStatus
+        return trade
+
+
+class _Client:
+
+    def __init__(self):
+        self.reqId = 1
+
+    def getReqId(self) -> int:
+        self.reqId += 1
+        return self.reqId
+
+
+class ReplayIB:
+    ''' Stand-in for IB that answers the entry path requests from a recording.
+        latencies: seconds per method (qualifyContracts, reqSecDefOptParams, reqTickers, reqMktData,
+        placeOrder), by default the median of the recorded ones, times latency_scale.
+        session_date: date the recording is moved to, by default the first date from today with the
+        same weekday as the recorded session where all the recorded expirations are trading days.
+    '''
+
+    bracketOrder = IB.bracketOrder
+
+    def __init__(self, path: str, latencies: Dict[str, float] = None, latency_scale: float = 1.0, session_date: date = None):
+        with open(path, 'r') as file:
+            recording = json.load(file)
+        self.client = _Client()
+        self.pendingTickersEvent = Event('pendingTickersEvent')
+        self.orderStatusEvent = Event('orderStatusEvent')
+        self.latencies = {m: statistics.median(l) * latency_scale for m, l in recording['latencies'].items()}
+        self.latencies.update(latencies or {})
+
+        session = datetime.strptime(recording['session'], SESSION_FORMAT)
+        session_date = session_date or self.__find_session_date(recording, session.date())
+        self.shift = session_date - session.date()
+        self.session = datetime.combine(session_date, session.time())
+        self.started = time.monotonic()
+
+        self.contracts: Dict[Hashable, dict] = {}
+        for requested, qualified in recording['contracts']:
+            request = Contract.create(**self.__redate(requested))
+            self.contracts[replay_key(request)] = self.__redate(qualified)
+        self.chains: Dict[int, List[OptionChain]] = {
+            int(conId): [self.__redate_chain(OptionChain(**c)) for c in chains]
+            for conId, chains in recording['chains'].items()}
+        self.tickers: Dict[str, dict] = recording['tickers']
+        self.orders: List[List[Tuple[float, str]]] = recording['orders']
+
+    @staticmethod
+    def __find_session_date(recording: dict, recorded: date) -> date:
+        expirations = {c[0]['lastTradeDateOrContractMonth'] for c in recording['contracts']
+                       if c[0].get('secType') == 'FOP'}
+        offsets = [(datetime.strptime(e, '%Y%m%d').date() - recorded).days for e in expirations]
+        today = datetime.now().date()
+        candidate = today + timedelta(days=(recorded.weekday() - today.weekday()) % 7)
+        for _ in range(52):
+            days = [candidate + timedelta(days=o) for o in offsets]
+            if all(es_calendar.get_calendar(d.year).is_expiration(d) for d in days):
+                return candidate
+            candidate += timedelta(weeks=1)
+        raise ValueError('no date to replay the recording')
+
+    def __shift(self, expiration: str) -> date:
+        return datetime.strptime(expiration[:8], '%Y%m%d').date() + self.shift
+
+    def __redate(self, fields: dict) -> dict:
+        ''' moves the expiration of an option (and its trading class) to the replay session '''
+        fields = dict(fields)
+        if fields.get('secType') == 'FOP' and fields.get('lastTradeDateOrContractMonth'):
+            expiration = self.__shift(fields['lastTradeDateOrContractMonth'])
+            fields['lastTradeDateOrContractMonth'] = expiration.strftime('%Y%m%d')
+            fields['tradingClass'] = es_calendar.trading_class(expiration)
+        return fields
+
+    def __redate_chain(self, chain: OptionChain) -> OptionChain:
+        expirations = [self.__shift(e) for e in chain.expirations]
+        trading_class = es_calendar.trading_class(expirations[0]) if len(expirations) == 1 else chain.tradingClass
+        return chain._replace(tradingClass=trading_class, expirations=[e.strftime('%Y%m%d') for e in expirations])
+
+    def now(self) -> datetime:
+        ''' clock of the replayed session, to replace es_future.now '''
+        return self.session + timedelta(seconds=time.monotonic() - self.started)
+
+    def latency(self, method: str) -> float:
+        return self.latencies.get(method, 0.0)
+
+    # connection
+
+    def connect(self, *args, **kwargs) -> 'ReplayIB':
+        return self
+
+    def disconnect(self) -> None:
+        pass
+
+    def isConnected(self) -> bool:
+        return True
+
+    def reqMarketDataType(self, marketDataType: int) -> None:
+        pass
+
+    def run(self, *awaitables, timeout: float = None):
+        return ibUtil.run(*awaitables, timeout=timeout)
+
+    def sleep(self, secs: float = 0.02) -> bool:
+        return ibUtil.sleep(secs)
+
+    # requests
+
+    async def qualifyContractsAsync(self, *contracts: Contract) -> List[Contract]:
+        await asyncio.sleep(self.latency('qualifyContracts'))
+        for contract in contracts:
+            for name, value in self.contracts.get(replay_key(contract), {}).items():
+                setattr(contract, name, value)
+        return [c for c in contracts if c.conId]
+
+    def qualifyContracts(self, *contracts: Contract) -> List[Contract]:
+        return ibUtil.run(self.qualifyContractsAsync(*contracts))
+
+    async def reqSecDefOptParamsAsync(self, underlyingSymbol: str, futFopExchange: str, underlyingSecType: str, underlyingConId: int) -> List[OptionChain]:
+        await asyncio.sleep(self.latency('reqSecDefOptParams'))
+        return self.chains.get(underlyingConId, [])
+
+    def reqSecDefOptParams(self, *args) -> List[OptionChain]:
+        return ibUtil.run(self.reqSecDefOptParamsAsync(*args))
+
+    def __ticker(self, contract: Contract) -> Ticker:
+        return dict_to_ticker(contract, self.tickers.get(ticker_key(contract), {}))
+
+    async def reqTickersAsync(self, *contracts: Contract, regulatorySnapshot: bool = False) -> List[Ticker]:
+        await asyncio.sleep(self.latency('reqTickers'))
+        return [self.__ticker(c) for c in contracts]
+
+    def reqTickers(self, *contracts: Contract, regulatorySnapshot: bool = False) -> List[Ticker]:
+        return ibUtil.run(self.reqTickersAsync(*contracts, regulatorySnapshot=regulatorySnapshot))
+
+    def reqMktData(self, contract: Contract, *args, **kwargs) -> Ticker:
+        ticker = Ticker(contract=contract)
+
+        def update():
+            recorded = self.__ticker(contract)
+            for f in TICKER_FIELDS + GREEK_FIELDS:
+                setattr(ticker, f, getattr(recorded, f))
+            ticker.updateEvent.emit(ticker)
+            self.pendingTickersEvent.emit({ticker})
+
+        asyncio.get_event_loop().call_later(self.latency('reqMktData'), update)
+        return ticker
+
+    def cancelMktData(self, contract: Contract) -> None:
+        pass
+
+    def placeOrder(self, contract: Contract, order: Order) -> Trade:
+        ''' replays the recorded status stream of the orders in the order they were placed '''
+        trade = Trade(contract, order, OrderStatus(orderId=order.orderId, status='PendingSubmit'))
+        statuses = self.orders.pop(0) if self.orders else [[self.latency('placeOrder'), 'Submitted']]
+
+        def update(status: str):
+            trade.orderStatus.status = status
+            trade.statusEvent.emit(trade)
+            self.orderStatusEvent.emit(trade)
+
+        for delay, status in statuses:
+            asyncio.get_event_loop().call_later(delay, update, status)
+        return trade
@@ -0,0 +1,116 @@
+import asyncio
+import datetime as dt
+import inspect
+from typing import Any, Callable, List
+from zoneinfo import ZoneInfo
+
+from . import es_calendar
+
+WEEKDAYS = ['mon', 'tue', 'wed', 'thu', 'fri', 'sat', 'sun']
+DEFAULT_TZ = 'America/New_York'
+
+# long sleeps are split so changes of the wall clock (e.g. NTP) are picked up
+MAX_SLEEP = 60
+
+
+class ScheduleRule:
+    ''' Wall clock time of the day, on some weekdays, in a timezone.
+        trading_days_only: skip the days the ES options do not trade (weekends and holidays)
+    '''
+
+    def __init__(self, time: dt.time, weekdays: List[int] = None, tz: str = DEFAULT_TZ, trading_days_only: bool = False):
+        self.time = time
+        self.weekdays = set(weekdays if weekdays is not None else range(7))
+        self.tz = ZoneInfo(tz)
+        self.trading_days_only = trading_days_only
+
+    @classmethod
+    def parse(cls, spec: str, trading_days_only: bool = False) -> 'ScheduleRule':
+        ''' spec: "[weekdays] hh:mm [timezone]", e.g. "Fri 18:00 America/New_York" or "Mon,Wed 09:45" '''
+        tokens = spec.split()
+        weekdays = None
+        if not tokens[0][0].isdigit():
+            weekdays = [WEEKDAYS.index(d.strip().lower()[:3]) for d in tokens.pop(0).split(',')]
+        time = dt.datetime.strptime(tokens.pop(0), '%H:%M').time()
+        tz = tokens.pop(0) if tokens else DEFAULT_TZ
+        return cls(time, weekdays, tz, trading_days_only)
+
+    def next_fire(self, after: dt.datetime) -> dt.datetime:
+        ''' first firing time strictly after the given (aware) datetime '''
+        after = after.astimezone(self.tz)
+        day = after.date()
+        for _ in range(366 * 2):
+            fire = dt.datetime.combine(day, self.time, self.tz)
+            if fire > after and day.weekday() in self.weekdays and \
+                    (not self.trading_days_only or es_calendar.get_calendar(day.year).is_expiration(day)):
+                return fire
+            day += dt.timedelta(days=1)
+        raise ValueError('the schedule rule never fires')
+
+
+class Job:
+
+    def __init__(self, name: str, callback: Callable[[], Any], rule: ScheduleRule, once: bool = False):
+        self.name = name
+        self.callback = callback
+        self.rule = rule
+        self.once = once
+        # how late each firing was, in milliseconds
+        self.lateness: List[float] = []
+
+
+def now() -> dt.datetime:
+    return dt.datetime.now(dt.timezone.utc)
+
+
+async def sleep_until(target: dt.datetime) -> float:
+    ''' sleeps until the (aware) target datetime. Returns how late it woke up, in milliseconds '''
+    while True:
+        remaining = (target - now()).total_seconds()
+        if remaining <= 0:
+            return -remaining * 1000
+        await asyncio.sleep(min(remaining, MAX_SLEEP))
+
+
+class Scheduler:
+    ''' Fires jobs at exact wall clock times, all of them on the same asyncio event loop.
+        Callbacks can be plain functions or coroutine functions; a job does not wait for its
+        previous firing to finish.
+    '''
+
+    def __init__(self):
+        self.jobs: List[Job] = []
+        self.tasks: List[asyncio.Task] = []
+
+    def add(self, name: str, callback: Callable[[], Any], spec: str, once: bool = False, trading_days_only: bool = False) -> Job:
+        ''' spec: see ScheduleRule.parse '''
+        job = Job(name, callback, ScheduleRule.parse(spec, trading_days_only), once)
+        self.jobs.append(job)
+        if self.tasks:
+            self.tasks.append(asyncio.ensure_future(self.__run_job(job)))
+        return job
+
+    async def run(self) -> None:
+        ''' runs until every job scheduled once has fired (forever if there are recurring jobs) '''
+        self.tasks = [asyncio.ensure_future(self.__run_job(job)) for job in self.jobs]
+        await asyncio.gather(*self.tasks)
+
+    def stop(self) -> None:
+        for task in self.tasks:
+            task.cancel()
+
+    async def __run_job(self, job: Job) -> None:
+        while True:
+            target = job.rule.next_fire(now())
+            print(f"{job.name}: next run at {target.strftime('%a %Y-%m-%d %H:%M %Z')}")
+            late_ms = await sleep_until(target)
+            job.lateness.append(late_ms)
+            print(f'{job.name}: fired {late_ms:.1f} ms late')
+            result = job.callback()
+            if inspect.isawaitable(result):
+                if job.once:
+                    await result
+                else:
+                    asyncio.ensure_future(result)
+            if job.once:
+                return
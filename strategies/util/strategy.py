@@ -0,0 +1,236 @@
+import importlib
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Dict, List, Tuple
+
+from ib_insync import IB, Contract, Future, FuturesOption, Trade
+
+from . import bag as bagUtils
+from . import es_future as esUtils
+from . import ib as ibUtils
+from . import metrics
+from . import options as optionUtils
+from .brackets import BracketMonitor
+from .config import ConfigError
+from .contract_cache import qualify_contracts_async
+from .market_data import MarketDataManager
+
+
+class Context:
+    ''' what the strategies run by the orchestrator share: one IB connection, the qualified
+        ES future, the market data subscriptions and the bracket monitor '''
+
+    def __init__(self, ib: IB, es: Future, market_data: MarketDataManager, brackets: BracketMonitor):
+        self.ib = ib
+        self.es = es
+        self.market_data = market_data
+        self.brackets = brackets
+
+
+class Strategy(ABC):
+    ''' Base class of the strategies that can be run by the orchestrator (plug-ins).
+        A strategy is enabled in config.yaml with the 'class' key of its section, e.g.
+            ic_es:
+              class: util.strategy.IronCondor
+        run() selects the legs, prices the combo and places a bracket order. Subclasses define
+        select_contracts, create_bag and get_prices, and legs, dtes and leg_actions for the backtests
+        (a subclass missing one of the methods cannot be instantiated).
+    '''
+
+    action = 'BUY'
+    # days to expiration of the option chains of the legs, the strikes are selected on the first one
+    dtes: List[int] = [0]
+    # the action of each leg in the combo built by create_bag
+    leg_actions: List[str] = []
+    # optional parameters of util.config.StrategyConfig that the strategy needs
+    required_parameters: List[str] = []
+    # (low, high) bounds, excluded, of the parameters whose range depends on the strategy
+    parameter_bounds: Dict[str, Tuple[float, float]] = {}
+
+    def __init__(self, name: str, config: Dict[str, Any], context: Context):
+        self.name = name
+        self.config = config
+        self.context = context
+        self.ib = context.ib
+        self.es = context.es
+        # seconds spent in each step of the last run
+        self.timings: Dict[str, float] = {}
+        self.started = False
+
+    @classmethod
+    def validate_config(cls, name: str, config: Dict[str, Any]) -> None:
+        ''' the checks of a strategy section that util.config cannot do without the class '''
+        missing = [p for p in cls.required_parameters if config.get(p) is None]
+        if missing:
+            raise ConfigError(f'{name}: missing parameters {missing} (required by {cls.__name__})')
+        for parameter, (low, high) in cls.parameter_bounds.items():
+            value = config.get(parameter)
+            if value is not None and not low < value < high:
+                raise ConfigError(f'{name}.{parameter}: must be between {low} and {high} (excluded) for {cls.__name__}, got {value}')
+
+    def update_config(self, config: Dict[str, Any]) -> bool:
+        ''' replaces the parameters if the strategy has not started its run yet (a run never mixes old
+            and new ones, and the orders already placed are not changed). Returns whether they were replaced,
+            raises ConfigError if they are not valid for the strategy '''
+        if self.started:
+            return False
+        self.validate_config(self.name, config)
+        self.config = config
+        return True
+
+    @abstractmethod
+    async def select_contracts(self) -> List[FuturesOption]:
+        pass
+
+    @abstractmethod
+    def create_bag(self, contracts: List[Contract]) -> Contract:
+        pass
+
+    @abstractmethod
+    def get_prices(self, market_price: float) -> Tuple[float, float, float]:
+        ''' returns the price, take profit limit and stop '''
+
+    @abstractmethod
+    def legs(self, call_strike: float, put_strike: float) -> List[Tuple[int, float, str]]:
+        ''' (index in dtes, strike, right) of each leg, in the order of create_bag,
+            given the call and put strikes selected by delta '''
+
+    def get_quantity(self) -> int:
+        return self.config.get('quantity', 1)
+
+    def get_order_params(self) -> Dict[str, Any]:
+        return {}
+
+    @contextmanager
+    def _step(self, name: str):
+        start = time.perf_counter()
+        with metrics.span(name):
+            yield
+        self.timings[name] = time.perf_counter() - start
+
+    async def run(self) -> List[Trade]:
+        self.started = True
+        self.timings = {}
+        run = metrics.start_run(self.name)
+        try:
+            with self._step('select_contracts'):
+                contracts = await self.select_contracts()
+            with self._step('create_bag'):
+                # the legs are in the contract cache afterwards, so create_bag does not go to IB
+                await qualify_contracts_async(self.ib, *contracts)
+                bag_contract = self.create_bag(contracts)
+            with self._step('bag_ticker'):
+                bag_ticker = await bagUtils.get_ticker_async(self.ib, bag_contract, market_data=self.context.market_data)
+
+            print(f'{self.name} market price:', bag_ticker.marketPrice())
+            with self._step('prices'):
+                price, limit, stop = self.get_prices(bag_ticker.marketPrice())
+            print(f'{self.name} price: {price} limit: {limit} stop: {stop}')
+
+            if not self.config.get('place_orders', True):
+                print(f'{self.name}: place_orders is disabled, no order sent')
+                metrics.end_run(run)
+                return []
+
+            with self._step('place_order'):
+                bracket_order = self.ib.bracketOrder(self.action, self.get_quantity(), price, limit, stop, **self.get_order_params())
+                trades = [self.ib.placeOrder(bag_contract, o) for o in bracket_order]
+        except BaseException:
+            metrics.end_run(run)
+            raise
+        ibUtils.watch_order_ack(trades[0], run, on_ack=lambda seconds: self.timings.update(order_ack=seconds))
+        print(f'{self.name} order ids: {[t.order.orderId for t in trades]}')
+        self.context.brackets.add(*trades, name=self.name)
+        return trades
+
+
+class IronCondor(Strategy):
+    ''' 0DTE iron condor (IC_ES.py): sells the call/put with the configured deltas and buys the wings '''
+
+    leg_actions = ['SELL', 'BUY', 'SELL', 'BUY']
+    required_parameters = ['call_wing_width', 'put_wing_width']
+    # fraction of the credit: from 1 on the take profit limit would not be positive
+    parameter_bounds = {'target': (0, 1)}
+
+    def legs(self, call_strike: float, put_strike: float) -> List[Tuple[int, float, str]]:
+        return [(0, call_strike, 'C'),
+                (0, call_strike + self.config['call_wing_width'], 'C'),
+                (0, put_strike, 'P'),
+                (0, put_strike - self.config['put_wing_width'], 'P')]
+
+    async def select_contracts(self) -> List[FuturesOption]:
+        expirations = [esUtils.get_expiration(dte) for dte in self.dtes]
+        trading_classes = [esUtils.get_DTE_trading_class(dte) for dte in self.dtes]
+        chain_snapshot = await esUtils.ChainSnapshot.create_async(self.ib, self.es, expirations[0])
+        call_strike = chain_snapshot.get_call_ticker(self.config['call_delta']).contract.strike
+        put_strike = chain_snapshot.get_put_ticker(self.config['put_delta']).contract.strike
+        print(f'{self.name} call strike selected:', call_strike, 'put strike selected:', put_strike)
+        return [FuturesOption(self.es.symbol, expirations[i], strike, right, 'CME', '50', 'USD', tradingClass=trading_classes[i])
+                for i, strike, right in self.legs(call_strike, put_strike)]
+
+    def create_bag(self, contracts: List[Contract]) -> Contract:
+        return optionUtils.create_ic(self.ib, contracts)
+
+    def get_prices(self, market_price: float) -> Tuple[float, float, float]:
+        price = esUtils.round_2tick(market_price) - 0.25
+        limit = esUtils.round_2tick(price * (1-self.config['target']))
+        stop = esUtils.round_2tick(price * (1+self.config['stop']))
+        return price, limit, stop
+
+
+class InvertedIronCondor(IronCondor):
+    ''' 0DTE inverted iron condor (ICI_ES.py): buys the call/put with the configured deltas and sells the wings.
+        target and stop are in points '''
+
+    leg_actions = ['BUY', 'SELL', 'BUY', 'SELL']
+    parameter_bounds = {}
+
+    def create_bag(self, contracts: List[Contract]) -> Contract:
+        return optionUtils.create_ici(self.ib, contracts)
+
+    def get_prices(self, market_price: float) -> Tuple[float, float, float]:
+        price = esUtils.round_2tick(market_price) - 0.25
+        limit = esUtils.round_2tick(price + self.config['target'])
+        stop = esUtils.round_2tick(price - self.config['stop'])
+        return price, limit, stop
+
+
+class DoubleCalendar(IronCondor):
+    ''' double calendar (DobleCal_VM_ES.py), opened on fridays: the call/put with the configured deltas
+        expiring in 5 days against the same strikes expiring in 7 days '''
+
+    dtes = [5, 7]
+    required_parameters = []
+
+    def get_quantity(self) -> int:
+        return self.config.get('quantity', 2)
+
+    def get_order_params(self) -> Dict[str, Any]:
+        return {'tif': 'GTC'}
+
+    def legs(self, call_strike: float, put_strike: float) -> List[Tuple[int, float, str]]:
+        return [(0, call_strike, 'C'), (1, call_strike, 'C'), (0, put_strike, 'P'), (1, put_strike, 'P')]
+
+    def create_bag(self, contracts: List[Contract]) -> Contract:
+        return optionUtils.create_double_cal(self.ib, contracts)
+
+
+def load_strategy(name: str, config: Dict[str, Any], context: Context) -> Strategy:
+    ''' instantiates the class of the 'class' key (module.Class) of the strategy config, after checking
+        the parameters it needs (ConfigError) '''
+    cls = strategy_class(name, config)
+    cls.validate_config(name, config)
+    return cls(name, config, context)
+
+
+def strategy_class(name: str, config: Dict[str, Any]) -> type:
+    ''' the class of the 'class' key (module.Class) of the strategy config '''
+    module_name, class_name = config['class'].rsplit('.', 1)
+    try:
+        cls = getattr(importlib.import_module(module_name), class_name)
+    except (ImportError, AttributeError) as e:
+        raise ConfigError(f"{name}.class: {config['class']} cannot be loaded ({e})")
+    if not (isinstance(cls, type) and issubclass(cls, Strategy)):
+        raise ConfigError(f"{name}.class: {config['class']} is not a Strategy")
+    return cls
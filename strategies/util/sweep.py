@@ -0,0 +1,198 @@
+''' Grid search of the parameters of a strategy with util.backtest, on a process pool.
+
+    The recorded days are prepared once: the sampled session and chains of each day, and the deltas
+    at the entry (the Black-76 implied volatilities are the slow part), are saved as .npy files in
+    cache_dir and memory-mapped by the workers, so the data is shared through the page cache instead
+    of being copied to every process. The strikes selected for each delta are cached per day in
+    each worker, as they are shared by every combination of wings, target and stop.
+    Each finished combination is appended to the results csv right away, with the first and last
+    day and a hash of the days it was run on; a sweep that is run again skips the combinations
+    already run on the same days (recording new days runs them all again).
+'''
+import csv
+import hashlib
+import itertools
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from .backtest import Backtest, Chain, Session, select_strikes, summary
+from .strategy import strategy_class
+
+META_FILE = 'meta.json'
+
+
+def save_day(path: str, loaded, start: int, deltas: np.ndarray) -> None:
+    entry, session, chains = loaded
+    os.makedirs(path, exist_ok=True)
+    np.save(os.path.join(path, 'times.npy'), session.times)
+    np.save(os.path.join(path, 'underlying.npy'), session.underlying)
+    np.save(os.path.join(path, 'deltas.npy'), deltas)
+    for i, chain in enumerate(chains):
+        for name in ('strikes', 'rights', 'bid', 'ask', 'delta'):
+            np.save(os.path.join(path, f'chain{i}_{name}.npy'), getattr(chain, name))
+    # written last: a day without meta.json is not complete
+    with open(os.path.join(path, META_FILE), 'w') as file:
+        json.dump({'entry': entry.isoformat(), 'start': start, 'expirations': [c.expiration for c in chains]}, file)
+
+
+def load_day(path: str) -> Tuple[Any, int, np.ndarray]:
+    ''' the (entry, session, chains) of Backtest.load, the entry bar and the entry deltas, memory-mapped '''
+    with open(os.path.join(path, META_FILE), 'r') as file:
+        meta = json.load(file)
+
+    def array(name: str) -> np.ndarray:
+        return np.load(os.path.join(path, name + '.npy'), mmap_mode='r')
+
+    session = Session([], array('times'), array('underlying'))
+    chains = [Chain(e, *[array(f'chain{i}_{name}') for name in ('strikes', 'rights', 'bid', 'ask', 'delta')])
+              for i, e in enumerate(meta['expirations'])]
+    return (datetime.fromisoformat(meta['entry']), session, chains), meta['start'], array('deltas')
+
+
+def _prepare_day(backtest: Backtest, day: date, path: str) -> Optional[date]:
+    if os.path.exists(os.path.join(path, META_FILE)):
+        return day
+    loaded = backtest.load(day)
+    if loaded is None:
+        return None
+    start = backtest.start_bar(loaded)
+    if start < 0:
+        return None
+    save_day(path, loaded, start, backtest.entry_deltas(loaded, start))
+    return day
+
+
+def grid(parameters: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    ''' every combination of the parameter values, e.g. {'target': [0.25, 0.5], 'stop': [1, 2]} '''
+    names = list(parameters)
+    return [dict(zip(names, values)) for values in itertools.product(*[parameters[n] for n in names])]
+
+
+# state of the worker processes, set by _init_worker
+_worker: Dict[str, Any] = {}
+
+
+def _init_worker(name: str, config: Dict[str, Any], root: str, bar_seconds: int, entry: str, cache_dir: str) -> None:
+    _worker.update(backtest=Backtest(name, config, root, bar_seconds, entry), config=config,
+                   cache_dir=cache_dir, days={}, strikes={})
+
+
+def _worker_day(day: date):
+    days = _worker['days']
+    if day not in days:
+        days[day] = load_day(os.path.join(_worker['cache_dir'], day.strftime('%Y%m%d')))
+    return days[day]
+
+
+def _worker_strike(day: date, loaded, start: int, deltas: np.ndarray, right: str, delta: float) -> float:
+    key = (day, right, delta)
+    strikes = _worker['strikes']
+    if key not in strikes:
+        _, session, chains = loaded
+        strikes[key] = select_strikes(chains[0], deltas, session.underlying[start], right, delta)[0]
+    return strikes[key]
+
+
+def _run_combinations(combinations: List[Dict[str, Any]], days: List[date]) -> List[Dict[str, Any]]:
+    backtest: Backtest = _worker['backtest']
+    results = []
+    for params in combinations:
+        backtest.strategy.config = {**_worker['config'], **params}
+        trades = []
+        for day in days:
+            loaded, start, deltas = _worker_day(day)
+            strikes = (_worker_strike(day, loaded, start, deltas, 'C', backtest.strategy.config['call_delta']),
+                       _worker_strike(day, loaded, start, deltas, 'P', backtest.strategy.config['put_delta']))
+            trade = backtest.run_day(day, loaded, strikes)
+            if trade:
+                trades.append(trade)
+        results.append({**params, **summary(pd.DataFrame(trades))})
+    return results
+
+
+DAY_COLUMNS = ['start', 'end', 'days']
+SUMMARY_COLUMNS = ['trades', 'pnl', 'win_rate', 'max_drawdown']
+
+
+def days_hash(days: List[date]) -> str:
+    return hashlib.sha1(','.join(d.isoformat() for d in sorted(days)).encode()).hexdigest()[:12]
+
+
+def _key(params: Dict[str, Any], names: Iterable[str], days: str) -> Tuple[str, ...]:
+    return (*(str(float(params[n])) for n in names), days)
+
+
+class Sweep:
+    ''' Grid search of one strategy of config.yaml.
+        cache_dir: where the prepared days are kept (it depends on the strategy, bar_seconds and entry)
+        results: csv file with one row per combination: the parameters and the backtest summary
+    '''
+
+    def __init__(self, name: str, config: Dict[str, Any], root: str, cache_dir: str, results: str,
+                 bar_seconds: int = 60, entry: str = None, processes: int = None, chunk_size: int = 16):
+        self.name = name
+        self.config = config
+        self.root = root
+        self.bar_seconds = bar_seconds
+        self.entry = entry
+        self.cache_dir = cache_dir
+        self.results = results
+        self.processes = processes or os.cpu_count()
+        self.chunk_size = chunk_size
+
+    def prepare(self, days: List[date]) -> List[date]:
+        ''' caches the days that have a trade entry, returns them '''
+        backtest = Backtest(self.name, self.config, self.root, self.bar_seconds, self.entry)
+        with ProcessPoolExecutor(self.processes) as pool:
+            futures = [pool.submit(_prepare_day, backtest, d, os.path.join(self.cache_dir, d.strftime('%Y%m%d')))
+                       for d in days]
+            return sorted(d for d in (f.result() for f in futures) if d)
+
+    def done(self, names: List[str]) -> set:
+        ''' keys of the combinations already in the results file '''
+        if not os.path.exists(self.results):
+            return set()
+        with open(self.results, 'r', newline='') as file:
+            reader = csv.DictReader(file)
+            columns = names + DAY_COLUMNS + SUMMARY_COLUMNS
+            if reader.fieldnames != columns:
+                raise ValueError(f'{self.results} has the columns {reader.fieldnames} instead of {columns}, move it away to start a new sweep')
+            return {_key(row, names, row['days']) for row in reader}
+
+    def run(self, parameters: Dict[str, List[Any]], days: List[date]) -> pd.DataFrame:
+        ''' parameters: the values of each parameter to combine, the others come from the strategy config.
+            Returns the results of the combinations on these days '''
+        cls = strategy_class(self.name, self.config)
+        for params in grid(parameters):
+            cls.validate_config(self.name, {**self.config, **params})
+        days = self.prepare(days)
+        names = list(parameters)
+        day_set = {'start': days[0].isoformat() if days else '', 'end': days[-1].isoformat() if days else '',
+                   'days': days_hash(days)}
+        done = self.done(names)
+        combinations = [p for p in grid(parameters) if _key(p, names, day_set['days']) not in done]
+        print(f"{self.name}: {len(days)} days, {len(combinations)} combinations to run "
+              f"({len(grid(parameters)) - len(combinations)} already done on these days)")
+
+        chunks = [combinations[i:i+self.chunk_size] for i in range(0, len(combinations), self.chunk_size)]
+        os.makedirs(os.path.dirname(self.results) or '.', exist_ok=True)
+        new_file = not os.path.exists(self.results)
+        with open(self.results, 'a', newline='') as file, \
+                ProcessPoolExecutor(self.processes, initializer=_init_worker,
+                                    initargs=(self.name, self.config, self.root, self.bar_seconds, self.entry, self.cache_dir)) as pool:
+            writer = csv.DictWriter(file, fieldnames=names + DAY_COLUMNS + SUMMARY_COLUMNS)
+            if new_file:
+                writer.writeheader()
+            futures = [pool.submit(_run_combinations, chunk, days) for chunk in chunks]
+            for i, future in enumerate(as_completed(futures)):
+                writer.writerows({**row, **day_set} for row in future.result())
+                file.flush()
+                print(f'{self.name}: {min((i + 1) * self.chunk_size, len(combinations))}/{len(combinations)}')
+        results = pd.read_csv(self.results, dtype={'days': str})
+        return results[results['days'] == day_set['days']].reset_index(drop=True)
@@ -0,0 +1,175 @@
+''' Append-only columnar store of ticks and quotes.
+
+    Layout: <root>/<YYYYMMDD>/<partition>/<table>/<column>.bin, one raw little endian array per
+    column, with the dtypes of the columns in schema.json next to them. Partitions are named after
+    the instrument, e.g. ES_FUT_202612 or ES_FOP_20261016 (one per option expiration). The files
+    are only appended to, so they can be read with numpy.memmap (read_table) while they are written.
+    rows.json has the number of rows written to every column, replaced after each write: the rows
+    past it (a write interrupted by a crash) are ignored by read_table and cut by the next write.
+'''
+import json
+import os
+import queue
+import threading
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+SCHEMA_FILE = 'schema.json'
+ROWS_FILE = 'rows.json'
+
+# time: nanoseconds since the epoch (UTC)
+QUOTE_COLUMNS: Dict[str, str] = {
+    'time': '<i8', 'conId': '<i8', 'strike': '<f8', 'right': '<i1',
+    'bid': '<f8', 'bidSize': '<f8', 'ask': '<f8', 'askSize': '<f8', 'last': '<f8', 'lastSize': '<f8', 'volume': '<f8',
+    'iv': '<f4', 'delta': '<f4', 'gamma': '<f4', 'vega': '<f4', 'theta': '<f4', 'undPrice': '<f8',
+}
+TRADE_COLUMNS: Dict[str, str] = {'time': '<i8', 'conId': '<i8', 'price': '<f8', 'size': '<f8'}
+TABLES: Dict[str, Dict[str, str]] = {'quotes': QUOTE_COLUMNS, 'trades': TRADE_COLUMNS}
+
+# a call is 1, a put -1 and anything else 0 in the right column
+RIGHTS = {'C': 1, 'P': -1}
+
+
+class ColumnBuffer:
+    ''' fixed size buffer of rows, stored by column '''
+
+    def __init__(self, columns: Dict[str, str], capacity: int):
+        self.columns = {name: np.empty(capacity, dtype) for name, dtype in columns.items()}
+        self.capacity = capacity
+        self.size = 0
+
+    def append(self, row: Dict[str, float]) -> None:
+        ''' missing values are written as 0 (integers) or nan (floats) '''
+        i = self.size
+        for name, column in self.columns.items():
+            value = row.get(name)
+            column[i] = (0 if column.dtype.kind in 'iu' else np.nan) if value is None else value
+        self.size += 1
+
+    def full(self) -> bool:
+        return self.size >= self.capacity
+
+    def rows(self) -> Dict[str, np.ndarray]:
+        return {name: column[:self.size] for name, column in self.columns.items()}
+
+
+class TickStore:
+    ''' Writes rows to the columnar files of the store. Rows are kept in a bounded buffer per
+        (day, partition, table) and written by a background thread when the buffer is full or on
+        flush(). At most max_pending buffers wait to be written: append() blocks when the disk
+        cannot keep up instead of using more and more memory.
+    '''
+
+    def __init__(self, root: str, buffer_rows: int = 4096, max_pending: int = 64):
+        self.root = root
+        self.buffer_rows = buffer_rows
+        self.buffers: Dict[Tuple[str, str, str], ColumnBuffer] = {}
+        self.pending: 'queue.Queue[Optional[Tuple[str, Dict[str, np.ndarray]]]]' = queue.Queue(max_pending)
+        self.error: Optional[Exception] = None
+        self.writer = threading.Thread(target=self.__write_loop, name='tick-store-writer', daemon=True)
+        self.writer.start()
+
+    def append(self, day: str, partition: str, table: str, row: Dict[str, float]) -> None:
+        ''' day: YYYYMMDD, table: quotes or trades '''
+        if self.error:
+            raise self.error
+        key = (day, partition, table)
+        buffer = self.buffers.get(key)
+        if buffer is None:
+            buffer = self.buffers[key] = ColumnBuffer(TABLES[table], self.buffer_rows)
+        buffer.append(row)
+        if buffer.full():
+            self.__hand_over(key, buffer)
+            del self.buffers[key]
+
+    def flush(self) -> None:
+        ''' hands the rows buffered so far to the writer thread '''
+        for key, buffer in list(self.buffers.items()):
+            if buffer.size:
+                self.__hand_over(key, buffer)
+                del self.buffers[key]
+
+    def close(self) -> None:
+        ''' writes everything that is buffered and stops the writer thread '''
+        self.flush()
+        self.pending.put(None)
+        self.writer.join()
+        if self.error:
+            raise self.error
+
+    def __hand_over(self, key: Tuple[str, str, str], buffer: ColumnBuffer) -> None:
+        self.pending.put((os.path.join(self.root, *key), buffer.rows()))
+
+    def __write_loop(self) -> None:
+        while True:
+            item = self.pending.get()
+            if item is None:
+                return
+            try:
+                write_rows(*item)
+            except Exception as e:
+                self.error = e
+
+
+def committed_rows(table_dir: str) -> Optional[int]:
+    ''' rows written to every column of the table, None for the tables written without rows.json '''
+    path = os.path.join(table_dir, ROWS_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as file:
+        return json.load(file)
+
+
+def write_rows(table_dir: str, rows: Dict[str, np.ndarray]) -> None:
+    ''' appends the rows to the column files of a table, creating it if needed. The row count is
+        written last, once every column has the rows '''
+    if not os.path.exists(os.path.join(table_dir, SCHEMA_FILE)):
+        os.makedirs(table_dir, exist_ok=True)
+        with open(os.path.join(table_dir, SCHEMA_FILE), 'w') as file:
+            json.dump({name: column.dtype.str for name, column in rows.items()}, file)
+    paths = {name: os.path.join(table_dir, name + '.bin') for name in rows}
+    committed = committed_rows(table_dir)
+    if committed is None:
+        # a table written before rows.json: its shortest column
+        committed = min(os.path.getsize(p) // rows[n].itemsize if os.path.exists(p) else 0 for n, p in paths.items())
+    for name, column in rows.items():
+        path = paths[name]
+        # cuts the rows of an interrupted write, so the columns stay aligned
+        if os.path.exists(path) and os.path.getsize(path) != committed * column.itemsize:
+            os.truncate(path, committed * column.itemsize)
+        with open(path, 'ab') as file:
+            file.write(column.tobytes())
+    tmp_path = os.path.join(table_dir, ROWS_FILE + '.tmp')
+    with open(tmp_path, 'w') as file:
+        json.dump(committed + len(next(iter(rows.values()))), file)
+    os.replace(tmp_path, os.path.join(table_dir, ROWS_FILE))
+
+
+def read_table(root: str, day: str, partition: str, table: str) -> Dict[str, np.ndarray]:
+    ''' maps the columns of a table in memory (read only, no copy). Only the committed rows are read
+        (see ROWS_FILE), not the ones being written while the recorder is running '''
+    table_dir = os.path.join(root, day, partition, table)
+    with open(os.path.join(table_dir, SCHEMA_FILE), 'r') as file:
+        schema = {name: np.dtype(dtype) for name, dtype in json.load(file).items()}
+    paths = {name: os.path.join(table_dir, name + '.bin') for name in schema}
+    sizes = {name: os.path.getsize(paths[name]) // dtype.itemsize if os.path.exists(paths[name]) else 0
+             for name, dtype in schema.items()}
+    rows = min(sizes.values())
+    committed = committed_rows(table_dir)
+    if committed is not None:
+        rows = min(rows, committed)
+    if rows == 0:
+        return {name: np.empty(0, dtype) for name, dtype in schema.items()}
+    return {name: np.memmap(paths[name], dtype, mode='r', shape=(rows,))
+            for name, dtype in schema.items()}
+
+
+def days(root: str) -> List[str]:
+    ''' recorded days (YYYYMMDD), in ascending order '''
+    return sorted(d for d in os.listdir(root) if d.isdigit()) if os.path.isdir(root) else []
+
+
+def partitions(root: str, day: str) -> List[str]:
+    day_dir = os.path.join(root, day)
+    return sorted(os.listdir(day_dir)) if os.path.isdir(day_dir) else []
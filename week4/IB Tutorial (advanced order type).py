@@ -7,23 +7,33 @@ from ibapi.wrapper import EWrapper
 from ibapi.contract import Contract
 from ibapi.order import *
 
+from bar_aggregator import BarAggregator, BarSeries, BarStore
+from signal_engine import Rule, SignalEngine, breakout
+from tick_buffer import TickBuffer
+
 class IBapi(EWrapper, EClient):
     def __init__(self):
         EClient.__init__(self, self)
-        self.bardata = {}  # Initialize dictionary to store bar data
+        self.bardata = {}  # Initialize dictionary to store the tick buffers
+        self.bars = {}  # bar aggregators fed by the ticks of each reqId
 
     def nextValidId(self, orderId: int):
         super().nextValidId(orderId)
         self.nextorderId = orderId
         print("The next valid order id is: ", self.nextorderId)
 
-    def tick_df(self, reqId, contract):
-        """custom function to init DataFrame and request Tick Data"""
-        self.bardata[reqId] = pd.DataFrame(columns=["time", "price"])
-        self.bardata[reqId].set_index("time", inplace=True)
+    def tick_buffer(self, reqId, contract, window=300):
+        """custom function to init the tick buffer (rolling min/max of the last `window` seconds) and request Tick Data"""
+        self.bardata[reqId] = TickBuffer(window)
         self.reqTickByTickData(reqId, contract, "Last", 0, True)
         return self.bardata[reqId]
 
+    def bar_aggregator(self, reqId, kind="time", size=60):
+        """custom function to build bars (see BarAggregator) from the ticks of reqId, requested with tick_buffer"""
+        aggregator = BarAggregator(kind, size)
+        self.bars.setdefault(reqId, []).append(aggregator)
+        return aggregator
+
     def tickByTickAllLast(
         self,
         reqId,
@@ -37,7 +47,9 @@ class IBapi(EWrapper, EClient):
     ):
         if tickType == 1:
             #print('tickByTickAllLast̀. time: ', time, 'time in seconds: ', pd.to_datetime(time, unit="s"))
-            self.bardata[reqId].loc[pd.to_datetime(time, unit="s")] = price
+            self.bardata[reqId].append(time, price)
+            for aggregator in self.bars.get(reqId, ()):
+                aggregator.add(time, price, size)
 
     def stock_contract(
         self,
@@ -83,18 +95,12 @@ def submit_order(
     app.nextorderId += 1
 
 
-def check_for_trade(df: pd.DataFrame, contract):
-    start_time = df.index[-1] - pd.Timedelta(minutes=5)
-    min_value = df[start_time:].price.min()
-    max_value = df[start_time:].price.max()
-
-    if df.price.iloc[-1] < max_value * 0.95:
-        submit_order(contract, "SELL")
-        return True
-
-    elif df.price.iloc[-1] > min_value * 1.05:
-        submit_order(contract, "BUY")
-        return True
+def trade(contract):
+    """action of a rule: submits an order of the signal direction for contract"""
+    def action(signal, window):
+        print(f"{signal} {contract.symbol} at tick {window.time}, price {window.price}")
+        submit_order(contract, signal)
+    return action
     
     
 ####
@@ -125,12 +131,24 @@ aapl = app.stock_contract("AAPL")
 ###
 
 
-df = app.tick_df(401, goog)
+ticks = app.tick_buffer(401, goog)
+
+# the rule is evaluated on every GOOG tick (in the API thread) once 5 minutes of ticks are
+# buffered, and trades AAPL on a 5% move from the min/max of the last 5 minutes
+engine = SignalEngine()
+engine.add(ticks, Rule("goog breakout", breakout(0.05), trade(aapl), warmup=300, once=True))
+
+# 1 minute bars of GOOG, saved to bars/GOOG_1m_<day>.csv; goog_bars.frame() has the last 500 bars
+# for the week2 volatility estimators
+goog_bars = BarSeries()
+bars = app.bar_aggregator(401, "time", 60)
+bars.subscribe(goog_bars)
+bars.subscribe(BarStore("bars", "GOOG_1m"))
 
 
 time.sleep(10)
 for i in range(100):
-    if len(df) > 0:
+    if len(ticks) > 0:
         break
     time.sleep(0.3)
 
@@ -140,16 +158,6 @@ if i == 99:
     raise Exception("Error with Tick data stream")
 
 
-
-
-data_length = df.index[-1] - df.index[0]
-if data_length.seconds < 300:
-    time.sleep(300 - data_length.seconds)
-    
-    
-while True:
-    if check_for_trade(df, aapl):
-        break
-    time.sleep(0.1)
+engine.wait()
 
 app.disconnect()
\ No newline at end of file
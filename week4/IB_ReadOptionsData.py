@@ -3,6 +3,8 @@ from ib_insync import *
 import pandas as pd
 import pytz
 
+from chain_snapshot import chain_snapshot
+
 from datetime import datetime, time
 
 
@@ -34,44 +36,16 @@ print(ticker)
 spxValue =  ticker.marketPrice() #4065.75 
 print('spxValue: ', spxValue)
 
-chains = ib.reqSecDefOptParams(spx.symbol, '', spx.secType, spx.conId)
-
-# chainsDf = util.df(chains)
-# chainsDf = chainsDf[(chains.exchange == 'SMART') & (chains.tradingClass == 'SPXW')]
-
-chain = next(c for c in chains if c.tradingClass == 'SPXW' and c.exchange == 'SMART')
-expiration = chain.expirations[0]
+# all the SPXW options of the first expiration (0DTE) with strikes multiple of 5 within 20 points
+# of the SPX price, snapshotted concurrently (see chain_snapshot)
+ib.reqMarketDataType(data_type)
+snapshot = chain_snapshot(ib, spx, strike_range=20, price=spxValue, trading_class='SPXW', deadline=15)
 
 print('')
-print(expiration)
-
-strikes = [strike for strike in chain.strikes
-        if strike % 5 == 0
-        and spxValue - 20 < strike < spxValue + 20]
-rights = ['P', 'C']
-
-
-contracts = [Option('SPX', expiration, strikes[int(len(strikes)/2)], 'C', 'SMART', tradingClass='SPXW')]
-
-contracts = ib.qualifyContracts(*contracts)
-
-print(contracts[0])
-
-tickers = ib.reqTickers(*contracts)
-
-print(tickers[0])
-#print('greeks: ', tickers[0].modelGreeks)
-print('lastGreeks delta: ', tickers[0].lastGreeks.delta)
-
-
-
-def get_individual(ticker,exp,strike,kind):
-    ib.reqMarketDataType(data_type)
-    contract = Option(ticker, exp, strike, kind, "SMART", currency="USD")
-    snapshot = ib.reqMktData(contract, "", True, False)
-    while util.isNan(snapshot.bid):
-        ib.sleep()
-    return {'strike': strike, 'kind': kind, 'close': snapshot.close, 'last': snapshot.last, 'bid': snapshot.bid, 'ask': snapshot.ask, 'volume': snapshot.volume}
+print(f'{snapshot.completed}/{snapshot.requested} snapshots in {snapshot.elapsed:.1f}s')
+print(snapshot.data)
+if len(snapshot.missing):
+    print('missing: ', snapshot.missing[['expiration', 'strike', 'right']].values.tolist())
 
 
 
@@ -0,0 +1,131 @@
+import csv
+import math
+import os
+from collections import deque
+from typing import Callable, List, NamedTuple, Optional
+
+import pandas as pd
+
+
+class Bar(NamedTuple):
+    start: float  # time of the first tick (of the interval for time bars), in seconds
+    end: float  # time of the last tick (end of the interval for time bars)
+    open: float
+    high: float
+    low: float
+    close: float
+    volume: float
+    ticks: int
+
+
+COLUMNS = list(Bar._fields)
+
+
+def bars_frame(bars) -> pd.DataFrame:
+    """bars indexed by start time, with the Open/High/Low/Close columns used by the week2
+    realized volatility estimators (parkinson, garman_klass, yang_zhang...)"""
+    df = pd.DataFrame(list(bars), columns=COLUMNS)
+    df.index = pd.to_datetime(df.pop("start"), unit="s")
+    return df.rename(columns={"open": "Open", "high": "High", "low": "Low", "close": "Close", "volume": "Volume"})
+
+
+class BarAggregator:
+    """Builds bars from a tick stream, one tick at a time, keeping only the open bar:
+      - kind "time": bars of `size` seconds, aligned on multiples of size (intervals without
+        ticks have no bar)
+      - kind "tick": bars of `size` ticks
+      - kind "volume": a bar closes on the tick that brings its volume to `size` or more
+    The closed bars are passed to the subscribers.
+    """
+
+    def __init__(self, kind: str = "time", size: float = 60):
+        if kind not in ("time", "tick", "volume"):
+            raise ValueError(f"unknown bar kind {kind}")
+        self.kind = kind
+        self.size = size
+        self.subscribers: List[Callable[[Bar], None]] = []
+        self._bar: Optional[list] = None  # the open bar, fields of Bar
+
+    def subscribe(self, callback: Callable[[Bar], None]):
+        self.subscribers.append(callback)
+
+    def add(self, time: float, price: float, size: float = 0):
+        bar = self._bar
+        if bar is not None and self.kind == "time" and time >= bar[1]:
+            self._close()
+            bar = None
+        if bar is None:
+            start = math.floor(time / self.size) * self.size if self.kind == "time" else time
+            end = start + self.size if self.kind == "time" else time
+            self._bar = [start, end, price, price, price, price, size, 1]
+        else:
+            if price > bar[3]:
+                bar[3] = price
+            if price < bar[4]:
+                bar[4] = price
+            bar[5] = price
+            bar[6] += size
+            bar[7] += 1
+            if self.kind != "time":
+                bar[1] = time
+        if (self.kind == "tick" and self._bar[7] >= self.size) or (self.kind == "volume" and self._bar[6] >= self.size):
+            self._close()
+
+    def flush(self, time: float = None):
+        """closes the open bar: a time bar only if `time` is past its end, any bar without time"""
+        if self._bar is not None and (time is None or self.kind != "time" or time >= self._bar[1]):
+            self._close()
+
+    def _close(self):
+        bar, self._bar = Bar(*self._bar), None
+        for callback in self.subscribers:
+            callback(bar)
+
+
+class BarSeries:
+    """subscriber keeping the last `length` closed bars, see frame()"""
+
+    def __init__(self, length: int = 500):
+        self.bars = deque(maxlen=length)
+
+    def __call__(self, bar: Bar):
+        self.bars.append(bar)
+
+    def frame(self) -> pd.DataFrame:
+        return bars_frame(self.bars)
+
+
+class BarStore:
+    """subscriber appending the closed bars to <path>/<name>_<YYYYMMDD>.csv (day of the bar start, UTC)"""
+
+    def __init__(self, path: str, name: str):
+        self.path = path
+        self.name = name
+        self._file = None
+        self._day = None
+        os.makedirs(path, exist_ok=True)
+
+    def __call__(self, bar: Bar):
+        day = pd.Timestamp(bar.start, unit="s").strftime("%Y%m%d")
+        if day != self._day:
+            self.close()
+            file_name = self.file_name(day)
+            new_file = not os.path.exists(file_name)
+            self._file = open(file_name, "a", newline="")
+            self._writer = csv.writer(self._file)
+            if new_file:
+                self._writer.writerow(COLUMNS)
+            self._day = day
+        self._writer.writerow(bar)
+        self._file.flush()
+
+    def file_name(self, day: str) -> str:
+        return os.path.join(self.path, f"{self.name}_{day}.csv")
+
+    def load(self, day: str) -> pd.DataFrame:
+        return bars_frame(pd.read_csv(self.file_name(day)).itertuples(index=False))
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
@@ -0,0 +1,123 @@
+import asyncio
+import time
+from typing import List, NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+from ib_insync import IB, Contract, Option, Ticker, util
+
+
+COLUMNS = ["expiration", "strike", "right", "conId", "bid", "bidSize", "ask", "askSize", "last", "close",
+           "volume", "iv", "delta", "gamma", "vega", "theta", "undPrice", "complete"]
+
+
+class ChainSnapshot(NamedTuple):
+    data: pd.DataFrame  # one row per contract, see COLUMNS; complete is False for the missing snapshots
+    requested: int
+    completed: int
+    elapsed: float  # seconds
+
+    @property
+    def missing(self) -> pd.DataFrame:
+        return self.data[~self.data.complete]
+
+
+def _value(x) -> float:
+    """IB sends -1 for the missing prices and sizes"""
+    return np.nan if x is None or x == -1 else x
+
+
+def _row(contract: Contract, ticker: Optional[Ticker], complete: bool) -> list:
+    greeks = ticker and (ticker.modelGreeks or ticker.lastGreeks)
+    values = [ticker and _value(getattr(ticker, name)) for name in ("bid", "bidSize", "ask", "askSize", "last", "close", "volume")]
+    values += [greeks and getattr(greeks, name) for name in ("impliedVol", "delta", "gamma", "vega", "theta", "undPrice")]
+    return [contract.lastTradeDateOrContractMonth, contract.strike, contract.right, contract.conId,
+            *[np.nan if v is None else v for v in values], complete]
+
+
+async def _snapshot(ib: IB, contract: Contract, semaphore: asyncio.Semaphore, tickers: dict):
+    """snapshot of one contract, as IB.reqTickersAsync, keeping the ticker in tickers so the
+    fields received are reported even if the snapshot does not end before the deadline (the
+    request is then cancelled)"""
+    async with semaphore:
+        reqId = ib.client.getReqId()
+        future = ib.wrapper.startReq(reqId, contract)
+        ticker = ib.wrapper.startTicker(reqId, contract, "snapshot")
+        tickers[contract.conId] = ticker
+        ib.client.reqMktData(reqId, contract, "", True, False, [])
+        try:
+            await future
+        except asyncio.CancelledError:
+            ib.client.cancelMktData(reqId)
+            # drop the wrapper state of the request, nothing will end it
+            ib.wrapper._endReq(reqId)
+            ib.wrapper.reqId2Ticker.pop(reqId, None)
+            raise
+        finally:
+            ib.wrapper.endTicker(ticker, "snapshot")
+
+
+async def _ladder(ib: IB, underlying: Contract, expiration: str, right: str, trading_class: str,
+                  exchange: str) -> List[Contract]:
+    """every strike of an expiration in a single contract details request (strike left empty)"""
+    option = Option(underlying.symbol, expiration, 0, right, exchange, tradingClass=trading_class)
+    details = await ib.reqContractDetailsAsync(option)
+    return [d.contract for d in details]
+
+
+async def chain_snapshot_async(
+    ib: IB,
+    underlying: Contract,
+    expirations: List[str] = None,
+    strike_range: float = 50,
+    price: float = None,
+    trading_class: str = None,
+    exchange: str = "SMART",
+    strike_step: float = 5,
+    rights: str = "CP",
+    deadline: float = 10,
+    max_concurrent: int = 90,
+) -> ChainSnapshot:
+    """Snapshot of the options of underlying (qualified) with strikes less than strike_range points from
+    price (the underlying price by default) that are multiples of strike_step.
+    expirations: YYYYMMDD, the first expiration of the chain by default (e.g. the SPXW 0DTE)
+    The contracts are loaded with one request per expiration and right, then snapshotted
+    concurrently: at most max_concurrent market data lines at a time, and the client throttles the
+    requests to the IB pacing limit. The snapshots not finished `deadline` seconds after the start
+    are cancelled and reported with complete=False (with the fields received so far).
+    """
+    start = time.perf_counter()
+    trading_class = trading_class or underlying.symbol
+    if expirations is None:
+        chains = await ib.reqSecDefOptParamsAsync(underlying.symbol, "", underlying.secType, underlying.conId)
+        chain = next(c for c in chains if c.tradingClass == trading_class and c.exchange == exchange)
+        expirations = sorted(chain.expirations)[:1]
+    if price is None:
+        [ticker] = await ib.reqTickersAsync(underlying)
+        price = ticker.marketPrice()
+
+    ladders = await asyncio.gather(*[_ladder(ib, underlying, e, r, trading_class, exchange)
+                                     for e in expirations for r in rights])
+    contracts = [c for ladder in ladders for c in ladder]
+    strikes = np.array([c.strike for c in contracts])
+    keep = (strikes % strike_step == 0) & (np.abs(strikes - price) < strike_range)
+    contracts = [c for c, k in zip(contracts, keep) if k]
+    contracts.sort(key=lambda c: (c.lastTradeDateOrContractMonth, c.strike, c.right))
+
+    semaphore = asyncio.Semaphore(max_concurrent)
+    tickers = {}
+    tasks = {asyncio.ensure_future(_snapshot(ib, c, semaphore, tickers)): c for c in contracts}
+    done, pending = await asyncio.wait(tasks, timeout=max(0, deadline - (time.perf_counter() - start))) if tasks else (set(), set())
+    for task in pending:
+        task.cancel()
+    await asyncio.gather(*pending, return_exceptions=True)
+    completed = {tasks[t].conId for t in done if not t.exception()}
+
+    rows = [_row(c, tickers.get(c.conId), c.conId in completed) for c in contracts]
+    data = pd.DataFrame(rows, columns=COLUMNS)
+    return ChainSnapshot(data, len(contracts), len(completed), time.perf_counter() - start)
+
+
+def chain_snapshot(ib: IB, underlying: Contract, **kwargs) -> ChainSnapshot:
+    """blocking version of chain_snapshot_async"""
+    return util.run(chain_snapshot_async(ib, underlying, **kwargs))
@@ -0,0 +1,66 @@
+from sys import argv
+
+import pandas as pd
+import yfinance as yf
+
+from price_history import PriceHistory
+from price_store import PriceStore
+
+
+def get_stock_data(symbol, start, end):
+    """daily prices of symbol from start to end (inclusive)"""
+    data = yf.download(symbol, start=start, end=pd.Timestamp(end) + pd.Timedelta(days=1), progress=False)
+    data.reset_index(inplace=True)
+    data.rename(columns={
+        "Date": "date",
+        "Open": "open",
+        "High": "high",
+        "Low": "low",
+        "Close": "close",
+        "Adj Close": "adj_close",
+        "Volume": "volume"
+    }, inplace=True)
+    data['symbol'] = symbol
+    return data
+
+def save_data_range(symbol, start, end, store):
+    """downloads and saves the ranges of start..end not already in the store"""
+    missing = store.missing(symbol, start, end)
+    for range_start, range_end in missing:
+        data = get_stock_data(symbol, range_start, range_end)
+        store.save(symbol, data, range_start, range_end)
+    return missing
+
+def save_last_trading_session(symbol, store):
+    today = pd.Timestamp.today().normalize()
+    data = get_stock_data(symbol, today, today)
+    # saved even if today is already covered: the session may not have been over the last time
+    store.save(symbol, data, today, today)
+
+if __name__ == "__main__":
+    # usage example for bulk insert (only the missing dates are downloaded)
+    #     python market_data.py bulk SPY,QQQ,AAPL 2022-01-01 2022-10-20
+    # usage example for last session
+    #     python market_data.py last SPY,QQQ,AAPL
+    # the saved rows are also added to the columnar history in price_history/ (see PriceHistory)
+
+    store = PriceStore("market_data.sqlite")
+    history = PriceHistory("price_history")
+
+    if argv[1] == "bulk":
+        symbols = argv[2].split(",")
+        start = argv[3]
+        end = argv[4]
+        for symbol in symbols:
+            missing = save_data_range(symbol, start, end, store)
+            history.import_store(store, [symbol], start, end)
+            print(f"{symbol} saved between {start} and {end} ({len(missing)} missing ranges downloaded)")
+    elif argv[1] == "last":
+        for symbol in argv[2].split(","):
+            save_last_trading_session(symbol, store)
+            history.import_store(store, [symbol], pd.Timestamp.today().normalize())
+            print(f"{symbol} saved")
+    else:
+        print("Enter bulk or last")
+
+    store.close()
@@ -0,0 +1,180 @@
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import shared_memory
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from statsmodels.tsa.stattools import coint
+
+CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS coint (
+    a TEXT NOT NULL,
+    b TEXT NOT NULL,
+    start TEXT NOT NULL,
+    end TEXT NOT NULL,
+    score REAL,
+    pvalue REAL,
+    PRIMARY KEY (a, b, start, end)
+) WITHOUT ROWID;
+"""
+
+
+def candidates(prices: np.ndarray, min_corr: Optional[float] = 0.9, max_pairs: int = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """Prefilter of the pairs of columns of prices (dates x symbols, no missing value): the pairs
+    whose log prices have a correlation of at least min_corr, ordered by the distance of their
+    normalized prices (sum of the squared differences of the prices divided by their first
+    value) and limited to the max_pairs closest.
+    Without min_corr there is no prefilter: every pair, in (i, j) order, with NaN correlation
+    and distance.
+    Returns (i, j, correlation, distance) with i < j."""
+    i, j = np.triu_indices(prices.shape[1], k=1)
+    if min_corr is None:
+        return i, j, np.full(len(i), np.nan), np.full(len(i), np.nan)
+    logs = np.log(prices)
+    centered = logs - logs.mean(axis=0)
+    norms = np.sqrt((centered ** 2).sum(axis=0))
+    corr = (centered.T @ centered) / np.outer(norms, norms)
+    normalized = prices / prices[0]
+    squares = (normalized ** 2).sum(axis=0)
+    distance = squares[:, None] + squares[None, :] - 2 * (normalized.T @ normalized)
+    keep = corr[i, j] >= min_corr
+    i, j = i[keep], j[keep]
+    order = np.argsort(distance[i, j], kind="stable")[:max_pairs]
+    i, j = i[order], j[order]
+    return i, j, corr[i, j], np.maximum(distance[i, j], 0)
+
+
+# price matrix of the worker processes, attached by _init_worker
+_worker = {}
+
+
+def _init_worker(name: str, shape: Tuple[int, int]):
+    shm = shared_memory.SharedMemory(name=name)
+    _worker["shm"] = shm
+    _worker["prices"] = np.ndarray(shape, dtype=np.float64, buffer=shm.buf)
+
+
+def _coint_chunk(tasks: List[Tuple[int, int, int, int]]) -> List[Tuple[int, int, int, int, float, float]]:
+    """Engle-Granger test of each (i, j, lo, hi): columns i and j of the rows lo:hi (NaN score and
+    pvalue when coint rejects the input, e.g. a constant price)"""
+    prices = _worker["prices"]
+    results = []
+    for i, j, lo, hi in tasks:
+        try:
+            score, pvalue, _ = coint(prices[lo:hi, i], prices[lo:hi, j])
+        except ValueError:
+            score = pvalue = np.nan
+        results.append((i, j, lo, hi, score, pvalue))
+    return results
+
+
+class PairScanner:
+    """Cointegration scan of a universe of symbols (the columns of a price DataFrame indexed by date).
+    Each window (rows of the dates) is prefiltered with candidates(), then the Engle-Granger tests
+    (statsmodels coint, as find_cointegrated_pairs in PairsTrading.ipynb) of the candidates run on a
+    process pool that reads the prices from shared memory. min_corr None disables the prefilter.
+    The last window ends at the last row, so the newest prices are always tested, and the others
+    end every `step` rows before it. The results are cached in SQLite per (pair, first date, last
+    date) of the window, whatever the rows of the input: a scan of a longer or later history only
+    tests the windows with new dates. The cache assumes the prices of a date do not change.
+    """
+
+    def __init__(self, cache_path: str = "pairs_cache.sqlite", min_corr: Optional[float] = 0.9, max_pairs: int = None,
+                 processes: int = None, chunk_size: int = 64, verbose: bool = False):
+        self.min_corr = min_corr
+        self.max_pairs = max_pairs
+        self.processes = processes or os.cpu_count()
+        self.chunk_size = chunk_size
+        self.verbose = verbose
+        self.cache = sqlite3.connect(cache_path)
+        self.cache.execute("PRAGMA journal_mode=WAL")
+        self.cache.executescript(CACHE_SCHEMA)
+
+    def close(self):
+        self.cache.close()
+
+    def scan(self, prices: pd.DataFrame, window: int = 252, step: int = 21, last: int = None) -> pd.DataFrame:
+        """Tests the windows of `window` rows ending at the last row and every `step` rows before
+        it (the last `last` windows only if given); in each window, the symbols with a missing
+        price (or a price that is not positive, with the prefilter) are left out.
+        Returns one row per tested pair and window: a, b, start, end, correlation, distance,
+        score and pvalue."""
+        dates = pd.DatetimeIndex(prices.index).strftime("%Y-%m-%d")
+        symbols = list(prices.columns)
+        ends = list(range(len(prices), window - 1, -step))[::-1]
+        if last:
+            ends = ends[-last:]
+
+        rows, tasks = [], []
+        values = prices.to_numpy(dtype=np.float64)
+        for hi in ends:
+            lo = hi - window
+            complete = ~np.isnan(values[lo:hi]).any(axis=0)
+            if self.min_corr is not None:
+                complete &= (values[lo:hi] > 0).all(axis=0)
+            complete = np.flatnonzero(complete)
+            i, j, corr, distance = candidates(values[lo:hi, complete], self.min_corr, self.max_pairs)
+            i, j = complete[i], complete[j]
+            cached = self._cached(dates[lo], dates[hi - 1])
+            for a, b, c, d in zip(i, j, corr, distance):
+                key = (symbols[a], symbols[b])
+                row = {"a": key[0], "b": key[1], "start": dates[lo], "end": dates[hi - 1],
+                       "correlation": c, "distance": d, "score": np.nan, "pvalue": np.nan}
+                if key in cached:
+                    row["score"], row["pvalue"] = cached[key]
+                else:
+                    tasks.append((a, b, lo, hi, len(rows)))
+                rows.append(row)
+
+        if self.verbose:
+            print(f"{len(ends)} windows, {len(rows)} candidate pairs, {len(tasks)} to test")
+        if tasks:
+            self._test(values, tasks, rows)
+        return pd.DataFrame(rows, columns=["a", "b", "start", "end", "correlation", "distance", "score", "pvalue"])
+
+    def _cached(self, start: str, end: str) -> dict:
+        rows = self.cache.execute("SELECT a, b, score, pvalue FROM coint WHERE start = ? AND end = ?", (start, end))
+        return {(a, b): (score, pvalue) for a, b, score, pvalue in rows}
+
+    def _test(self, values: np.ndarray, tasks: List[Tuple[int, int, int, int, int]], rows: List[dict]):
+        """runs the tests (i, j, lo, hi, row) on the pool, sets the score and pvalue of their row and
+        caches them as the chunks complete (an interrupted scan keeps what it has tested)"""
+        shm = shared_memory.SharedMemory(create=True, size=values.nbytes)
+        try:
+            np.ndarray(values.shape, dtype=np.float64, buffer=shm.buf)[:] = values
+            chunks = [tasks[k:k + self.chunk_size] for k in range(0, len(tasks), self.chunk_size)]
+            with ProcessPoolExecutor(self.processes, initializer=_init_worker, initargs=(shm.name, values.shape)) as pool:
+                futures = {pool.submit(_coint_chunk, [t[:4] for t in chunk]): chunk for chunk in chunks}
+                for future in as_completed(futures):
+                    cached = []
+                    for (_, _, _, _, row), (_, _, _, _, score, pvalue) in zip(futures[future], future.result()):
+                        r = rows[row]
+                        r["score"], r["pvalue"] = score, pvalue
+                        cached.append((r["a"], r["b"], r["start"], r["end"], score, pvalue))
+                    with self.cache:
+                        self.cache.executemany("INSERT OR REPLACE INTO coint VALUES (?, ?, ?, ?, ?, ?)", cached)
+        finally:
+            shm.close()
+            shm.unlink()
+
+
+def find_cointegrated_pairs(data: pd.DataFrame, min_corr: Optional[float] = None, pvalue: float = 0.05,
+                            processes: int = None, cache_path: str = ":memory:"):
+    """find_cointegrated_pairs of PairsTrading.ipynb on the whole period of data, with the pairs
+    tested in parallel (and only those with a correlation of at least min_corr if given):
+    (score matrix, pvalue matrix, pairs with a pvalue below `pvalue` in (i, j) order)"""
+    n = data.shape[1]
+    keys = list(data.keys())
+    scanner = PairScanner(cache_path, min_corr, processes=processes)
+    results = scanner.scan(data, window=len(data), step=len(data))
+    scanner.close()
+    score_matrix = np.zeros((n, n))
+    pvalue_matrix = np.ones((n, n))
+    for r in results.itertuples():
+        i, j = keys.index(r.a), keys.index(r.b)
+        score_matrix[i, j] = r.score
+        pvalue_matrix[i, j] = r.pvalue
+    pairs = [(keys[i], keys[j]) for i, j in zip(*np.nonzero(np.triu(pvalue_matrix < pvalue, k=1)))]
+    return score_matrix, pvalue_matrix, pairs
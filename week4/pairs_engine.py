@@ -0,0 +1,136 @@
+from typing import List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from tick_buffer import TickBuffer, Window
+
+
+class PairsEngine:
+    """Hedge ratio, spread and z-score of many pairs, updated in O(1) per pair and price update.
+
+    A pair (S1, S2) is traded on the spread S2 - beta * S1, as in PairsTrading.ipynb, and its
+    z-score is (spread - mean) / std. The state of all the pairs is kept in arrays:
+      - mode "ewm": exponentially weighted means, variances and covariance of the prices
+        (Welford-style updates, halflife in updates), beta = cov(S1, S2) / var(S1), and the
+        exponentially weighted mean and variance of the spread
+      - mode "kalman": beta and the intercept follow a random walk (delta: its variance per update
+        relative to the state variance) and are estimated with a Kalman filter; the z-score is the
+        prediction error over its standard deviation
+    update(symbol, price) updates the pairs of one symbol (a tick), update_all(prices) every pair
+    (a bar). Each update is a sample: with ticks, a pair is updated when either of its legs trades,
+    with the last price of the other leg. The z-score is NaN for the first min_periods updates.
+    """
+
+    def __init__(self, pairs: Sequence[Tuple[str, str]], mode: str = "ewm", halflife: float = 100,
+                 delta: float = 1e-4, observation_var: float = 1e-3, min_periods: int = 20):
+        if mode not in ("ewm", "kalman"):
+            raise ValueError(f"unknown mode {mode}")
+        self.pairs = [tuple(p) for p in pairs]
+        self.symbols: List[str] = sorted({s for p in self.pairs for s in p})
+        self.index = {s: i for i, s in enumerate(self.symbols)}
+        self.x = np.array([self.index[a] for a, _ in self.pairs])  # S1 of each pair
+        self.y = np.array([self.index[b] for _, b in self.pairs])  # S2 of each pair
+        # pairs of each symbol
+        self.symbol_pairs = [np.flatnonzero((self.x == i) | (self.y == i)) for i in range(len(self.symbols))]
+        self.mode = mode
+        self.alpha = 1 - 0.5 ** (1 / halflife)
+        self.delta = delta
+        self.observation_var = observation_var
+        self.min_periods = min_periods
+
+        n = len(self.pairs)
+        self.prices = np.full(len(self.symbols), np.nan)
+        self.count = np.zeros(n, dtype=np.int64)
+        self.beta = np.full(n, np.nan)
+        self.spread = np.full(n, np.nan)
+        self.z = np.full(n, np.nan)
+        # ewm
+        self.mean_x = np.zeros(n)
+        self.mean_y = np.zeros(n)
+        self.var_x = np.zeros(n)
+        self.cov_xy = np.zeros(n)
+        self.mean_spread = np.zeros(n)
+        self.var_spread = np.zeros(n)
+        # kalman: state (beta, intercept) and its covariance
+        self.state = np.zeros((n, 2))
+        self.state_cov = np.zeros((n, 2, 2))
+
+    def update(self, symbol: str, price: float):
+        i = self.index[symbol]
+        self.prices[i] = price
+        self._update(self.symbol_pairs[i])
+
+    def update_all(self, prices: Sequence[float]):
+        """prices: of self.symbols, in this order (NaN for the symbols without a new price)"""
+        prices = np.asarray(prices, dtype=float)
+        new = ~np.isnan(prices)
+        self.prices[new] = prices[new]
+        self._update(np.flatnonzero(new[self.x] | new[self.y]))
+
+    def _update(self, pairs: np.ndarray):
+        x, y = self.prices[self.x[pairs]], self.prices[self.y[pairs]]
+        ready = ~(np.isnan(x) | np.isnan(y))
+        pairs, x, y = pairs[ready], x[ready], y[ready]
+        if not len(pairs):
+            return
+        first = self.count[pairs] == 0
+        self.count[pairs] += 1
+        if self.mode == "ewm":
+            self._update_ewm(pairs, x, y, first)
+        else:
+            self._update_kalman(pairs, x, y, first)
+        self.z[pairs[self.count[pairs] <= self.min_periods]] = np.nan
+
+    def _update_ewm(self, pairs: np.ndarray, x: np.ndarray, y: np.ndarray, first: np.ndarray):
+        a = self.alpha
+        mean_x, mean_y = self.mean_x[pairs], self.mean_y[pairs]
+        mean_x[first], mean_y[first] = x[first], y[first]
+        dx, dy = x - mean_x, y - mean_y
+        mean_x += a * dx
+        mean_y += a * dy
+        var_x = (1 - a) * (self.var_x[pairs] + a * dx * dx)
+        cov_xy = (1 - a) * (self.cov_xy[pairs] + a * dx * dy)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            beta = cov_xy / var_x
+        spread = y - beta * x
+
+        mean_spread = np.where(first | np.isnan(self.mean_spread[pairs]), spread, self.mean_spread[pairs])
+        ds = spread - mean_spread
+        mean_spread = mean_spread + a * ds
+        var_spread = (1 - a) * (np.nan_to_num(self.var_spread[pairs]) + a * ds * ds)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            z = (spread - mean_spread) / np.sqrt(var_spread)
+
+        self.mean_x[pairs], self.mean_y[pairs], self.var_x[pairs], self.cov_xy[pairs] = mean_x, mean_y, var_x, cov_xy
+        self.mean_spread[pairs], self.var_spread[pairs] = mean_spread, var_spread
+        self.beta[pairs], self.spread[pairs], self.z[pairs] = beta, spread, z
+
+    def _update_kalman(self, pairs: np.ndarray, x: np.ndarray, y: np.ndarray, first: np.ndarray):
+        # observation y = beta * x + intercept + e, state random walk with covariance delta / (1 - delta) * I
+        state, cov = self.state[pairs], self.state_cov[pairs]
+        state[first] = (y[first] / x[first])[:, None] * [1, 0]
+        cov[first] = np.eye(2)
+        cov = cov + self.delta / (1 - self.delta) * np.eye(2)
+        h = np.stack([x, np.ones_like(x)], axis=1)
+        error = y - (h * state).sum(axis=1)
+        ph = np.einsum("nij,nj->ni", cov, h)
+        error_var = (h * ph).sum(axis=1) + self.observation_var
+        gain = ph / error_var[:, None]
+        state = state + gain * error[:, None]
+        cov = cov - gain[:, :, None] * ph[:, None, :]
+
+        self.state[pairs], self.state_cov[pairs] = state, cov
+        self.beta[pairs] = state[:, 0]
+        self.spread[pairs] = y - state[:, 0] * x
+        self.z[pairs] = error / np.sqrt(error_var)
+
+    def watch(self, symbol: str, ticks: TickBuffer):
+        """updates the pairs of symbol on every tick of its buffer (in the API thread)"""
+        def on_tick(buffer: TickBuffer, window: Window):
+            self.update(symbol, window.price)
+        ticks.listeners.append(on_tick)
+
+    def frame(self) -> pd.DataFrame:
+        return pd.DataFrame({"S1": [a for a, _ in self.pairs], "S2": [b for _, b in self.pairs],
+                             "beta": self.beta, "spread": self.spread, "z": self.z, "updates": self.count})
@@ -0,0 +1,154 @@
+import mmap
+import os
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+from price_store import PRICE_COLUMNS, DateLike, PriceStore
+
+DATE_FILE = "date.npy"
+
+
+def _day(d: DateLike) -> np.datetime64:
+    return np.datetime64(pd.Timestamp(d).date(), "D")
+
+
+def _load(path: str, dtype: str) -> np.ndarray:
+    """read-only memory map of a .npy file written by _save (np.load(mmap_mode="r") parses the
+    header with ast, which costs more than the read of a partition)"""
+    with open(path, "rb") as file:
+        buffer = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    if buffer[6] == 1:
+        offset = 10 + int.from_bytes(buffer[8:10], "little")
+    else:
+        offset = 12 + int.from_bytes(buffer[8:12], "little")
+    return np.frombuffer(buffer, dtype=dtype, offset=offset)
+
+
+def _save(path: str, array: np.ndarray):
+    """replaces path (a .npy file) in one step, readers see the old or the new file"""
+    tmp = path[:-4] + ".tmp.npy"
+    np.save(tmp, array)
+    os.replace(tmp, path)
+
+
+class PriceHistory:
+    """Daily price history in columnar files: <root>/<symbol>/<year>/<column>.npy, with the dates
+    (datetime64[D], sorted) in date.npy. Reads memory-map only the years of the date range and
+    the requested columns; matrix() aligns many symbols on the union of their dates.
+
+    A partition is updated by writing its columns, then its dates (each file replaced in one
+    step), and a reader trims the columns to the length of the dates: a read during a write that
+    only adds dates after the last one (the daily update) sees the old or the new rows. A write that
+    inserts dates before the last one is not safe to read concurrently, the new columns could be
+    read with the old dates. There must be one writer.
+    Plain .npy files are used instead of Parquet so that reads are zero-copy memory maps and no
+    extra dependency is needed.
+    """
+
+    def __init__(self, root: str = "price_history"):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def symbols(self) -> List[str]:
+        return sorted(s for s in os.listdir(self.root) if os.path.isdir(os.path.join(self.root, s)))
+
+    def years(self, symbol: str) -> List[int]:
+        path = os.path.join(self.root, symbol)
+        return sorted(int(y) for y in os.listdir(path) if y.isdigit()) if os.path.isdir(path) else []
+
+    def _partition(self, symbol: str, year: int, columns: Sequence[str]) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        path = os.path.join(self.root, symbol, str(year))
+        dates = _load(os.path.join(path, DATE_FILE), "<M8[D]")
+        values = {c: _load(os.path.join(path, c + ".npy"), "<f8")[:len(dates)] for c in columns}
+        return dates, values
+
+    def write(self, symbol: str, data: pd.DataFrame):
+        """adds the rows of data (DatetimeIndex or a date column, and PRICE_COLUMNS columns) to the
+        partitions of their years; the rows of dates already stored are replaced. A daily update
+        only rewrites the partition of the current year."""
+        if "date" in data.columns:
+            data = data.set_index("date")
+        dates = pd.DatetimeIndex(data.index).values.astype("datetime64[D]")
+        values = data.reindex(columns=PRICE_COLUMNS).to_numpy(dtype=float)
+        years = dates.astype("datetime64[Y]").astype(int) + 1970
+        for year in np.unique(years):
+            rows = years == year
+            new_dates, new_values = dates[rows], values[rows]
+            path = os.path.join(self.root, symbol, str(year))
+            if os.path.exists(os.path.join(path, DATE_FILE)):
+                old_dates, old = self._partition(symbol, year, PRICE_COLUMNS)
+                keep = ~np.isin(old_dates, new_dates)
+                new_dates = np.concatenate([old_dates[keep], new_dates])
+                new_values = np.concatenate([np.column_stack([old[c][keep] for c in PRICE_COLUMNS]), new_values])
+            # last row of each date (the new ones are after the old ones)
+            order = np.argsort(new_dates, kind="stable")
+            new_dates, new_values = new_dates[order], new_values[order]
+            last = np.append(new_dates[1:] != new_dates[:-1], True)
+            new_dates, new_values = new_dates[last], new_values[last]
+            os.makedirs(path, exist_ok=True)
+            for i, column in enumerate(PRICE_COLUMNS):
+                _save(os.path.join(path, column + ".npy"), new_values[:, i].astype("<f8"))
+            _save(os.path.join(path, DATE_FILE), new_dates.astype("<M8[D]"))
+
+    append = write
+
+    def read(self, symbol: str, columns: Sequence[str] = PRICE_COLUMNS, start: DateLike = None,
+             end: DateLike = None) -> pd.DataFrame:
+        """rows of symbol between start and end (inclusive), indexed by date"""
+        dates, values = self._read(symbol, list(columns), start, end)
+        return pd.DataFrame(values, index=pd.DatetimeIndex(dates, name="date"))
+
+    def _read(self, symbol: str, columns: List[str], start: DateLike, end: DateLike) -> Tuple[np.ndarray, Dict[str, np.ndarray]]:
+        start = _day(start) if start is not None else None
+        end = _day(end) if end is not None else None
+        first_year = start.astype("datetime64[Y]").astype(int) + 1970 if start is not None else 0
+        last_year = end.astype("datetime64[Y]").astype(int) + 1970 if end is not None else 9999
+        parts = []
+        for year in self.years(symbol):
+            if year < first_year or year > last_year:
+                continue
+            dates, values = self._partition(symbol, year, columns)
+            lo = np.searchsorted(dates, start) if start is not None else 0
+            hi = np.searchsorted(dates, end, side="right") if end is not None else len(dates)
+            parts.append((dates[lo:hi], {c: v[lo:hi] for c, v in values.items()}))
+        if len(parts) == 1:
+            return parts[0]
+        if not parts:
+            return np.array([], dtype="datetime64[D]"), {c: np.array([]) for c in columns}
+        return (np.concatenate([p[0] for p in parts]),
+                {c: np.concatenate([p[1][c] for p in parts]) for c in columns})
+
+    def matrix(self, symbols: Iterable[str], column: str = "adj_close", start: DateLike = None,
+               end: DateLike = None) -> Tuple[np.ndarray, np.ndarray]:
+        """(dates, values): the union of the dates of the symbols and the dates x symbols matrix
+        of column, NaN where a symbol has no row"""
+        symbols = list(symbols)
+        series = [self._read(s, [column], start, end) for s in symbols]
+        days = [d.astype(np.int64) for d, _ in series]
+        if not any(len(d) for d in days):
+            return np.array([], dtype="datetime64[D]"), np.full((0, len(symbols)), np.nan)
+        # union of the dates without sorting: mark the days present between the first and the last
+        first = min(d[0] for d in days if len(d))
+        present = np.zeros(max(d[-1] for d in days if len(d)) - first + 1, dtype=bool)
+        for d in days:
+            present[d - first] = True
+        row = np.cumsum(present) - 1
+        values = np.full((int(present.sum()), len(symbols)), np.nan)
+        for j, (d, (_, v)) in enumerate(zip(days, series)):
+            values[row[d - first], j] = v[column]
+        return (np.flatnonzero(present) + first).astype("datetime64[D]"), values
+
+    def panel(self, symbols: Iterable[str], column: str = "adj_close", start: DateLike = None,
+              end: DateLike = None) -> pd.DataFrame:
+        symbols = list(symbols)
+        dates, values = self.matrix(symbols, column, start, end)
+        return pd.DataFrame(values, index=pd.DatetimeIndex(dates, name="date"), columns=symbols)
+
+    def import_store(self, store: PriceStore, symbols: Iterable[str], start: DateLike = None, end: DateLike = None):
+        """copies the rows of the symbols from a PriceStore"""
+        for symbol in symbols:
+            data = store.read([symbol], start, end)
+            if len(data):
+                self.write(symbol, data.loc[symbol])
@@ -0,0 +1,133 @@
+import itertools
+import sqlite3
+from datetime import date, timedelta
+from typing import Iterable, List, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+PRICE_COLUMNS = ["open", "high", "low", "close", "adj_close", "volume"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS stock_data (
+    symbol TEXT NOT NULL,
+    date TEXT NOT NULL,
+    open REAL,
+    high REAL,
+    low REAL,
+    close REAL,
+    adj_close REAL,
+    volume INTEGER,
+    PRIMARY KEY (symbol, date)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS coverage (
+    symbol TEXT NOT NULL,
+    start TEXT NOT NULL,
+    end TEXT NOT NULL,
+    PRIMARY KEY (symbol, start)
+) WITHOUT ROWID;
+"""
+
+UPSERT = f"""
+INSERT INTO stock_data (symbol, date, {', '.join(PRICE_COLUMNS)}) VALUES (?, ?, {', '.join('?' * len(PRICE_COLUMNS))})
+ON CONFLICT (symbol, date) DO UPDATE SET {', '.join(f'{c} = excluded.{c}' for c in PRICE_COLUMNS)}
+"""
+
+DateLike = Union[str, date, pd.Timestamp]
+
+
+def _date(d: DateLike) -> date:
+    return pd.Timestamp(d).date()
+
+
+class PriceStore:
+    """Daily prices in SQLite, one row per (symbol, date) (the primary key, so the rows are indexed
+    by symbol and date and a day loaded twice is updated instead of duplicated).
+    The coverage table has the date ranges (inclusive) already loaded for each symbol, so that a
+    bulk load only downloads the missing ranges (see missing()), including the days without a
+    trading session that are in a loaded range.
+    """
+
+    def __init__(self, path: str = "market_data.sqlite"):
+        self.con = sqlite3.connect(path)
+        self.con.execute("PRAGMA journal_mode=WAL")
+        self.con.execute("PRAGMA synchronous=NORMAL")
+        self.con.executescript(SCHEMA)
+
+    def close(self):
+        self.con.close()
+
+    def save(self, symbol: str, data: pd.DataFrame, start: DateLike, end: DateLike):
+        """upserts the rows of data (date and PRICE_COLUMNS columns) and marks start..end as
+        loaded for symbol, in one transaction. Only up to the last date of data: an empty or short
+        download (yfinance does not raise when it fails) leaves the rest of the range missing."""
+        dates = pd.to_datetime(data["date"]).dt.strftime("%Y-%m-%d").tolist()
+        values = data.reindex(columns=PRICE_COLUMNS).to_numpy(dtype=float, copy=True)
+        values[:, -1] = values[:, -1].round()
+        # NULL for the missing values
+        columns = values.T.astype(object)
+        columns[np.isnan(values.T)] = None
+        rows = zip(itertools.repeat(symbol), dates, *columns.tolist())
+        with self.con:
+            self.con.executemany(UPSERT, rows)
+            last = min(_date(end), _date(max(dates))) if dates else None
+            if last and last >= _date(start):
+                self._add_coverage(symbol, _date(start), last)
+
+    def _add_coverage(self, symbol: str, start: date, end: date):
+        """merges start..end with the ranges of symbol that overlap it or are next to it"""
+        ranges = self.coverage(symbol)
+        merged = [(s, e) for s, e in ranges if s <= end + timedelta(days=1) and e >= start - timedelta(days=1)]
+        for s, e in merged:
+            start, end = min(start, s), max(end, e)
+        self.con.executemany("DELETE FROM coverage WHERE symbol = ? AND start = ?",
+                             [(symbol, s.isoformat()) for s, _ in merged])
+        self.con.execute("INSERT INTO coverage VALUES (?, ?, ?)", (symbol, start.isoformat(), end.isoformat()))
+
+    def coverage(self, symbol: str) -> List[Tuple[date, date]]:
+        rows = self.con.execute("SELECT start, end FROM coverage WHERE symbol = ? ORDER BY start", (symbol,))
+        return [(date.fromisoformat(s), date.fromisoformat(e)) for s, e in rows]
+
+    def missing(self, symbol: str, start: DateLike, end: DateLike) -> List[Tuple[date, date]]:
+        """the ranges of start..end (inclusive) that are not loaded for symbol"""
+        start, end = _date(start), _date(end)
+        gaps = []
+        for s, e in self.coverage(symbol):
+            if e < start or s > end:
+                continue
+            if s > start:
+                gaps.append((start, s - timedelta(days=1)))
+            start = max(start, e + timedelta(days=1))
+        if start <= end:
+            gaps.append((start, end))
+        return gaps
+
+    def read(self, symbols: Iterable[str], start: DateLike = None, end: DateLike = None,
+             columns: Sequence[str] = PRICE_COLUMNS) -> pd.DataFrame:
+        """rows of the symbols between start and end (inclusive), indexed by (symbol, date), with
+        float columns (volume is int64 when it has no missing value)"""
+        columns = list(columns)
+        unknown = set(columns) - set(PRICE_COLUMNS)
+        if unknown:
+            raise ValueError(f"unknown columns {sorted(unknown)}")
+        symbols = list(symbols)
+        query = (f"SELECT symbol, date, {', '.join(columns)} FROM stock_data "
+                 f"WHERE symbol IN ({', '.join('?' * len(symbols))}) AND date BETWEEN ? AND ? ORDER BY symbol, date")
+        start = _date(start).isoformat() if start is not None else "0000-00-00"
+        end = _date(end).isoformat() if end is not None else "9999-99-99"
+        rows = self.con.execute(query, (*symbols, start, end)).fetchall()
+        if not rows:
+            return pd.DataFrame(columns=columns, index=pd.MultiIndex.from_arrays([[], pd.DatetimeIndex([])], names=["symbol", "date"]))
+        symbol_column, date_column, *values = zip(*rows)
+        data = {c: np.array(v, dtype=float) for c, v in zip(columns, values)}
+        if "volume" in data and not np.isnan(data["volume"]).any():
+            data["volume"] = data["volume"].astype(np.int64)
+        index = pd.MultiIndex.from_arrays([np.array(symbol_column), pd.to_datetime(np.array(date_column))], names=["symbol", "date"])
+        return pd.DataFrame(data, index=index)
+
+    def panel(self, symbols: Iterable[str], column: str = "adj_close", start: DateLike = None,
+              end: DateLike = None) -> pd.DataFrame:
+        """one column of the symbols, indexed by date with one column per symbol (NaN for the days
+        a symbol has no row); .to_numpy() gives the dates x symbols array"""
+        symbols = list(symbols)
+        return self.read(symbols, start, end, [column])[column].unstack("symbol").reindex(columns=symbols)
@@ -0,0 +1,78 @@
+import threading
+from collections import defaultdict
+from typing import Callable, Optional
+
+from tick_buffer import TickBuffer, Window
+
+
+def breakout(pct: float = 0.05) -> Callable[[Window], Optional[str]]:
+    """condition of the tutorial: SELL when the price falls pct below the max of the window,
+    BUY when it rises pct above its min"""
+    def condition(window: Window):
+        if window.price < window.max * (1 - pct):
+            return "SELL"
+        if window.price > window.min * (1 + pct):
+            return "BUY"
+        return None
+    return condition
+
+
+class Rule:
+    """condition(window) -> signal (e.g. "BUY") or None, evaluated on every tick of its buffer;
+    action(signal, window) is called when it returns a signal. The action may trade another
+    instrument than the one watched (e.g. a GOOG breakout placing an AAPL order).
+    warmup: seconds of ticks needed before the rule is evaluated
+    debounce: seconds (of tick time) during which the rule does not fire again
+    once: the rule is removed after it fired
+    """
+
+    def __init__(self, name, condition, action, warmup: float = 0, debounce: float = 0, once: bool = False):
+        self.name = name
+        self.condition = condition
+        self.action = action
+        self.warmup = warmup
+        self.debounce = debounce
+        self.once = once
+        self.last_fired: Optional[float] = None
+
+
+class SignalEngine:
+    """Evaluates the rules of a tick buffer when a tick arrives, in the thread that appends it
+    (the API thread), so a signal is acted upon as soon as its tick is processed and the cost
+    only depends on the number of ticks, not on the number of watched symbols."""
+
+    def __init__(self):
+        self.rules = defaultdict(list)  # rules by tick buffer
+        self.lock = threading.Lock()
+        self.done = threading.Event()  # set when the last `once` rule has fired
+
+    def add(self, ticks: TickBuffer, rule: Rule):
+        with self.lock:
+            if ticks not in self.rules:
+                ticks.listeners.append(self.on_tick)
+            self.rules[ticks].append(rule)
+            self.done.clear()
+
+    def remove(self, ticks: TickBuffer, rule: Rule):
+        with self.lock:
+            self.rules[ticks].remove(rule)
+            if not any(r.once for rules in self.rules.values() for r in rules):
+                self.done.set()
+
+    def on_tick(self, ticks: TickBuffer, window: Window):
+        for rule in list(self.rules[ticks]):
+            if window.time - window.first_time < rule.warmup:
+                continue
+            if rule.last_fired is not None and window.time - rule.last_fired < rule.debounce:
+                continue
+            signal = rule.condition(window)
+            if signal is None:
+                continue
+            rule.last_fired = window.time
+            if rule.once:
+                self.remove(ticks, rule)
+            rule.action(signal, window)
+
+    def wait(self, timeout: float = None) -> bool:
+        """blocks until every `once` rule has fired"""
+        return self.done.wait(timeout)
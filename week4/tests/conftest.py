@@ -0,0 +1,40 @@
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pytest
+
+# the week4 modules import each other by module name, from the week4 directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from price_store import PRICE_COLUMNS  # noqa: E402
+
+
+def random_prices(days, seed=0) -> pd.DataFrame:
+    """daily PRICE_COLUMNS indexed by date, with whole volumes"""
+    rng = np.random.default_rng(seed)
+    data = pd.DataFrame(rng.uniform(10, 20, (len(days), len(PRICE_COLUMNS))), columns=PRICE_COLUMNS,
+                        index=pd.DatetimeIndex(days, name="date"))
+    data["volume"] = rng.integers(1000, 5000, len(days)).astype(float)
+    return data
+
+
+def random_ticks(n, seed=0, start=0.0, interval=2.0):
+    """(times, prices, sizes) of n ticks, a run of them at the same time"""
+    rng = np.random.default_rng(seed)
+    times = start + np.cumsum(rng.exponential(interval, n))
+    times[10:20] = times[10]
+    prices = 100 + np.cumsum(rng.normal(0, 0.1, n)).round(2)
+    sizes = rng.integers(1, 10, n).astype(float)
+    return times, prices, sizes
+
+
+@pytest.fixture
+def make_prices():
+    return random_prices
+
+
+@pytest.fixture
+def make_ticks():
+    return random_ticks
@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from bar_aggregator import BarAggregator, BarSeries, BarStore, bars_frame
+
+START = 1_700_000_000.0
+
+
+@pytest.fixture
+def ticks(make_ticks):
+    def ticks(n, seed=0):
+        times, prices, sizes = make_ticks(n, seed, start=START, interval=5.0)
+        times[50] = np.ceil(times[49] / 60) * 60  # a tick on a bar boundary
+        return times, prices, sizes
+    return ticks
+
+
+def aggregate(kind, size, times, prices, sizes):
+    aggregator = BarAggregator(kind, size)
+    series = BarSeries(length=len(times))
+    aggregator.subscribe(series)
+    for t, p, s in zip(times, prices, sizes):
+        aggregator.add(t, p, s)
+    aggregator.flush()
+    return list(series.bars)
+
+
+def test_time_bars_match_pandas_resample(ticks):
+    times, prices, sizes = ticks(2000)
+    bars = aggregate("time", 60, times, prices, sizes)
+    frame = bars_frame(bars)
+    ticks = pd.DataFrame({"price": prices, "size": sizes}, index=pd.to_datetime(times, unit="s"))
+    resampled = ticks.resample("60s", origin="epoch").agg(
+        {"price": ["first", "max", "min", "last"], "size": ["sum", "count"]}).dropna()
+    resampled.columns = ["Open", "High", "Low", "Close", "Volume", "ticks"]
+    expected = resampled[resampled["ticks"] > 0]
+    pd.testing.assert_frame_equal(frame[["Open", "High", "Low", "Close", "Volume"]],
+                                  expected[["Open", "High", "Low", "Close", "Volume"]],
+                                  check_names=False, check_freq=False, check_index_type=False)
+    np.testing.assert_array_equal(frame["ticks"], expected["ticks"])
+    assert all(b.start % 60 == 0 and b.end == b.start + 60 for b in bars)
+
+
+def test_tick_bars(ticks):
+    times, prices, sizes = ticks(1003)
+    bars = aggregate("tick", 10, times, prices, sizes)
+    assert len(bars) == 101 and [b.ticks for b in bars] == [10] * 100 + [3]
+    for k, bar in enumerate(bars):
+        rows = slice(10 * k, 10 * k + bar.ticks)
+        assert (bar.start, bar.end) == (times[rows][0], times[rows][-1])
+        assert (bar.open, bar.high, bar.low, bar.close) == (prices[rows][0], prices[rows].max(), prices[rows].min(), prices[rows][-1])
+        assert bar.volume == sizes[rows].sum()
+
+
+def test_volume_bars_close_on_the_tick_reaching_the_size(ticks):
+    times, prices, sizes = ticks(500)
+    bars = aggregate("volume", 50, times, prices, sizes)
+    # brute force: cut after the tick that brings the running volume to 50 or more
+    first, expected = 0, []
+    volume = 0.0
+    for k, s in enumerate(sizes):
+        volume += s
+        if volume >= 50 or k == len(sizes) - 1:
+            expected.append((first, k + 1, volume))
+            first, volume = k + 1, 0.0
+    assert [(b.ticks, b.volume) for b in bars] == [(hi - lo, v) for lo, hi, v in expected]
+    assert all(b.volume >= 50 for b in bars[:-1])
+    assert [b.close for b in bars] == [prices[hi - 1] for _, hi, _ in expected]
+
+
+def test_flush_closes_a_time_bar_only_after_its_end():
+    aggregator = BarAggregator("time", 60)
+    bars = []
+    aggregator.subscribe(bars.append)
+    aggregator.add(START + 1, 10.0, 1)
+    aggregator.flush(START + 30)
+    assert bars == []
+    aggregator.flush(START + 60 - START % 60)
+    assert len(bars) == 1 and bars[0].start == START - START % 60
+    aggregator.flush()
+    assert len(bars) == 1
+
+
+def test_unknown_kind():
+    with pytest.raises(ValueError):
+        BarAggregator("dollar", 1000)
+
+
+def test_bar_store_round_trip(tmp_path, ticks):
+    times, prices, sizes = ticks(300)
+    aggregator = BarAggregator("time", 60)
+    store = BarStore(str(tmp_path), "ES")
+    series = BarSeries(length=1000)
+    aggregator.subscribe(store)
+    aggregator.subscribe(series)
+    for t, p, s in zip(times, prices, sizes):
+        aggregator.add(t, p, s)
+    aggregator.flush()
+    store.close()
+    expected = series.frame()
+    days = sorted({d.strftime("%Y%m%d") for d in expected.index})
+    loaded = pd.concat([store.load(day) for day in days])
+    pd.testing.assert_frame_equal(loaded, expected, check_dtype=False)
@@ -0,0 +1,48 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pair_scanner import PairScanner
+
+
+def random_panel(n, seed=0):
+    rng = np.random.default_rng(seed)
+    common = 100 + np.cumsum(rng.normal(0, 1, n))
+    data = {s: common * w + rng.normal(0, 1, n) + 50 for s, w in zip("ABCD", [1, 0.5, 2, 1.5])}
+    return pd.DataFrame(data, index=pd.bdate_range("2020-01-01", periods=n))
+
+
+@pytest.fixture
+def scanner(tmp_path):
+    scanner = PairScanner(str(tmp_path / "cache.sqlite"), min_corr=None, processes=1)
+    yield scanner
+    scanner.close()
+
+
+def count_tests(monkeypatch, scanner):
+    tested = []
+    test = scanner._test
+    monkeypatch.setattr(scanner, "_test", lambda values, tasks, rows: (tested.append(len(tasks)), test(values, tasks, rows)))
+    return tested
+
+
+def test_the_last_window_ends_at_the_last_row(scanner):
+    prices = random_panel(300)
+    results = scanner.scan(prices, window=252, step=21)
+    dates = prices.index.strftime("%Y-%m-%d")
+    assert sorted(set(results["end"])) == [dates[257], dates[278], dates[299]]
+    assert sorted(set(results["start"])) == [dates[6], dates[27], dates[48]]
+    assert len(results) == 3 * 6 and not results["pvalue"].isna().any()
+    assert set(scanner.scan(prices, window=252, step=21, last=1)["end"]) == {dates[299]}
+
+
+def test_the_cache_is_keyed_by_dates(scanner, monkeypatch):
+    prices = random_panel(321)
+    first = scanner.scan(prices.iloc[:300], window=252, step=21)
+    tested = count_tests(monkeypatch, scanner)
+    # 21 days later, from a later first date: only the window ending at the new last row is tested
+    second = scanner.scan(prices.iloc[10:], window=252, step=21)
+    assert tested == [6]
+    merged = second.merge(first, on=["a", "b", "start", "end"], suffixes=("", "_first"))
+    assert len(merged) == 2 * 6
+    np.testing.assert_array_equal(merged["pvalue"], merged["pvalue_first"])
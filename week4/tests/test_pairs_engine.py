@@ -0,0 +1,114 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from pairs_engine import PairsEngine
+from tick_buffer import TickBuffer
+
+PAIRS = [("AAA", "BBB"), ("BBB", "CCC"), ("AAA", "CCC")]
+
+
+def random_prices(n, seed=0):
+    """cointegrated-ish prices of AAA, BBB, CCC (the sorted symbols of PAIRS)"""
+    rng = np.random.default_rng(seed)
+    common = 100 + np.cumsum(rng.normal(0, 1, n))
+    return np.column_stack([common + rng.normal(0, 1, n), 2 * common + rng.normal(0, 2, n),
+                            0.5 * common + 30 + rng.normal(0, 1, n)])
+
+
+def test_ewm_matches_pandas():
+    prices = random_prices(500)
+    engine = PairsEngine(PAIRS, "ewm", halflife=50, min_periods=20)
+    betas, zs = [], []
+    for row in prices:
+        engine.update_all(row)
+        betas.append(engine.beta.copy())
+        zs.append(engine.z.copy())
+    betas, zs = np.array(betas), np.array(zs)
+    a = engine.alpha
+    assert a == pytest.approx(1 - 0.5 ** (1 / 50))
+    for k, (s1, s2) in enumerate(PAIRS):
+        x = pd.Series(prices[:, engine.index[s1]])
+        y = pd.Series(prices[:, engine.index[s2]])
+        beta = x.ewm(alpha=a, adjust=False).cov(y, bias=True) / x.ewm(alpha=a, adjust=False).var(bias=True)
+        spread = y - beta * x
+        z = (spread - spread.ewm(alpha=a, adjust=False).mean()) / np.sqrt(spread.ewm(alpha=a, adjust=False).var(bias=True))
+        z[:20] = np.nan
+        np.testing.assert_allclose(betas[1:, k], beta[1:], rtol=1e-9)
+        np.testing.assert_allclose(zs[:, k], z, rtol=1e-7, atol=1e-9)
+        assert np.isnan(zs[:20, k]).all() and not np.isnan(zs[20:, k]).any()
+
+
+def kalman_reference(x, y, delta, observation_var):
+    """one pair, with the textbook matrix form of the filter"""
+    state, cov = np.array([y[0] / x[0], 0.0]), np.eye(2)
+    betas, zs = [], []
+    for xt, yt in zip(x, y):
+        cov = cov + delta / (1 - delta) * np.eye(2)
+        h = np.array([xt, 1.0])
+        error = yt - h @ state
+        error_var = h @ cov @ h + observation_var
+        gain = cov @ h / error_var
+        state = state + gain * error
+        cov = (np.eye(2) - np.outer(gain, h)) @ cov
+        betas.append(state[0])
+        zs.append(error / np.sqrt(error_var))
+    return np.array(betas), np.array(zs)
+
+
+def test_kalman_matches_reference():
+    prices = random_prices(300, seed=1)
+    engine = PairsEngine(PAIRS, "kalman", delta=1e-4, observation_var=1e-3, min_periods=0)
+    betas, zs = [], []
+    for row in prices:
+        engine.update_all(row)
+        betas.append(engine.beta.copy())
+        zs.append(engine.z.copy())
+    betas, zs = np.array(betas), np.array(zs)
+    for k, (s1, s2) in enumerate(PAIRS):
+        x, y = prices[:, engine.index[s1]], prices[:, engine.index[s2]]
+        beta, z = kalman_reference(x, y, 1e-4, 1e-3)
+        np.testing.assert_allclose(betas[:, k], beta, rtol=1e-9)
+        np.testing.assert_allclose(zs[:, k], z, rtol=1e-7, atol=1e-9)
+    np.testing.assert_allclose(engine.spread, prices[-1, engine.y] - engine.beta * prices[-1, engine.x])
+
+
+@pytest.mark.parametrize("mode", ["ewm", "kalman"])
+def test_ticks_update_the_pairs_of_the_symbol(mode):
+    """a tick of a symbol updates its pairs with the last price of the other leg: the same as a
+    one pair engine updated with the (S1, S2) last prices at each tick of either leg"""
+    rng = np.random.default_rng(2)
+    symbols = ["AAA", "BBB", "CCC"]
+    ticks = [(symbols[s], 100 + rng.normal()) for s in rng.integers(0, 3, 600)]
+    engine = PairsEngine(PAIRS, mode, halflife=30, min_periods=5)
+    buffers = {s: TickBuffer() for s in symbols}
+    for s in symbols:
+        engine.watch(s, buffers[s])
+    for t, (s, p) in enumerate(ticks):
+        buffers[s].append(float(t), p)
+
+    for k, (s1, s2) in enumerate(PAIRS):
+        single = PairsEngine([(s1, s2)], mode, halflife=30, min_periods=5)
+        last = {}
+        for s, p in ticks:
+            last[s] = p
+            if s in (s1, s2) and s1 in last and s2 in last:
+                single.update_all([last[sym] for sym in single.symbols])
+        assert engine.count[k] == single.count[0]
+        np.testing.assert_allclose([engine.beta[k], engine.spread[k], engine.z[k]],
+                                   [single.beta[0], single.spread[0], single.z[0]], rtol=1e-12)
+
+
+def test_update_all_skips_missing_prices():
+    engine = PairsEngine(PAIRS, min_periods=0)
+    engine.update_all([1.0, np.nan, np.nan])
+    assert list(engine.count) == [0, 0, 0]
+    engine.update_all([np.nan, 2.0, np.nan])
+    assert list(engine.count) == [1, 0, 0]
+    frame = engine.frame()
+    assert list(frame.columns) == ["S1", "S2", "beta", "spread", "z", "updates"] and list(frame["updates"]) == [1, 0, 0]
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        PairsEngine(PAIRS, "ols")
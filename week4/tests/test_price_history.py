@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from price_history import PriceHistory, _load
+from price_store import PriceStore
+
+
+@pytest.mark.parametrize("version", [(1, 0), (2, 0), (3, 0)])
+@pytest.mark.parametrize("dtype", ["<f8", "<M8[D]"])
+def test_load_matches_np_load(tmp_path, version, dtype):
+    array = np.arange(1000).astype(dtype)
+    path = str(tmp_path / "array.npy")
+    with open(path, "wb") as file:
+        np.lib.format.write_array(file, array, version=version)
+    loaded = _load(path, dtype)
+    np.testing.assert_array_equal(loaded, np.load(path))
+    assert loaded.dtype == np.load(path).dtype and not loaded.flags.writeable
+
+
+def test_write_read_round_trip(tmp_path, make_prices):
+    history = PriceHistory(str(tmp_path))
+    data = make_prices(pd.bdate_range("2021-11-01", "2023-02-28"))
+    history.write("SPY", data.iloc[::-1])  # any order
+    assert history.symbols() == ["SPY"] and history.years("SPY") == [2021, 2022, 2023]
+    pd.testing.assert_frame_equal(history.read("SPY"), data, check_freq=False, check_index_type=False)
+    pd.testing.assert_frame_equal(history.read("SPY", ["close"], "2022-06-15", "2023-01-10"),
+                                  data.loc["2022-06-15":"2023-01-10", ["close"]], check_freq=False, check_index_type=False)
+    assert history.read("SPY", start="2024-01-01").empty
+
+
+def test_append_replaces_the_stored_dates(tmp_path, make_prices):
+    history = PriceHistory(str(tmp_path))
+    data = make_prices(pd.bdate_range("2023-01-02", "2023-03-31"))
+    history.write("SPY", data.iloc[:-10])
+    update = make_prices(pd.bdate_range("2023-03-01", "2023-03-31"), seed=1)
+    history.append("SPY", update.reset_index())  # a date column
+    expected = pd.concat([data.loc[:"2023-02-28"], update])
+    pd.testing.assert_frame_equal(history.read("SPY"), expected, check_freq=False, check_index_type=False)
+
+
+def test_matrix_matches_pandas_outer_join(tmp_path, make_prices):
+    history = PriceHistory(str(tmp_path))
+    rng = np.random.default_rng(2)
+    days = pd.bdate_range("2021-06-01", "2023-06-30")
+    frames = {}
+    for k, symbol in enumerate(["AAA", "BBB", "CCC"]):
+        keep = np.sort(rng.choice(len(days), 300, replace=False))
+        frames[symbol] = make_prices(days[keep], seed=k)
+        history.write(symbol, frames[symbol])
+    expected = pd.concat([f["adj_close"] for f in frames.values()], axis=1, keys=list(frames), sort=True)
+    expected = expected.loc["2022-01-01":"2023-03-31", ["CCC", "AAA", "BBB"]]
+    panel = history.panel(["CCC", "AAA", "BBB"], start="2022-01-01", end="2023-03-31")
+    pd.testing.assert_frame_equal(panel, expected, check_names=False, check_freq=False, check_index_type=False)
+    dates, values = history.matrix(["AAA", "ZZZ"])
+    assert len(dates) == len(frames["AAA"]) and np.isnan(values[:, 1]).all()
+
+
+def test_import_store(tmp_path, make_prices):
+    store = PriceStore(str(tmp_path / "prices.sqlite"))
+    data = make_prices(pd.bdate_range("2023-01-02", "2023-01-31"))
+    store.save("SPY", data.reset_index(), "2023-01-01", "2023-01-31")
+    history = PriceHistory(str(tmp_path / "history"))
+    history.import_store(store, ["SPY", "QQQ"])
+    store.close()
+    assert history.symbols() == ["SPY"]
+    pd.testing.assert_frame_equal(history.read("SPY"), data, check_freq=False, check_index_type=False)
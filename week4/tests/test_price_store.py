@@ -0,0 +1,136 @@
+from datetime import date, timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from price_store import PriceStore
+
+FIRST = date(2023, 1, 1)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = PriceStore(str(tmp_path / "prices.sqlite"))
+    yield store
+    store.close()
+
+
+@pytest.fixture
+def download(make_prices):
+    """prices with a date column, as market_data.get_stock_data returns them"""
+    return lambda days, seed=0: make_prices(days, seed).reset_index()
+
+
+def gaps(covered, start, end):
+    """brute force: the runs of the days of start..end that are not covered"""
+    result, run = [], None
+    day = start
+    while day <= end:
+        if day in covered:
+            if run:
+                result.append(run)
+            run = None
+        else:
+            run = (run[0], day) if run else (day, day)
+        day += timedelta(days=1)
+    return result + [run] if run else result
+
+
+def test_missing_matches_brute_force(store, download):
+    rng = np.random.default_rng(1)
+    covered = set()
+    for _ in range(40):
+        start = FIRST + timedelta(days=int(rng.integers(0, 300)))
+        end = start + timedelta(days=int(rng.integers(0, 10)))
+        store.save("SPY", download(pd.date_range(start, end)), start, end)
+        covered |= {start + timedelta(days=k) for k in range((end - start).days + 1)}
+        ranges = store.coverage("SPY")
+        # merged: sorted, disjoint and not adjacent
+        assert all(e1 + timedelta(days=1) < s2 for (_, e1), (s2, _) in zip(ranges, ranges[1:]))
+        assert {s + timedelta(days=k) for s, e in ranges for k in range((e - s).days + 1)} == covered
+        lo = FIRST + timedelta(days=int(rng.integers(-5, 300)))
+        hi = lo + timedelta(days=int(rng.integers(0, 60)))
+        assert store.missing("SPY", lo, hi) == gaps(covered, lo, hi)
+
+
+def test_adjacent_ranges_merge(store, download):
+    store.save("SPY", download(pd.date_range("2023-01-01", "2023-01-10")), "2023-01-01", "2023-01-10")
+    store.save("SPY", download(pd.date_range("2023-01-20", "2023-01-31")), "2023-01-20", "2023-01-31")
+    assert store.missing("SPY", "2023-01-01", "2023-01-31") == [(date(2023, 1, 11), date(2023, 1, 19))]
+    store.save("SPY", download(pd.date_range("2023-01-11", "2023-01-19")), "2023-01-11", "2023-01-19")
+    assert store.coverage("SPY") == [(date(2023, 1, 1), date(2023, 1, 31))]
+    assert store.missing("SPY", "2023-01-01", "2023-01-31") == []
+    assert store.missing("QQQ", "2023-01-01", "2023-01-31") == [(date(2023, 1, 1), date(2023, 1, 31))]
+
+
+def test_coverage_ends_at_the_last_downloaded_date(store, download):
+    # a failed download: yfinance returns an empty frame
+    store.save("SPY", download([]), "2023-01-01", "2023-01-31")
+    assert store.coverage("SPY") == []
+    assert store.missing("SPY", "2023-01-01", "2023-01-31") == [(date(2023, 1, 1), date(2023, 1, 31))]
+    # a short one
+    store.save("SPY", download(pd.bdate_range("2023-01-02", "2023-01-13")), "2023-01-01", "2023-01-31")
+    assert store.missing("SPY", "2023-01-01", "2023-01-31") == [(date(2023, 1, 14), date(2023, 1, 31))]
+
+
+def test_save_data_range_retries_a_failed_download(store, monkeypatch, download):
+    pytest.importorskip("yfinance")
+    import market_data
+
+    downloads = []
+
+    def get_stock_data(symbol, start, end):
+        downloads.append((start, end))
+        days = [] if len(downloads) == 1 else pd.date_range(start, end)
+        return download(days)
+
+    monkeypatch.setattr(market_data, "get_stock_data", get_stock_data)
+    market_data.save_data_range("SPY", "2023-01-01", "2023-01-31", store)
+    market_data.save_data_range("SPY", "2023-01-01", "2023-01-31", store)
+    market_data.save_data_range("SPY", "2023-01-01", "2023-01-31", store)
+    assert downloads == [(date(2023, 1, 1), date(2023, 1, 31))] * 2
+    assert len(store.read(["SPY"])) == 31
+
+
+def test_save_read_round_trip_and_upsert(store, download):
+    days = pd.bdate_range("2023-01-02", "2023-03-31")
+    data = download(days)
+    store.save("SPY", data, days[0], days[-1])
+    # a day loaded twice is updated, not duplicated
+    update = download(days[-5:], seed=2)
+    store.save("SPY", update, days[-5], days[-1])
+    expected = pd.concat([data.iloc[:-5], update]).set_index("date").astype({"volume": np.int64})
+
+    read = store.read(["SPY"])
+    assert read.index.names == ["symbol", "date"] and len(read) == len(days)
+    assert read["volume"].dtype == np.int64
+    pd.testing.assert_frame_equal(read.loc["SPY"], expected, check_names=False, check_index_type=False)
+
+    part = store.read(["SPY"], "2023-02-01", "2023-02-28", ["close"])
+    assert list(part.columns) == ["close"]
+    np.testing.assert_array_equal(part["close"], expected.loc["2023-02-01":"2023-02-28", "close"])
+
+
+def test_missing_values_are_null(store, download):
+    data = download(pd.bdate_range("2023-01-02", periods=3))
+    data.loc[1, ["close", "volume"]] = np.nan
+    store.save("SPY", data, "2023-01-02", "2023-01-04")
+    read = store.read(["SPY"]).loc["SPY"]
+    assert np.isnan(read["close"].iloc[1]) and read["volume"].dtype == float and np.isnan(read["volume"].iloc[1])
+    assert store.con.execute("SELECT COUNT(*) FROM stock_data WHERE close IS NULL").fetchone() == (1,)
+
+
+def test_panel_aligns_the_symbols(store, download):
+    spy = download(pd.bdate_range("2023-01-02", periods=5))
+    qqq = download(pd.bdate_range("2023-01-04", periods=5), seed=1)
+    store.save("SPY", spy, "2023-01-02", "2023-01-06")
+    store.save("QQQ", qqq, "2023-01-04", "2023-01-10")
+    panel = store.panel(["SPY", "QQQ"], "close")
+    expected = pd.concat([spy.set_index("date")["close"], qqq.set_index("date")["close"]], axis=1, keys=["SPY", "QQQ"])
+    pd.testing.assert_frame_equal(panel, expected, check_names=False, check_index_type=False, check_freq=False)
+
+
+def test_read_rejects_unknown_columns(store):
+    with pytest.raises(ValueError):
+        store.read(["SPY"], columns=["close", "vwap"])
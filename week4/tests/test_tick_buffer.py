@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+
+from tick_buffer import TickBuffer
+
+
+def test_window_min_max_match_brute_force(make_ticks):
+    times, prices, _ = make_ticks(2000)
+    buffer = TickBuffer(window=30, capacity=256)
+    for k, (t, p) in enumerate(zip(times, prices)):
+        buffer.append(t, p)
+        in_window = (times[:k + 1] >= t - 30)
+        window = buffer.last
+        assert window.min == prices[:k + 1][in_window].min()
+        assert window.max == prices[:k + 1][in_window].max()
+        assert (window.time, window.price, window.first_time, window.count) == (t, p, times[0], k + 1)
+
+
+def test_window_min_max_match_pandas_rolling(make_ticks):
+    times, prices, _ = make_ticks(1000, seed=1)
+    times = times.round(3)  # whole milliseconds for the time based rolling window
+    buffer = TickBuffer(window=30)
+    mins, maxs = [], []
+    for t, p in zip(times, prices):
+        buffer.append(t, p)
+        mins.append(buffer.last.min)
+        maxs.append(buffer.last.max)
+    # closed="both": the ticks exactly `window` seconds old are in the window
+    series = pd.Series(prices, index=pd.to_datetime(times, unit="s"))
+    rolling = series.rolling("30s", closed="both")
+    np.testing.assert_array_equal(mins, rolling.min().to_numpy())
+    np.testing.assert_array_equal(maxs, rolling.max().to_numpy())
+
+
+def test_frame_after_the_ring_wraps(make_ticks):
+    times, prices, _ = make_ticks(300)
+    buffer = TickBuffer(capacity=128)
+    for t, p in zip(times, prices):
+        buffer.append(t, p)
+    assert len(buffer) == 128
+    frame = buffer.frame()
+    np.testing.assert_array_equal(frame["price"].to_numpy(), prices[-128:])
+    np.testing.assert_array_equal(frame.index, pd.to_datetime(times[-128:], unit="s"))
+    recent = buffer.frame(seconds=20)
+    kept = times[-128:] >= times[-1] - 20
+    np.testing.assert_array_equal(recent["price"].to_numpy(), prices[-128:][kept])
+
+
+def test_listeners_get_the_last_window():
+    buffer = TickBuffer()
+    seen = []
+    buffer.listeners.append(lambda b, window: seen.append((b is buffer, window)))
+    buffer.append(1.0, 10.0)
+    buffer.append(2.0, 9.0)
+    assert [w.price for _, w in seen] == [10.0, 9.0]
+    assert seen[-1] == (True, buffer.last)
+    assert buffer.updated.is_set()
@@ -0,0 +1,83 @@
+import threading
+from collections import deque
+from typing import NamedTuple, Optional
+
+import numpy as np
+import pandas as pd
+
+
+class Window(NamedTuple):
+    """last tick and the min/max of the prices of the window ending at it"""
+    time: float
+    price: float
+    min: float
+    max: float
+    first_time: float
+    count: int
+
+
+class TickBuffer:
+    """Preallocated ring buffer of (time, price) ticks with the rolling min/max of the last
+    `window` seconds, kept with monotonic deques so each tick costs O(1) (amortized).
+
+    One producer (the API thread) calls append(); the other threads read `last`, which is
+    replaced by a new Window tuple after every tick (a single reference assignment, so readers
+    never see a half updated state and no lock is taken on the tick path).
+    frame() builds a pandas view of the buffered ticks on demand.
+    The listeners (e.g. SignalEngine.on_tick) are called with (buffer, window) by the producer
+    after every tick.
+    """
+
+    def __init__(self, window: float = 300, capacity: int = 1 << 16):
+        self.window = window
+        self.capacity = capacity
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.prices = np.zeros(capacity, dtype=np.float64)
+        self.count = 0  # number of ticks appended, the last one is at (count - 1) % capacity
+        self.first_time: Optional[float] = None
+        self.last: Optional[Window] = None
+        self.updated = threading.Event()
+        self.listeners = []
+        # (time, price) of the candidates for the min (increasing prices) and the max (decreasing)
+        self._mins = deque()
+        self._maxs = deque()
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def append(self, time: float, price: float):
+        i = self.count % self.capacity
+        self.times[i] = time
+        self.prices[i] = price
+
+        mins, maxs = self._mins, self._maxs
+        while mins and mins[-1][1] >= price:
+            mins.pop()
+        mins.append((time, price))
+        while maxs and maxs[-1][1] <= price:
+            maxs.pop()
+        maxs.append((time, price))
+        start = time - self.window
+        while mins[0][0] < start:
+            mins.popleft()
+        while maxs[0][0] < start:
+            maxs.popleft()
+
+        if self.first_time is None:
+            self.first_time = time
+        self.count += 1
+        self.last = Window(time, price, mins[0][1], maxs[0][1], self.first_time, self.count)
+        self.updated.set()
+        for listener in self.listeners:
+            listener(self, self.last)
+
+    def frame(self, seconds: float = None) -> pd.DataFrame:
+        """copy of the buffered ticks (of the last `seconds` if given) indexed by time"""
+        count = self.count
+        n = min(count, self.capacity)
+        order = (np.arange(count - n, count) % self.capacity)
+        times, prices = self.times[order], self.prices[order]
+        if seconds is not None and n:
+            keep = times >= times[-1] - seconds
+            times, prices = times[keep], prices[keep]
+        return pd.DataFrame({"price": prices}, index=pd.Index(pd.to_datetime(times, unit="s"), name="time"))